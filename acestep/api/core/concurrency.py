@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from acestep.api.core.config import settings
+from acestep.instrumentation import EVENT_LOOP_LAG_SECONDS
+
+logger = logging.getLogger("ace_step_api.concurrency")
+
+# Blocking work that must not run on the event loop (embeddings, sync SDK calls,
+# file / SQLite I/O) goes here. Generation has its own executors.
+blocking_executor = ThreadPoolExecutor(max_workers=settings.BLOCKING_WORKERS, thread_name_prefix="ace-blocking")
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Runs `func` on the bounded blocking executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a sleep of `interval` seconds wakes up.
+    Anything that blocks the loop shows up here (and as stalled /status polls).
+    """
+
+    def __init__(self, interval: float = 0.25, warn_threshold: float = 0.1):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.last = 0.0
+        self.max = 0.0
+        self.total = 0.0
+        self.samples = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def observe(self, lag: float):
+        self.last = lag
+        self.max = max(self.max, lag)
+        self.total += lag
+        self.samples += 1
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        if lag > self.warn_threshold:
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "last_ms": round(self.last * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+            "avg_ms": round(self.total / self.samples * 1000, 1) if self.samples else 0.0,
+        }
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.observe(max(0.0, time.perf_counter() - start - self.interval))
+
+
+loop_lag = LoopLagMonitor(warn_threshold=settings.LOOP_LAG_WARN_MS / 1000)
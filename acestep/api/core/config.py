@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -22,7 +23,83 @@ class Settings:
     # Paths
     ACE_CHECKPOINT_PATH: str = os.getenv("ACE_CHECKPOINT_PATH", "")
     OUTPUT_DIR: str = os.getenv("ACE_OUTPUT_DIR", "./outputs").strip()
+    # Metadata records of the outputs, beside OUTPUT_DIR (which is served publicly) unless set
+    METADATA_DIR: str = os.path.abspath(
+        os.getenv("ACE_METADATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(OUTPUT_DIR)), "metadata")
+    )
+
+    # Inference
+    # Share decode steps across concurrent jobs (batch size: ACE_MAX_BATCH_SIZE)
+    CONTINUOUS_BATCHING: bool = os.getenv("ACE_CONTINUOUS_BATCHING", "false").lower() == "true"
+    MAX_BATCH_SIZE: int = int(os.getenv("ACE_MAX_BATCH_SIZE", 4))
+    # Static batching: drain the queue for this long and run compatible jobs together (0 = off)
+    BATCH_WINDOW_MS: int = int(os.getenv("ACE_BATCH_WINDOW_MS", 0))
+    # Worker processes, one pipeline each (0 = generate in the API process)
+    NUM_WORKERS: int = int(os.getenv("ACE_NUM_WORKERS", 0))
+    WORKER_DEVICES: list = [d.strip() for d in os.getenv("ACE_WORKER_DEVICES", "cpu").split(",") if d.strip()]
+    WORKER_THREADS: int = int(os.getenv("ACE_WORKER_THREADS", 0))
+    # Load the weights once in the API process and let CPU workers map them from shared memory
+    SHARED_WEIGHTS: bool = os.getenv("ACE_SHARED_WEIGHTS", "false").lower() == "true"
+
+    # Named engine variants served from this process, as JSON, e.g.
+    # {"base": {}, "int4": {"quantized": true}, "lofi": {"lora": "<repo or dir>", "lora_weight": 0.8}}
+    # Options: type (AUDIO_MODEL_TYPE), checkpoint (ACE_CHECKPOINT_PATH), quantized, lora, lora_weight.
+    ENGINE_VARIANTS: dict = json.loads(os.getenv("ACE_ENGINE_VARIANTS", "") or "{}") or {"base": {}}
+    DEFAULT_VARIANT: str = os.getenv("ACE_DEFAULT_VARIANT") or next(iter(ENGINE_VARIANTS))
+    # Least recently used variants are unloaded to stay under these (GB, 0 = no limit)
+    ENGINE_RAM_BUDGET_GB: float = float(os.getenv("ACE_ENGINE_RAM_BUDGET_GB", 0))
+    ENGINE_VRAM_BUDGET_GB: float = float(os.getenv("ACE_ENGINE_VRAM_BUDGET_GB", 0))
+
+    # Load the model in the background at startup instead of on the first job (see /ready)
+    WARMUP: bool = os.getenv("ACE_WARMUP", "true").lower() == "true"
+    # Then run one short throwaway generation to fill compile / allocator caches
+    WARMUP_GENERATION: bool = os.getenv("ACE_WARMUP_GENERATION", "false").lower() == "true"
+    WARMUP_DURATION: float = float(os.getenv("ACE_WARMUP_DURATION", 10.0))
+    WARMUP_STEPS: int = int(os.getenv("ACE_WARMUP_STEPS", 10))
+
+    # Threads for blocking work kept off the event loop (embeddings, sync SDK calls, file I/O)
+    BLOCKING_WORKERS: int = int(os.getenv("ACE_BLOCKING_WORKERS", 4))
+    # Log a warning when the event loop is blocked longer than this
+    LOOP_LAG_WARN_MS: float = float(os.getenv("ACE_LOOP_LAG_WARN_MS", 100))
+
+    # Default per-job deadline in seconds from submission (0 = none)
+    JOB_TIMEOUT_SECONDS: float = float(os.getenv("ACE_JOB_TIMEOUT_SECONDS", 0))
+
+    # Minimum seconds between progress events pushed to one job's stream subscribers
+    PROGRESS_EVENT_INTERVAL: float = float(os.getenv("ACE_PROGRESS_EVENT_INTERVAL", 0.5))
+
+    # Result cache for seeded requests (the same user's identical inputs return earlier outputs)
+    RESULT_CACHE: bool = os.getenv("ACE_RESULT_CACHE", "false").lower() == "true"
+    # Kept outside OUTPUT_DIR, which is served publicly under /outputs
+    RESULT_CACHE_INDEX_PATH: str = os.getenv("ACE_RESULT_CACHE_INDEX_PATH", "./result_cache.json")
+    RESULT_CACHE_MAX_BYTES: int = int(os.getenv("ACE_RESULT_CACHE_MAX_BYTES", 5 * 1024**3))
+    RESULT_CACHE_TTL_SECONDS: float = float(os.getenv("ACE_RESULT_CACHE_TTL_SECONDS", 7 * 86400))
+    # Delete evicted outputs from disk instead of only forgetting them
+    RESULT_CACHE_PRUNE_FILES: bool = os.getenv("ACE_RESULT_CACHE_PRUNE_FILES", "false").lower() == "true"
+
+    # SQLite index of the outputs directory behind /history
+    LIBRARY_DB_PATH: str = os.getenv("ACE_LIBRARY_DB_PATH", "./library.db")
+
+    # Job Store ("memory" or "sqlite")
+    JOB_STORE: str = os.getenv("ACE_JOB_STORE", "memory").lower()
+    JOB_STORE_PATH: str = os.getenv("ACE_JOB_STORE_PATH", "./jobs.db")
+    JOB_STORE_MAX_JOBS: int = int(os.getenv("ACE_JOB_STORE_MAX_JOBS", 10000))
+    JOB_TTL_SECONDS: float = float(os.getenv("ACE_JOB_TTL_SECONDS", 86400))
     
+    # Cloud upload of finished jobs ("supabase", "local" or "none")
+    UPLOAD_BACKEND: str = os.getenv("ACE_UPLOAD_BACKEND", "supabase").lower()
+    UPLOAD_LOCAL_DIR: str = os.getenv("ACE_UPLOAD_LOCAL_DIR", "./uploads")
+    UPLOAD_LOCAL_BASE_URL: str | None = os.getenv("ACE_UPLOAD_LOCAL_BASE_URL")
+    UPLOAD_CONCURRENCY: int = int(os.getenv("ACE_UPLOAD_CONCURRENCY", 4))
+    UPLOAD_MAX_RETRIES: int = int(os.getenv("ACE_UPLOAD_MAX_RETRIES", 3))
+    UPLOAD_RETRY_BACKOFF: float = float(os.getenv("ACE_UPLOAD_RETRY_BACKOFF", 1.0))
+
+    # Credit ledger ("supabase", "sqlite" or "none"; supabase without credentials = billing off)
+    LEDGER: str = os.getenv("ACE_LEDGER", "supabase").lower()
+    LEDGER_PATH: str = os.getenv("ACE_LEDGER_PATH", "./ledger.db")
+    # How long a known-short balance rejects submits without asking the ledger
+    BALANCE_CACHE_TTL_SECONDS: float = float(os.getenv("ACE_BALANCE_CACHE_TTL_SECONDS", 30))
+
     # External Services
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     
@@ -46,3 +123,6 @@ settings = Settings()
 # Ensure Output Dir
 if not os.path.exists(settings.OUTPUT_DIR):
     os.makedirs(settings.OUTPUT_DIR)
+
+# The pipeline (in this process and in workers) writes metadata records here too
+os.environ["ACE_METADATA_DIR"] = settings.METADATA_DIR
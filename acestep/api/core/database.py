@@ -1,14 +1,20 @@
 import logging
-from supabase import create_client, Client
+import asyncio
+from typing import TYPE_CHECKING
 from acestep.api.core.config import settings
 
+if TYPE_CHECKING:
+    from supabase import AsyncClient, Client
+
 logger = logging.getLogger("ace_step_api.db")
 
 class SupabaseManager:
-    _instance: Client | None = None
+    _instance: "Client | None" = None
+    _async_instance: "AsyncClient | None" = None
+    _async_lock: asyncio.Lock | None = None
 
     @classmethod
-    def get_client(cls) -> Client | None:
+    def get_client(cls) -> "Client | None":
         if cls._instance:
             return cls._instance
             
@@ -21,6 +27,8 @@ class SupabaseManager:
             key = settings.SUPABASE_SERVICE_KEY or settings.SUPABASE_ANON_KEY
             url = settings.SUPABASE_URL
             
+            from supabase import create_client
+
             cls._instance = create_client(url, key)
             logger.info("Supabase Client Initialized.")
             return cls._instance
@@ -28,5 +36,32 @@ class SupabaseManager:
             logger.error(f"Failed to initialize Supabase: {e}")
             return None
 
-def get_db() -> Client | None:
+    @classmethod
+    async def get_async_client(cls) -> "AsyncClient | None":
+        """Async (httpx) client for use inside the event loop."""
+        if cls._async_instance:
+            return cls._async_instance
+
+        if not settings.is_cloud_enabled:
+            return None
+
+        if cls._async_lock is None:
+            cls._async_lock = asyncio.Lock()
+        async with cls._async_lock:
+            if cls._async_instance:
+                return cls._async_instance
+            try:
+                key = settings.SUPABASE_SERVICE_KEY or settings.SUPABASE_ANON_KEY
+                from supabase import acreate_client
+
+                cls._async_instance = await acreate_client(settings.SUPABASE_URL, key)
+                logger.info("Supabase Async Client Initialized.")
+            except Exception as e:
+                logger.error(f"Failed to initialize async Supabase: {e}")
+            return cls._async_instance
+
+def get_db() -> "Client | None":
     return SupabaseManager.get_client()
+
+async def get_async_db() -> "AsyncClient | None":
+    return await SupabaseManager.get_async_client()
@@ -0,0 +1,305 @@
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from acestep.api.core.config import settings
+from acestep.api.schemas import GenerationRequest, JobStatus
+
+logger = logging.getLogger("ace_step_api.job_store")
+
+ACTIVE_STATUSES = ("queued", "processing")
+
+
+class JobStore(ABC):
+    """
+    Holds every job's JobStatus and, while it is pending, its GenerationRequest.
+    Live jobs are plain in-memory objects (progress updates just mutate them);
+    `save` records a state transition.
+    """
+
+    @abstractmethod
+    def add(self, job: JobStatus, req: GenerationRequest):
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        pass
+
+    @abstractmethod
+    def get_request(self, job_id: str) -> Optional[GenerationRequest]:
+        pass
+
+    @abstractmethod
+    def save(self, job: JobStatus):
+        """Persists the job's current state (call after changing its status)."""
+        pass
+
+    @abstractmethod
+    def release_request(self, job_id: str):
+        """Drops the request payload once the job no longer needs it."""
+        pass
+
+    @abstractmethod
+    def list_by_user(self, user_id: str, limit: int = 50) -> List[JobStatus]:
+        pass
+
+    @abstractmethod
+    def list_by_status(self, status: str, limit: int = 50) -> List[JobStatus]:
+        pass
+
+    @abstractmethod
+    def pending_job_ids(self) -> List[str]:
+        """Jobs left queued/processing (e.g. by a restart), oldest first."""
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """
+    Process-local store. Finished jobs expire after `ttl` seconds and the least
+    recently used finished jobs are evicted beyond `max_jobs`; live jobs are never evicted.
+    """
+
+    def __init__(self, max_jobs: int = 10000, ttl: float = 86400):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._jobs: "OrderedDict[str, JobStatus]" = OrderedDict()
+        self._requests: Dict[str, GenerationRequest] = {}
+        self._job_user: Dict[str, str] = {}
+        self._job_status: Dict[str, str] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        self._by_status: Dict[str, Set[str]] = {}
+        # finished job ids in completion order, for TTL expiry
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+
+    def add(self, job: JobStatus, req: GenerationRequest):
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._requests[job.job_id] = req
+            if req.user_id:
+                self._job_user[job.job_id] = req.user_id
+                self._by_user.setdefault(req.user_id, set()).add(job.job_id)
+            self._index_status(job)
+            self._evict()
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+            return job
+
+    def get_request(self, job_id: str) -> Optional[GenerationRequest]:
+        return self._requests.get(job_id)
+
+    def save(self, job: JobStatus):
+        with self._lock:
+            if job.job_id not in self._jobs:
+                return
+            self._index_status(job)
+            if job.status not in ACTIVE_STATUSES:
+                self._finished[job.job_id] = time.time()
+                self._finished.move_to_end(job.job_id)
+            self._evict()
+
+    def release_request(self, job_id: str):
+        self._requests.pop(job_id, None)
+
+    def list_by_user(self, user_id: str, limit: int = 50) -> List[JobStatus]:
+        with self._lock:
+            jobs = [self._jobs[job_id] for job_id in self._by_user.get(user_id, ())]
+        jobs.sort(key=lambda job: job.created_at, reverse=True)
+        return jobs[:limit]
+
+    def list_by_status(self, status: str, limit: int = 50) -> List[JobStatus]:
+        with self._lock:
+            jobs = [self._jobs[job_id] for job_id in self._by_status.get(status, ())]
+        jobs.sort(key=lambda job: job.created_at, reverse=True)
+        return jobs[:limit]
+
+    def pending_job_ids(self) -> List[str]:
+        # nothing survives a restart in memory
+        return []
+
+    def _index_status(self, job: JobStatus):
+        previous = self._job_status.get(job.job_id)
+        if previous == job.status:
+            return
+        if previous is not None:
+            self._by_status[previous].discard(job.job_id)
+        self._job_status[job.job_id] = job.status
+        self._by_status.setdefault(job.status, set()).add(job.job_id)
+
+    def _remove(self, job_id: str):
+        self._jobs.pop(job_id, None)
+        self._requests.pop(job_id, None)
+        self._finished.pop(job_id, None)
+        status = self._job_status.pop(job_id, None)
+        if status is not None:
+            self._by_status[status].discard(job_id)
+        user_id = self._job_user.pop(job_id, None)
+        if user_id is not None:
+            self._by_user[user_id].discard(job_id)
+            if not self._by_user[user_id]:
+                del self._by_user[user_id]
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at > cutoff:
+                break
+            self._remove(job_id)
+
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        # least recently used first
+        victims = []
+        for job_id in self._jobs:
+            if job_id in self._finished:
+                victims.append(job_id)
+                if len(victims) >= excess:
+                    break
+        for job_id in victims:
+            self._remove(job_id)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Durable store in a SQLite database (WAL mode). Live jobs are also kept in memory
+    so that /status and progress updates never hit the disk; finished jobs are read
+    back by primary key and purged after `ttl` seconds.
+    """
+
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, path: str, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._live: Dict[str, JobStatus] = {}
+        self._last_purge = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                job TEXT NOT NULL,
+                request TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user_id, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at)")
+
+    def add(self, job: JobStatus, req: GenerationRequest):
+        with self._lock:
+            self._live[job.job_id] = job
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, user_id, status, created_at, updated_at, job, request) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.job_id,
+                    req.user_id,
+                    job.status,
+                    job.created_at,
+                    time.time(),
+                    job.model_dump_json(),
+                    req.model_dump_json(),
+                ),
+            )
+        self._purge_expired()
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        job = self._live.get(job_id)
+        if job is not None:
+            return job
+        with self._lock:
+            row = self._conn.execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = JobStatus.model_validate_json(row[0])
+        if job.status in ACTIVE_STATUSES:
+            # left behind by a previous process; track it again until it finishes
+            self._live[job_id] = job
+        return job
+
+    def get_request(self, job_id: str) -> Optional[GenerationRequest]:
+        with self._lock:
+            row = self._conn.execute("SELECT request FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return GenerationRequest.model_validate_json(row[0])
+
+    def save(self, job: JobStatus):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, job = ? WHERE job_id = ?",
+                (job.status, time.time(), job.model_dump_json(), job.job_id),
+            )
+            if job.status in ACTIVE_STATUSES:
+                self._live[job.job_id] = job
+            else:
+                self._live.pop(job.job_id, None)
+
+    def release_request(self, job_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET request = NULL WHERE job_id = ?", (job_id,))
+
+    def list_by_user(self, user_id: str, limit: int = 50) -> List[JobStatus]:
+        return self._select("WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit))
+
+    def list_by_status(self, status: str, limit: int = 50) -> List[JobStatus]:
+        return self._select("WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit))
+
+    def pending_job_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                ACTIVE_STATUSES,
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _select(self, clause: str, args: tuple) -> List[JobStatus]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT job_id, job FROM jobs {clause}", args).fetchall()
+        # prefer the live object, it carries the latest progress
+        return [self._live.get(job_id) or JobStatus.model_validate_json(data) for job_id, data in rows]
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+                (*ACTIVE_STATUSES, now - self.ttl),
+            )
+        if cursor.rowcount:
+            logger.info(f"Purged {cursor.rowcount} expired jobs.")
+
+
+def create_job_store() -> JobStore:
+    """
+    Builds the configured job store.
+    Reads 'ACE_JOB_STORE' ('memory' or 'sqlite'). Defaults to 'memory'.
+    """
+    if settings.JOB_STORE == "sqlite":
+        logger.info(f"Using SQLite job store at {settings.JOB_STORE_PATH}")
+        return SQLiteJobStore(settings.JOB_STORE_PATH, ttl=settings.JOB_TTL_SECONDS)
+    if settings.JOB_STORE == "memory":
+        return MemoryJobStore(max_jobs=settings.JOB_STORE_MAX_JOBS, ttl=settings.JOB_TTL_SECONDS)
+    raise ValueError(f"Unknown job store: {settings.JOB_STORE}")
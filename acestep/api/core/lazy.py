@@ -0,0 +1,31 @@
+import importlib
+import threading
+from types import ModuleType
+from typing import Callable, Optional
+
+
+class LazyModule:
+    """
+    Stands in for a module that is imported on first attribute access, so heavy
+    SDKs stay out of the API's import time until a request needs them.
+    `setup` runs once on the freshly imported module (e.g. to set an API key).
+    """
+
+    def __init__(self, name: str, setup: Optional[Callable[[ModuleType], None]] = None):
+        self._name = name
+        self._setup = setup
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        with self._lock:
+            if self._module is None:
+                module = importlib.import_module(self._name)
+                if self._setup is not None:
+                    self._setup(module)
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str):
+        module = self._module if self._module is not None else self._load()
+        return getattr(module, attr)
@@ -0,0 +1,191 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from acestep.api.core.concurrency import run_blocking
+from acestep.api.core.config import settings
+from acestep.api.core.database import get_async_db
+
+logger = logging.getLogger("ace_step_api.ledger")
+
+
+@dataclass
+class DebitResult:
+    ok: bool
+    # None when the user has no wallet (nothing is charged)
+    balance: Optional[int]
+
+
+class CreditLedger(ABC):
+    """
+    Wallet balances and the transaction log. `debit` and `credit` are single
+    atomic operations: a debit never takes a balance below zero, and the
+    transaction row is written together with the balance change.
+    """
+
+    # Balances only change through this process (so a cached balance is exact)
+    local = False
+
+    @abstractmethod
+    async def debit(self, user_id: str, amount: int, reason: str, metadata: dict) -> DebitResult:
+        pass
+
+    @abstractmethod
+    async def credit(self, user_id: str, amount: int, reason: str, metadata: dict) -> Optional[int]:
+        """Returns the new balance, or None if the user has no wallet."""
+        pass
+
+    @abstractmethod
+    async def balance(self, user_id: str) -> Optional[int]:
+        pass
+
+
+class SupabaseLedger(CreditLedger):
+    """Calls the `debit_credits` / `credit_credits` functions (migrations/12_credit_ledger.sql)."""
+
+    async def debit(self, user_id: str, amount: int, reason: str, metadata: dict) -> DebitResult:
+        supabase = await get_async_db()
+        res = await supabase.rpc(
+            "debit_credits",
+            {"p_user_id": user_id, "p_amount": amount, "p_reason": reason, "p_metadata": metadata},
+        ).execute()
+        return DebitResult(ok=res.data["ok"], balance=res.data["balance"])
+
+    async def credit(self, user_id: str, amount: int, reason: str, metadata: dict) -> Optional[int]:
+        supabase = await get_async_db()
+        res = await supabase.rpc(
+            "credit_credits",
+            {"p_user_id": user_id, "p_amount": amount, "p_reason": reason, "p_metadata": metadata},
+        ).execute()
+        return res.data
+
+    async def balance(self, user_id: str) -> Optional[int]:
+        supabase = await get_async_db()
+        res = await supabase.table("wallets").select("balance").eq("user_id", user_id).maybe_single().execute()
+        return res.data["balance"] if res and res.data else None
+
+
+class SQLiteLedger(CreditLedger):
+    """Local stand-in with the same semantics, for development and tests."""
+
+    local = True
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS wallets (user_id TEXT PRIMARY KEY, balance INTEGER NOT NULL)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+
+    def create_wallet(self, user_id: str, balance: int):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO wallets (user_id, balance) VALUES (?, ?)", (user_id, balance))
+
+    async def debit(self, user_id: str, amount: int, reason: str, metadata: dict) -> DebitResult:
+        return await run_blocking(self._debit, user_id, amount, reason, metadata)
+
+    async def credit(self, user_id: str, amount: int, reason: str, metadata: dict) -> Optional[int]:
+        return await run_blocking(self._apply, user_id, amount, reason, metadata)
+
+    async def balance(self, user_id: str) -> Optional[int]:
+        return await run_blocking(self._balance, user_id)
+
+    def _debit(self, user_id: str, amount: int, reason: str, metadata: dict) -> DebitResult:
+        new_balance = self._apply(user_id, -amount, reason, metadata, require_funds=True)
+        if new_balance is not None:
+            return DebitResult(ok=True, balance=new_balance)
+        current = self._balance(user_id)
+        return DebitResult(ok=current is None, balance=current)
+
+    def _apply(self, user_id: str, amount: int, reason: str, metadata: dict, require_funds: bool = False) -> Optional[int]:
+        condition = " AND balance + ? >= 0" if require_funds else ""
+        args = (amount, user_id, amount) if require_funds else (amount, user_id)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"UPDATE wallets SET balance = balance + ? WHERE user_id = ?{condition} RETURNING balance", args
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "INSERT INTO transactions (user_id, amount, reason, metadata, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (user_id, amount, reason, json.dumps(metadata), time.time()),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if row is not None else None
+
+    def _balance(self, user_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT balance FROM wallets WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row is not None else None
+
+
+class BalanceCache:
+    """
+    Last known balance per user, kept fresh by the ledger's own results and
+    dropped whenever this process credits the user (purchases, refunds).
+    It lets a submit without enough credits be rejected without a round trip.
+    With a local ledger any cached balance is exact; a shared ledger may have
+    been credited elsewhere, so only a balance it has just declined a debit
+    against is trusted there (until the entry expires).
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._balances: Dict[str, Tuple[int, bool, float]] = {}
+
+    def get(self, user_id: str, declined_only: bool = False) -> Optional[int]:
+        entry = self._balances.get(user_id)
+        if entry is None or time.monotonic() - entry[2] > self.ttl:
+            return None
+        balance, declined, _ = entry
+        if declined_only and not declined:
+            return None
+        return balance
+
+    def set(self, user_id: str, balance: Optional[int], declined: bool = False):
+        if balance is None:
+            self._balances.pop(user_id, None)
+        else:
+            self._balances[user_id] = (balance, declined, time.monotonic())
+
+    def invalidate(self, user_id: str):
+        self._balances.pop(user_id, None)
+
+
+def create_ledger() -> Optional[CreditLedger]:
+    """
+    Builds the configured ledger, or None when billing is off (local mode).
+    Reads 'ACE_LEDGER' ('supabase', 'sqlite' or 'none'). Defaults to 'supabase'.
+    """
+    if settings.LEDGER == "supabase":
+        return SupabaseLedger() if settings.is_cloud_enabled else None
+    if settings.LEDGER == "sqlite":
+        logger.info(f"Using SQLite credit ledger at {settings.LEDGER_PATH}")
+        return SQLiteLedger(settings.LEDGER_PATH)
+    if settings.LEDGER == "none":
+        return None
+    raise ValueError(f"Unknown ledger: {settings.LEDGER}")
+
+
+ledger = create_ledger()
+balance_cache = BalanceCache(ttl=settings.BALANCE_CACHE_TTL_SECONDS)
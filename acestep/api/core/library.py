@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from acestep.api.core.config import settings
+from acestep.metadata_store import get_metadata_store
+
+logger = logging.getLogger("ace_step_api.library")
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg")
+
+
+class OutputLibrary:
+    """
+    SQLite index of the audio files in the outputs directory, with a copy of their
+    metadata records (see acestep.metadata_store) for filtering and listing.
+    JobService keeps it current as files are written, renamed, deleted or starred;
+    `reconcile` catches up with changes made behind its back (run at startup).
+    """
+
+    def __init__(self, output_dir: str, path: str):
+        self.output_dir = output_dir
+        self.path = path
+        self.metadata = get_metadata_store(output_dir)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outputs (
+                filename TEXT PRIMARY KEY,
+                format TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                starred INTEGER NOT NULL DEFAULT 0,
+                title TEXT,
+                prompt TEXT,
+                metadata TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_mtime ON outputs (mtime)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_starred ON outputs (starred, mtime)")
+
+    def add(self, path: str):
+        """Indexes (or re-indexes) an output file; paths outside the library directory are ignored."""
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.output_dir):
+            return
+        filename = os.path.basename(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        self._upsert(filename, stat.st_size, stat.st_mtime, self.metadata.get(filename))
+
+    def remove(self, filename: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM outputs WHERE filename = ?", (filename,))
+
+    def rename(self, filename: str, new_name: str):
+        with self._lock:
+            self._conn.execute("UPDATE OR REPLACE outputs SET filename = ? WHERE filename = ?", (new_name, filename))
+
+    def set_starred(self, filename: str, starred: bool = True):
+        with self._lock:
+            self._conn.execute("UPDATE outputs SET starred = ? WHERE filename = ?", (int(starred), filename))
+
+    def query(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        search: Optional[str] = None,
+        starred: Optional[bool] = None,
+        format: Optional[str] = None,
+        oldest_first: bool = False,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Returns (total matches, one page of entries newest first)."""
+        clauses, args = [], []
+        if search:
+            clauses.append("(filename LIKE ? OR title LIKE ? OR prompt LIKE ?)")
+            args += [f"%{search}%"] * 3
+        if starred is not None:
+            clauses.append("starred = ?")
+            args.append(int(starred))
+        if format:
+            clauses.append("format = ?")
+            args.append(format.lower().lstrip("."))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "ASC" if oldest_first else "DESC"
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM outputs {where}", args).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT filename, format, size, mtime, starred, metadata FROM outputs {where} "
+                f"ORDER BY mtime {order} LIMIT ? OFFSET ?",
+                (*args, -1 if limit is None else limit, offset),
+            ).fetchall()
+        items = [
+            {
+                "filename": filename,
+                "format": fmt,
+                "size": size,
+                "mtime": mtime,
+                "starred": bool(is_starred),
+                "metadata": json.loads(metadata),
+            }
+            for filename, fmt, size, mtime, is_starred, metadata in rows
+        ]
+        return total, items
+
+    def reconcile(self):
+        """Brings the index in line with the directory: new and modified files are (re)indexed, missing ones dropped."""
+        start = time.time()
+        with self._lock:
+            known = {
+                filename: (size, mtime)
+                for filename, size, mtime in self._conn.execute("SELECT filename, size, mtime FROM outputs")
+            }
+
+        added = updated = 0
+        on_disk = set()
+        changed = {}
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                    continue
+                on_disk.add(entry.name)
+                stat = entry.stat()
+                if known.get(entry.name) != (stat.st_size, stat.st_mtime):
+                    changed[entry.name] = stat
+
+        metadata = self.metadata.get_many(changed)
+        for filename, stat in changed.items():
+            self._upsert(filename, stat.st_size, stat.st_mtime, metadata[filename])
+            if filename in known:
+                updated += 1
+            else:
+                added += 1
+
+        missing = [filename for filename in known if filename not in on_disk]
+        with self._lock:
+            self._conn.executemany("DELETE FROM outputs WHERE filename = ?", [(f,) for f in missing])
+        logger.info(
+            f"Library reconciled in {time.time() - start:.2f}s: "
+            f"{added} added, {updated} updated, {len(missing)} removed, {len(on_disk)} total."
+        )
+
+    def _upsert(self, filename: str, size: int, mtime: float, meta: Dict[str, Any]):
+        with self._lock:
+            # keeps the starred flag of an existing row
+            self._conn.execute(
+                "INSERT INTO outputs (filename, format, size, mtime, title, prompt, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(filename) DO UPDATE SET format = excluded.format, size = excluded.size, "
+                "mtime = excluded.mtime, title = excluded.title, prompt = excluded.prompt, metadata = excluded.metadata",
+                (
+                    filename,
+                    os.path.splitext(filename)[1].lower().lstrip("."),
+                    size,
+                    mtime,
+                    meta.get("title"),
+                    meta.get("prompt"),
+                    json.dumps(meta, ensure_ascii=False),
+                ),
+            )
+
+
+_library: Optional[OutputLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_library() -> OutputLibrary:
+    """The library of settings.OUTPUT_DIR, opened on first use rather than on import."""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = OutputLibrary(settings.OUTPUT_DIR, settings.LIBRARY_DB_PATH)
+        return _library
@@ -1,43 +1,297 @@
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+from acestep.models.engine import AudioEngine
 from acestep.models.factory import get_audio_engine
 from acestep.api.core.config import settings
+from acestep.instrumentation import ENGINE_EVENTS_TOTAL, ENGINE_RESIDENT_BYTES
 
 logger = logging.getLogger("ace_step_api.model")
 
+GB = 1024**3
+
 class ModelManager:
+    """
+    Hosts the named engine variants of settings.ENGINE_VARIANTS (or the worker pool).
+
+    Variants load on first use. Each one's `states` entry moves from 'idle' through
+    'loading' and, with a warm-up generation, 'warming' to 'ready' ('failed' if the
+    load raised, back to 'idle' once evicted). When the loaded variants exceed the
+    RAM / VRAM budget, the least recently used ones that no job is holding (see
+    `acquire`) are unloaded. `status()` and `engines()` never trigger a load.
+    """
     _instance = None
-    engine = None
+    worker_pool = None
+    # engine whose weights the workers share (ACE_SHARED_WEIGHTS); kept for worker restarts
+    weight_source = None
+    _pool_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ModelManager, cls).__new__(cls)
+            cls._instance._init_state()
         return cls._instance
 
-    def load_model(self, checkpoint_path=None):
-        if self.engine is not None:
-            logger.info("Model already loaded.")
+    def _init_state(self):
+        self.resident: "OrderedDict[str, AudioEngine]" = OrderedDict()  # least recently used first
+        self.states: Dict[str, str] = {name: "idle" for name in settings.ENGINE_VARIANTS}
+        self.errors: Dict[str, str] = {}
+        self.footprints: Dict[str, Dict[str, int]] = {}  # kept after eviction to plan the next load
+        self.leases: Dict[str, int] = {}
+        self.events: Deque[dict] = deque(maxlen=100)
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in settings.ENGINE_VARIANTS}
+
+    @staticmethod
+    def resolve(variant: Optional[str] = None) -> str:
+        name = variant or settings.DEFAULT_VARIANT
+        if name not in settings.ENGINE_VARIANTS:
+            raise ValueError(f"Unknown engine variant: {name}")
+        return name
+
+    @property
+    def state(self) -> str:
+        return self.states[settings.DEFAULT_VARIANT]
+
+    def load_model(self, checkpoint_path=None, warm_up=False, variant=None):
+        name = self.resolve(variant)
+        # Callers arriving mid-load wait here instead of loading a second copy
+        with self._load_locks[name]:
+            if name in self.resident:
+                logger.info(f"Engine '{name}' already loaded.")
+                return
+
+            options = dict(settings.ENGINE_VARIANTS[name])
+            model_type = options.pop("type", None)
+            # If checkpoint path not provided, use the variant's, then Env
+            ckpt = checkpoint_path or options.pop("checkpoint", None) or settings.ACE_CHECKPOINT_PATH
+            options.pop("checkpoint", None)
+
+            # make room for what this variant took last time
+            if name in self.footprints:
+                self._evict_for(name, self.footprints[name])
+
+            logger.info(f"Initializing Audio Engine '{name}'...")
+            self.states[name] = "loading"
+            started = time.time()
+            try:
+                engine = get_audio_engine(model_type, **options)
+                engine.load_model(ckpt)
+                logger.info(f"Audio Engine '{name}' initialized successfully.")
+            except Exception as e:
+                logger.error(f"Failed to load model '{name}': {e}")
+                self.states[name] = "failed"
+                self.errors[name] = f"{type(e).__name__}: {e}"
+                raise e
+
+            if warm_up:
+                self.states[name] = "warming"
+                try:
+                    engine.warm_up(self.warmup_params())
+                    logger.info("Warm-up generation finished.")
+                except Exception as e:
+                    # the engine loaded; a real job will surface the problem if there is one
+                    logger.warning(f"Warm-up generation failed: {e}")
+
+            footprint = engine.memory_footprint()
+            with self._lock:
+                self.resident[name] = engine
+                self.footprints[name] = footprint
+            self.states[name] = "ready"
+            self.errors.pop(name, None)
+            self._record("load", name, footprint, seconds=round(time.time() - started, 2))
+            self._evict_for(name)
+
+    def acquire(self, variant: Optional[str] = None) -> AudioEngine:
+        """
+        Returns the variant's engine, loading it if needed, and keeps it from being
+        evicted until the matching `release`. Blocks while the variant loads.
+        """
+        name = self.resolve(variant)
+        while True:
+            with self._lock:
+                engine = self.resident.get(name)
+                if engine is not None:
+                    self.resident.move_to_end(name)
+                    self.leases[name] = self.leases.get(name, 0) + 1
+                    return engine
+            logger.info(f"Lazy loading model '{name}' triggered...")
+            self.load_model(variant=name)
+
+    def release(self, variant: Optional[str] = None):
+        name = self.resolve(variant)
+        with self._lock:
+            self.leases[name] -= 1
+        self._evict_for(name)
+
+    @contextmanager
+    def lease(self, variant: Optional[str] = None):
+        engine = self.acquire(variant)
+        try:
+            yield engine
+        finally:
+            self.release(variant)
+
+    def _evict_for(self, keep: str, incoming: Optional[Dict[str, int]] = None):
+        """Unloads least recently used idle variants (never `keep`) until the budgets fit `incoming` too."""
+        budgets = {"ram": settings.ENGINE_RAM_BUDGET_GB * GB, "vram": settings.ENGINE_VRAM_BUDGET_GB * GB}
+        incoming = incoming or {}
+        while True:
+            with self._lock:
+                used = {kind: incoming.get(kind, 0) for kind in budgets}
+                for name in self.resident:
+                    for kind in budgets:
+                        used[kind] += self.footprints.get(name, {}).get(kind, 0)
+                over = [kind for kind, budget in budgets.items() if budget and used[kind] > budget]
+                if not over:
+                    return
+                victim = next(
+                    (
+                        name for name in self.resident
+                        if name != keep
+                        and not self.leases.get(name)
+                        and any(self.footprints.get(name, {}).get(kind) for kind in over)
+                    ),
+                    None,
+                )
+                if victim is None:
+                    logger.warning(
+                        f"Engines exceed the {'/'.join(over)} budget but no idle variant can be evicted; keeping them loaded."
+                    )
+                    return
+                engine = self.resident.pop(victim)
+                self.states[victim] = "idle"
+            engine.unload()
+            self._record("evict", victim, self.footprints.get(victim, {}))
+
+    def _record(self, event: str, variant: str, footprint: Dict[str, int], **details):
+        ENGINE_EVENTS_TOTAL.inc(event=event, variant=variant)
+        for kind in ("ram", "vram"):
+            ENGINE_RESIDENT_BYTES.set(footprint.get(kind, 0) if event == "load" else 0, variant=variant, memory=kind)
+        self.events.append({"time": time.time(), "event": event, "variant": variant, **footprint, **details})
+        logger.info(f"Engine '{variant}' {event}ed ({', '.join(f'{k}={v}' for k, v in {**footprint, **details}.items())}).")
+
+    def start_warmup(self):
+        """Loads the default engine (or starts the worker pool) on a background thread."""
+        threading.Thread(target=self._warm_up, name="model-warmup", daemon=True).start()
+
+    def _warm_up(self):
+        if settings.NUM_WORKERS > 0:
+            # workers load and warm up themselves and report back; see status()
+            self.get_worker_pool()
             return
+        try:
+            self.load_model(warm_up=settings.WARMUP_GENERATION)
+        except Exception:
+            pass  # already logged; state is 'failed'
+
+    @staticmethod
+    def warmup_params() -> dict:
+        return {
+            "prompt": "warm-up",
+            "duration": settings.WARMUP_DURATION,
+            "steps": settings.WARMUP_STEPS,
+            "seed": 0,
+        }
+
+    def status(self) -> dict:
+        """Readiness of the default variant without side effects: never loads the model."""
+        if self.worker_pool is not None:
+            workers = self.worker_pool.health()
+            ready = sum(worker["ready"] for worker in workers)
+            if ready:
+                state = "ready"
+            elif any(worker["warming"] for worker in workers):
+                state = "warming"
+            else:
+                state = "loading"
+            return {"state": state, "workers_ready": ready, "workers": len(workers)}
+        status = {"state": self.state, "variant": settings.DEFAULT_VARIANT}
+        if settings.DEFAULT_VARIANT in self.errors:
+            status["error"] = self.errors[settings.DEFAULT_VARIANT]
+        return status
+
+    def engines(self) -> dict:
+        """Every configured variant with its state, memory and pending leases, plus recent load / evict events."""
+        with self._lock:
+            order = list(self.resident)
+            variants = [
+                {
+                    "variant": name,
+                    "state": self.states[name],
+                    "resident": name in self.resident,
+                    "lru_rank": order.index(name) if name in self.resident else None,
+                    "leases": self.leases.get(name, 0),
+                    "memory": self.footprints.get(name, {}),
+                    "error": self.errors.get(name),
+                }
+                for name in settings.ENGINE_VARIANTS
+            ]
+            return {"default": settings.DEFAULT_VARIANT, "variants": variants, "events": list(self.events)}
+
+    def get_engine(self, variant=None):
+        """Returns the variant's engine without holding it; jobs use `acquire` / `release`."""
+        name = self.resolve(variant)
+        engine = self.acquire(name)
+        self.release(name)
+        return engine
+
+    def get_pipeline(self, variant=None):
+        return self.get_engine(variant).pipeline
+
+    def get_worker_pool(self):
+        with self._pool_lock:
+            if self.worker_pool is None:
+                from acestep.api.core.worker_pool import WorkerPool
+
+                shared_weights = self._share_weights() if settings.SHARED_WEIGHTS else None
+
+                self.worker_pool = WorkerPool(
+                    num_workers=settings.NUM_WORKERS,
+                    devices=settings.WORKER_DEVICES,
+                    threads_per_worker=settings.WORKER_THREADS,
+                    checkpoint_path=settings.ACE_CHECKPOINT_PATH,
+                    warmup_params=self.warmup_params() if settings.WARMUP_GENERATION else None,
+                    shared_weights=shared_weights,
+                )
+                self.worker_pool.start()
+        return self.worker_pool
 
-        logger.info(f"Initializing Audio Engine...")
+    def _share_weights(self):
+        """Loads the engine once in this process and publishes its weights for the workers."""
+        if any(device != "cpu" for device in settings.WORKER_DEVICES):
+            logger.warning("ACE_SHARED_WEIGHTS applies to CPU workers only; each worker loads its own copy.")
+            return None
         try:
-            self.engine = get_audio_engine()
-            # If checkpoint path not provided, use Env
-            ckpt = checkpoint_path or settings.ACE_CHECKPOINT_PATH
-            self.engine.load_model(ckpt)
-            logger.info("Audio Engine initialized successfully.")
+            engine = get_audio_engine()
+            engine.load_model(settings.ACE_CHECKPOINT_PATH)
+            shared_weights = engine.share_weights()
         except Exception as e:
-            logger.error(f"Failed to load model: {e}")
-            raise e
+            logger.error(f"Could not load the weights to share ({e}); each worker loads its own copy.")
+            return None
+        if shared_weights is not None:
+            self.weight_source = engine
+            logger.info(f"Sharing {engine.memory_footprint().get('ram', 0) / GB:.2f} GB of weights with the workers.")
+        return shared_weights
 
-    def get_engine(self):
-        if self.engine is None:
-            logger.info("Lazy loading model triggered...")
-            self.load_model()
-        return self.engine
+    def memory_report(self) -> Optional[dict]:
+        """Per-process RSS / PSS of the worker pool (see WorkerPool.memory_report); None without one."""
+        if self.worker_pool is None:
+            return None
+        report = self.worker_pool.memory_report()
+        if self.weight_source is not None:
+            report["shared_weights_bytes"] = self.weight_source.memory_footprint().get("ram", 0)
+        return report
 
-    def get_pipeline(self):
-        return self.get_engine().pipeline
+    def shutdown(self):
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+            self.worker_pool = None
+        self.weight_source = None
 
 # Singleton instance
 manager = ModelManager()
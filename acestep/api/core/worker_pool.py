@@ -0,0 +1,374 @@
+import importlib
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from acestep.cancellation import GenerationCancelled
+from acestep.instrumentation import process_memory
+
+logger = logging.getLogger("ace_step_api.workers")
+
+DEFAULT_ENGINE_FACTORY = "acestep.models.factory:get_audio_engine"
+
+
+def _load_factory(path: str) -> Callable[[], Any]:
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _worker_main(
+    slot: int,
+    incarnation: int,
+    device: str,
+    num_threads: int,
+    engine_factory: str,
+    checkpoint_path: Optional[str],
+    inbox,
+    outbox,
+    cancel_event,
+    heartbeat_interval: float,
+    warmup_params: Optional[Dict[str, Any]] = None,
+    shared_weights: Any = None,
+):
+    """Entry point of a worker process: pin the device / thread budget, load one engine, serve tasks."""
+    # must happen before CUDA is initialised in this process (unpickling shared
+    # weights has already imported torch, which initialises CUDA lazily)
+    if device.startswith("cuda"):
+        os.environ["CUDA_VISIBLE_DEVICES"] = device.partition(":")[2] or "0"
+    elif device == "cpu":
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    if num_threads > 0:
+        os.environ["OMP_NUM_THREADS"] = str(num_threads)
+        os.environ["MKL_NUM_THREADS"] = str(num_threads)
+        try:
+            import torch
+
+            torch.set_num_threads(num_threads)
+        except ImportError:
+            pass
+
+    def send(kind, task_id=None, payload=None):
+        outbox.put((kind, slot, incarnation, task_id, payload))
+
+    def heartbeat():
+        while True:
+            send("heartbeat")
+            time.sleep(heartbeat_interval)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+
+    engine = _load_factory(engine_factory)()
+    if shared_weights is not None:
+        engine.shared_weights = shared_weights
+    engine.load_model(checkpoint_path)
+    if warmup_params is not None:
+        send("warming")
+        try:
+            engine.warm_up(warmup_params)
+        except Exception as e:
+            logger.warning(f"Worker {slot} warm-up generation failed: {e}")
+    send("ready")
+
+    while True:
+        task = inbox.get()
+        if task is None:
+            break
+        task_id, params = task
+
+        def progress(p, desc=""):
+            send("progress", task_id, (p, desc))
+
+        try:
+            result = engine.generate({**params, "progress": progress, "cancel_check": cancel_event.is_set})
+            send("done", task_id, result)
+        except GenerationCancelled:
+            send("cancelled", task_id)
+        except Exception as e:
+            send("error", task_id, f"{type(e).__name__}: {e}")
+
+
+class _Worker:
+    def __init__(self, slot: int, device: str):
+        self.slot = slot
+        self.device = device
+        self.incarnation = 0
+        self.process = None
+        self.inbox = None
+        self.cancel_event = None
+        self.ready = False
+        self.warming = False
+        self.task_id: Optional[int] = None
+        self.last_heartbeat = 0.0
+        self.restarts = 0
+        self.crash_streak = 0
+        self.next_start_at = 0.0
+
+
+class WorkerPool:
+    """
+    Runs generations on N worker processes, each holding its own engine pinned to a
+    device (round-robin over `devices`) or a CPU-thread budget.
+
+    `submit` takes the same params as `AudioEngine.generate` and returns a
+    `concurrent.futures.Future`. A worker serves one task at a time. Workers that
+    exit or stop sending heartbeats are restarted (with backoff), and the task they
+    were running fails. With `warmup_params`, each worker runs one throwaway
+    generation after loading, before it reports ready. With `shared_weights` (an
+    engine's `share_weights()` handle), workers build their engines around those
+    weights instead of loading their own; see `memory_report`. A `cancel_check` in the params is polled here and relayed to
+    the worker, which stops at the next step / window boundary.
+    """
+
+    CANCEL_POLL_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        num_workers: int,
+        devices: Optional[List[str]] = None,
+        threads_per_worker: int = 0,
+        engine_factory: str = DEFAULT_ENGINE_FACTORY,
+        checkpoint_path: Optional[str] = None,
+        heartbeat_interval: float = 5.0,
+        heartbeat_timeout: float = 120.0,
+        warmup_params: Optional[Dict[str, Any]] = None,
+        shared_weights: Any = None,
+    ):
+        devices = devices or ["cpu"]
+        self.workers = [_Worker(slot, devices[slot % len(devices)]) for slot in range(num_workers)]
+        self.threads_per_worker = threads_per_worker
+        self.engine_factory = engine_factory
+        self.checkpoint_path = checkpoint_path
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.warmup_params = warmup_params
+        self.shared_weights = shared_weights
+        self._ctx = mp.get_context("spawn")
+        self._outbox = self._ctx.Queue()
+        self._lock = threading.RLock()
+        self._task_ids = itertools.count()
+        self._tasks: Dict[int, tuple] = {}
+        self._pending: Deque[int] = deque()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        self._threads = [
+            threading.Thread(target=self._listen, name="worker-pool-listener", daemon=True),
+            threading.Thread(target=self._supervise, name="worker-pool-supervisor", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Worker pool started with {len(self.workers)} workers.")
+
+    def stop(self, timeout: float = 10.0):
+        self._stop_event.set()
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.inbox.put(None)
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._lock:
+            for _, future, _, _ in self._tasks.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("Worker pool stopped"))
+            self._tasks.clear()
+            self._pending.clear()
+
+    def submit(self, params: Dict[str, Any]) -> Future:
+        future = Future()
+        # callbacks cannot cross the process boundary; progress and cancellation are relayed
+        progress = params.get("progress")
+        cancel_check = params.get("cancel_check")
+        payload = {k: v for k, v in params.items() if k not in ("progress", "cancel_check")}
+        with self._lock:
+            task_id = next(self._task_ids)
+            self._tasks[task_id] = (payload, future, progress, cancel_check)
+            self._pending.append(task_id)
+            self._dispatch()
+        return future
+
+    def health(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "worker": worker.slot,
+                    "device": worker.device,
+                    "pid": worker.process.pid if worker.process is not None else None,
+                    "alive": worker.process is not None and worker.process.is_alive(),
+                    "ready": worker.ready,
+                    "warming": worker.warming,
+                    "busy": worker.task_id is not None,
+                    "restarts": worker.restarts,
+                    "heartbeat_age": round(now - worker.last_heartbeat, 1) if worker.last_heartbeat else None,
+                }
+                for worker in self.workers
+            ]
+
+    def memory_report(self) -> Dict[str, Any]:
+        """
+        RSS, PSS, shared and private bytes of this process and each worker (Linux).
+        Shared weights count in full towards every process's RSS but are split
+        between the processes in PSS, so with sharing `total_pss` stays near one
+        copy of the weights plus each process's private memory, while `total_rss`
+        grows by a full copy per worker.
+        """
+        with self._lock:
+            pids = [("api", os.getpid())] + [
+                (f"worker-{worker.slot}", worker.process.pid)
+                for worker in self.workers
+                if worker.process is not None and worker.process.is_alive()
+            ]
+        processes = []
+        for name, pid in pids:
+            memory = process_memory(pid)
+            if memory is not None:
+                processes.append({"process": name, "pid": pid, **memory})
+        return {
+            "shared_weights": self.shared_weights is not None,
+            "processes": processes,
+            "total_rss": sum(process["rss"] for process in processes),
+            "total_pss": sum(process["pss"] for process in processes),
+        }
+
+    def _spawn(self, worker: _Worker):
+        worker.incarnation += 1
+        worker.ready = False
+        worker.warming = False
+        worker.task_id = None
+        worker.last_heartbeat = time.time()
+        worker.inbox = self._ctx.Queue()
+        worker.cancel_event = self._ctx.Event()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                worker.slot,
+                worker.incarnation,
+                worker.device,
+                self.threads_per_worker,
+                self.engine_factory,
+                self.checkpoint_path,
+                worker.inbox,
+                self._outbox,
+                worker.cancel_event,
+                self.heartbeat_interval,
+                self.warmup_params,
+                self.shared_weights,
+            ),
+            name=f"ace-step-worker-{worker.slot}",
+            daemon=True,
+        )
+        worker.process.start()
+        logger.info(f"Worker {worker.slot} started on {worker.device} (pid {worker.process.pid}).")
+
+    def _dispatch(self):
+        with self._lock:
+            for worker in self.workers:
+                if not self._pending:
+                    return
+                if not worker.ready or worker.task_id is not None:
+                    continue
+                while self._pending:
+                    task_id = self._pending.popleft()
+                    payload, future, progress, cancel_check = self._tasks.pop(task_id)
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    if cancel_check is not None and cancel_check():
+                        future.set_exception(GenerationCancelled("Generation cancelled"))
+                        continue
+                    self._tasks[task_id] = (payload, future, progress, cancel_check)
+                    worker.task_id = task_id
+                    worker.cancel_event.clear()
+                    worker.inbox.put((task_id, payload))
+                    break
+
+    def _listen(self):
+        while not self._stop_event.is_set():
+            try:
+                kind, slot, incarnation, task_id, payload = self._outbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            worker = self.workers[slot]
+            with self._lock:
+                if incarnation != worker.incarnation:
+                    # message from a process that has since been replaced
+                    continue
+                worker.last_heartbeat = time.time()
+                if kind == "warming":
+                    worker.warming = True
+                    continue
+                if kind == "ready":
+                    worker.ready = True
+                    worker.warming = False
+                    worker.crash_streak = 0
+                    logger.info(f"Worker {slot} ready.")
+                    self._dispatch()
+                    continue
+                if kind == "heartbeat":
+                    continue
+                task = self._tasks.get(task_id)
+                if kind == "progress":
+                    if task is not None and task[2] is not None:
+                        task[2](*payload)
+                    continue
+                # done / cancelled / error
+                worker.task_id = None
+                self._tasks.pop(task_id, None)
+                if task is not None:
+                    if kind == "done":
+                        task[1].set_result(payload)
+                    elif kind == "cancelled":
+                        task[1].set_exception(GenerationCancelled("Generation cancelled"))
+                    else:
+                        task[1].set_exception(RuntimeError(payload))
+                self._dispatch()
+
+    def _supervise(self):
+        while not self._stop_event.wait(min(self.heartbeat_interval, self.CANCEL_POLL_INTERVAL)):
+            now = time.time()
+            with self._lock:
+                for worker in self.workers:
+                    if worker.task_id is not None and not worker.cancel_event.is_set():
+                        cancel_check = self._tasks[worker.task_id][3]
+                        if cancel_check is not None and cancel_check():
+                            worker.cancel_event.set()
+                    if worker.process is None:
+                        if now >= worker.next_start_at:
+                            self._spawn(worker)
+                        continue
+                    if not worker.process.is_alive():
+                        self._restart(worker, f"exited with code {worker.process.exitcode}")
+                    elif now - worker.last_heartbeat > self.heartbeat_timeout:
+                        worker.process.terminate()
+                        self._restart(worker, "stopped sending heartbeats")
+
+    def _restart(self, worker: _Worker, reason: str):
+        logger.error(f"Worker {worker.slot} {reason}; restarting.")
+        if worker.task_id is not None:
+            task = self._tasks.pop(worker.task_id, None)
+            if task is not None:
+                task[1].set_exception(RuntimeError(f"Worker {worker.slot} {reason}"))
+        worker.restarts += 1
+        worker.crash_streak += 1
+        worker.process = None
+        worker.ready = False
+        worker.warming = False
+        worker.task_id = None
+        # back off when a worker keeps dying (e.g. while loading the model)
+        worker.next_start_at = time.time() + min(60.0, 2.0 ** (worker.crash_streak - 1))
+        if worker.crash_streak == 1:
+            self._spawn(worker)
@@ -6,9 +6,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from acestep.api.core.concurrency import blocking_executor, loop_lag, run_blocking
 from acestep.api.core.config import settings
+from acestep.api.core.library import get_library
 from acestep.api.core.model_manager import manager
 from acestep.api.services.job_service import JobService
+from acestep.api.services.upload_service import upload_service
 
 from acestep.api.routers import music_router, agent_router, system_router, billing_router
 
@@ -18,19 +21,35 @@ logger = logging.getLogger("ace_step_api")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Load Model (Async/Threaded lazy load handled by manager)
     logger.info("Starting ACE-Step API...")
     if not settings.ACE_CHECKPOINT_PATH:
         logger.warning("ACE_CHECKPOINT_PATH not set.")
 
+    # Startup: load (and warm up) the model in the background; /ready reports progress.
+    # Without this the first job loads it lazily.
+    if settings.WARMUP:
+        manager.start_warmup()
+
+    # Catch the library index up with files added or removed while we were down
+    await run_blocking(get_library().reconcile)
+
+    # Re-enqueue jobs interrupted by the last shutdown
+    JobService.recover_jobs()
+
     # Start Worker
     worker_task = asyncio.create_task(JobService.process_jobs())
+    loop_lag.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
     worker_task.cancel()
+    loop_lag.stop()
+    if upload_service:
+        await upload_service.drain(timeout=30)
+    manager.shutdown()
+    blocking_executor.shutdown(wait=False)
 
 app = FastAPI(title=settings.API_TITLE, version=settings.API_VERSION, lifespan=lifespan)
 
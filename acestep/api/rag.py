@@ -1,8 +1,6 @@
 import os
 import logging
 from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
-from supabase import create_client, Client, ClientOptions
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +19,7 @@ class RAGEngine:
         # Lazy Config
         self.embedding_model_name = os.getenv("RAG_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
         self.model = None
-        self.supabase: Optional[Client] = None
+        self.supabase = None
         self._ready_check_done = False
         
         logger.info("RAG Engine instantiated (Lazy Loading).")
@@ -35,6 +33,10 @@ class RAGEngine:
         if self._ready_check_done and not self.supabase: return False # Failed prev attempt
 
         try:
+            # Heavy imports (torch via sentence_transformers) wait for the first RAG call
+            from sentence_transformers import SentenceTransformer
+            from supabase import ClientOptions, create_client
+
             if not self.model:
                 logger.info(f"Loading Embedding Model: {self.embedding_model_name}...")
                 self.model = SentenceTransformer(self.embedding_model_name)
@@ -7,12 +7,12 @@ router = APIRouter()
 
 @router.get("/llm/models")
 async def get_llm_models():
-    return {"models": AgentService.get_models()}
+    return {"models": await AgentService.get_models()}
 
 @router.post("/llm/generate_lyrics")
 async def generate_lyrics_endpoint(req: LyricsRequest):
     try:
-        lyrics = AgentService.generate_lyrics(req.topic, req.mood, req.language, req.model)
+        lyrics = await AgentService.generate_lyrics(req.topic, req.mood, req.language, req.model)
         return {"lyrics": lyrics}
     except Exception as e:
         raise e
@@ -1,10 +1,14 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
 from acestep.api.schemas import GenerationRequest, JobStatus
 from acestep.api.services.job_service import JobService
+from acestep.api.services.progress_service import format_sse, progress_broker
+from acestep.api.core.concurrency import run_blocking
 from acestep.api.core.config import settings
+from acestep.api.core.library import get_library
 from acestep.api.rag import rag_engine
-import os
-import json
+from acestep.metadata_store import get_metadata_store
 
 router = APIRouter()
 
@@ -16,59 +20,109 @@ async def generate_music(req: GenerationRequest):
 async def get_status(job_id: str):
     return JobService.get_job(job_id)
 
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events stream of the job's progress.
+    Ends with a 'completed' (result paths in data.result), 'failed' or 'cancelled' event;
+    when cloud upload is on, 'completed' is followed by 'synced' (data.cloud_urls) or 'sync_failed' (data.sync_error).
+    """
+    job = JobService.get_job(job_id)
+
+    async def event_stream():
+        async for event in progress_broker.stream(job):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws/jobs/{job_id}")
+async def job_events_ws(websocket: WebSocket, job_id: str):
+    """Same events as /jobs/{job_id}/events, as JSON messages."""
+    await websocket.accept()
+    try:
+        job = JobService.get_job(job_id)
+    except HTTPException as e:
+        await websocket.close(code=4404, reason=e.detail)
+        return
+    try:
+        async for event in progress_broker.stream(job):
+            if event is not None:
+                await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/jobs", response_model=List[JobStatus])
+async def list_jobs(user_id: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+    return JobService.list_jobs(user_id=user_id, status=status, limit=limit)
+
+@router.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    return await JobService.cancel_job(job_id)
+
 @router.get("/history")
-async def get_history():
-    output_dir = settings.OUTPUT_DIR
-    if not os.path.exists(output_dir):
-        return {"files": []}
-        
-    files = [f for f in os.listdir(output_dir) if f.lower().endswith((".wav", ".mp3", ".flac", ".ogg"))]
-    # Sort by modification time (newest first)
-    files.sort(key=lambda x: os.path.getmtime(os.path.join(output_dir, x)), reverse=True)
-    return {"files": files}
+async def get_history(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    q: Optional[str] = None,
+    starred: Optional[bool] = None,
+    format: Optional[str] = None,
+    order: Literal["newest", "oldest"] = "newest",
+):
+    """
+    Outputs newest first, from the library index. `files` lists the filenames;
+    `items` carries each file's size, mtime, starred flag and metadata.
+    """
+    total, items = await run_blocking(
+        get_library().query,
+        offset=offset, limit=limit, search=q, starred=starred, format=format, oldest_first=order == "oldest"
+    )
+    return {
+        "files": [item["filename"] for item in items],
+        "items": items,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+    }
 
 @router.delete("/files/{filename}")
 async def delete_file(filename: str):
-    JobService.delete_local_file(filename)
+    await run_blocking(JobService.delete_local_file, filename)
     return {"status": "deleted", "file": filename}
 
 @router.patch("/files/{filename}/rename")
 async def rename_file(filename: str, new_name: str):
-    res = JobService.rename_local_file(filename, new_name)
+    res = await run_blocking(JobService.rename_local_file, filename, new_name)
     return {"status": "renamed", **res}
 
+@router.get("/files/{filename}/metadata")
+async def get_file_metadata(filename: str):
+    if any(x in filename for x in ["..", "/", "\\"]):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    meta = await run_blocking(get_metadata_store(settings.OUTPUT_DIR).get, filename)
+    if not meta:
+        raise HTTPException(status_code=404, detail="No metadata for this file")
+    return meta
+
 @router.post("/files/{filename}/star")
 async def star_file(filename: str):
     """
     Indexes the file's prompt and lyrics into Agent Memory (RAG).
     """
-    output_dir = settings.OUTPUT_DIR
-    base_name = os.path.splitext(filename)[0]
-    
-    # Try looking for sidecar JSON
-    json_path = os.path.join(output_dir, base_name + ".json")
-    meta = {}
-    
-    if os.path.exists(json_path):
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                meta = json.load(f)
-        except: pass
-    
-    # Also look for input_params if above is empty or missing
-    if not meta:
-        params_path = os.path.join(output_dir, base_name + "_input_params.json")
-        if os.path.exists(params_path):
-            try:
-                with open(params_path, 'r', encoding='utf-8') as f:
-                    meta = json.load(f)
-            except: pass
+    meta = await run_blocking(get_metadata_store(settings.OUTPUT_DIR).get, filename)
 
+    await run_blocking(get_library().set_starred, filename)
     indexed_count = 0
     
+    # Embedding + insert: on the blocking executor, not the event loop
     # Index Audio Prompt
     if meta.get("prompt"):
-        rag_engine.index_item(
+        await run_blocking(
+            rag_engine.index_item,
             content=meta["prompt"], 
             type="audio_prompt", 
             metadata={"filename": filename}
@@ -77,7 +131,8 @@ async def star_file(filename: str):
         
     # Index Lyrics
     if meta.get("lyrics"):
-        rag_engine.index_item(
+        await run_blocking(
+            rag_engine.index_item,
             content=meta["lyrics"], 
             type="lyrics", 
             metadata={"filename": filename}
@@ -1,4 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from acestep import instrumentation
+from acestep.api.core.concurrency import loop_lag
+from acestep.api.core.config import settings
 from acestep.api.core.model_manager import manager
 
 router = APIRouter()
@@ -9,10 +13,37 @@ def ping():
 
 @router.get("/health")
 async def health():
-    ready = False
-    try:
-        manager.get_pipeline()
-        ready = True
-    except:
-        pass
-    return {"status": "healthy", "model_ready": ready}
+    model = manager.status()
+    return {"status": "healthy", "model_ready": model["state"] == "ready", "model": model, "loop_lag": loop_lag.snapshot()}
+
+@router.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 once the model is loaded (and warmed up), 503 while it is
+    'loading', 'warming' or 'failed'. With ACE_WARMUP off the model loads on the first
+    job, so 'idle' counts as ready.
+    """
+    model = manager.status()
+    ready = model["state"] == "ready" or (model["state"] == "idle" and not settings.WARMUP)
+    return JSONResponse(model, status_code=200 if ready else 503)
+
+@router.get("/engines")
+def engines():
+    """Engine variants with their state, memory and LRU order, plus recent load / evict events."""
+    return manager.engines()
+
+@router.get("/workers/memory")
+def workers_memory():
+    """
+    RSS / PSS per process of the worker pool. With ACE_SHARED_WEIGHTS the workers'
+    PSS stays well below their RSS, since the weight pages are mapped by all of them.
+    """
+    report = manager.memory_report()
+    if report is None:
+        return JSONResponse({"detail": "No worker pool is running."}, status_code=404)
+    return report
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(instrumentation.render(), media_type="text/plain; version=0.0.4")
@@ -22,15 +22,25 @@ class GenerationRequest(BaseModel):
     parent_id: Optional[str] = None
     cover_image: Optional[str] = None
     user_id: Optional[str] = None
+    # Engine variant to generate with (settings.ENGINE_VARIANTS; None = the default)
+    variant: Optional[str] = None
+    # Seconds from submission after which the job is abandoned and refunded
+    timeout: Optional[float] = Field(None, gt=0)
 
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # queued, processing, completed, failed
+    status: str  # queued, processing, completed, failed, cancelled
     created_at: float
+    started_at: Optional[float] = None
     progress: float = 0.0
     message: str = ""
     result: Optional[List[str]] = None # List of file paths or URLs
     error: Optional[str] = None
+    # Cloud upload of the results: completed_local -> synced | sync_failed (None when uploads are off)
+    sync_status: Optional[str] = None
+    # One per result file (None for files that failed to upload)
+    cloud_urls: Optional[List[Optional[str]]] = None
+    sync_error: Optional[str] = None
 
 class LyricsRequest(BaseModel):
     topic: str
@@ -1,15 +1,23 @@
-import requests
-import json
+import httpx
 from typing import AsyncGenerator, Dict, List
 from fastapi import HTTPException
+from acestep.api.core.concurrency import run_blocking
 from acestep.api.core.config import settings
-from acestep.api.agents.director import process_user_intent
+
+
+def _director():
+    """The agents (smolagents / LiteLLM, RAG) build their models at import time, so they load on the first chat."""
+    from acestep.api.agents import director
+
+    return director
+
 
 class AgentService:
     @staticmethod
-    def get_models() -> List[str]:
+    async def get_models() -> List[str]:
         try:
-            res = requests.get(f"{settings.OLLAMA_BASE_URL}/api/tags", timeout=5)
+            async with httpx.AsyncClient(timeout=5) as client:
+                res = await client.get(f"{settings.OLLAMA_BASE_URL}/api/tags")
             if res.status_code == 200:
                 data = res.json()
                 return [m["name"] for m in data.get("models", [])]
@@ -18,7 +26,7 @@ class AgentService:
         return []
 
     @staticmethod
-    def generate_lyrics(topic: str, mood: str, language: str, model: str) -> str:
+    async def generate_lyrics(topic: str, mood: str, language: str, model: str) -> str:
         prompt = (
             f"Write song lyrics. \n"
             f"Topic: {topic}\n"
@@ -29,11 +37,12 @@ class AgentService:
         )
         
         try:
-            res = requests.post(f"{settings.OLLAMA_BASE_URL}/api/generate", json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False
-            }, timeout=60)
+            async with httpx.AsyncClient(timeout=60) as client:
+                res = await client.post(f"{settings.OLLAMA_BASE_URL}/api/generate", json={
+                    "model": model,
+                    "prompt": prompt,
+                    "stream": False
+                })
             
             if res.status_code == 200:
                 return res.json().get("response", "")
@@ -46,6 +55,7 @@ class AgentService:
 
     @staticmethod
     async def chat_stream(message: str, history: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+        director = await run_blocking(_director)
         # Iterate over the Director's generator
-        async for chunk in process_user_intent(message, history):
+        async for chunk in director.process_user_intent(message, history):
              yield chunk + "\n"
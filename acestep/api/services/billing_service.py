@@ -1,13 +1,20 @@
 import logging
-import stripe
 from fastapi import HTTPException
-from acestep.api.core.database import get_db
+from acestep.api.core.concurrency import run_blocking
+from acestep.api.core.database import get_async_db, get_db
+from acestep.api.core.lazy import LazyModule
+from acestep.api.core.ledger import balance_cache, ledger
 from acestep.api.core.config import settings
 
 logger = logging.getLogger("ace_step_api.billing")
 
-if settings.STRIPE_SECRET_KEY:
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+
+def _configure_stripe(module):
+    if settings.STRIPE_SECRET_KEY:
+        module.api_key = settings.STRIPE_SECRET_KEY
+
+# Imported on the first billing call
+stripe = LazyModule("stripe", setup=_configure_stripe)
 
 class BillingService:
     
@@ -99,7 +106,8 @@ class BillingService:
             return {"status": "ignored", "reason": "no_secret"}
 
         try:
-            event = stripe.Webhook.construct_event(
+            event = await run_blocking(
+                stripe.Webhook.construct_event,
                 body, sig_header, settings.STRIPE_WEBHOOK_SECRET
             )
         except ValueError:
@@ -132,7 +140,7 @@ class BillingService:
                 try:
                     sub_id = data_obj.get('subscription')
                     if sub_id:
-                        sub = stripe.Subscription.retrieve(sub_id)
+                        sub = await run_blocking(stripe.Subscription.retrieve, sub_id)
                         user_id = sub.metadata.get('user_id')
                 except: pass
 
@@ -154,7 +162,7 @@ class BillingService:
                 
                 # Update Subscription Status (Ref: Migration 10)
                 if event['type'] == 'checkout.session.completed' and metadata.get('type') == 'subscription':
-                     BillingService.update_subscription_status(user_id, 'active', stripe_sub_id=data_obj.get('subscription'))
+                     await run_blocking(BillingService.update_subscription_status, user_id, 'active', stripe_sub_id=data_obj.get('subscription'))
 
                 logger.info(f"Stripe: Added {credits_to_add} credits to {user_id}")
 
@@ -163,74 +171,49 @@ class BillingService:
     @staticmethod
     async def add_credits(user_id: str, amount: int, reason: str, metadata: dict = {}):
         """Internal method to add credits transactionally"""
-        supabase = get_db()
-        if not supabase: return
+        if ledger is None: return
 
-        # Get Current
-        res = supabase.table("wallets").select("balance").eq("user_id", user_id).single().execute()
-        if not res.data: return # User has no wallet?
-        
-        current = res.data['balance']
-        new_bal = current + amount
-        
-        # Update Wallet
-        supabase.table("wallets").update({"balance": new_bal}).eq("user_id", user_id).execute()
-        
-        # Log Transaction
-        supabase.table("transactions").insert({
-            "user_id": user_id,
-            "amount": amount,
-            "reason": reason,
-            "metadata": metadata
-        }).execute()
+        # Purchases and refunds change the balance behind the cache's back
+        balance_cache.invalidate(user_id)
+        new_bal = await ledger.credit(user_id, amount, reason, metadata)
+        balance_cache.set(user_id, new_bal)
 
     @staticmethod
-    def deduct_credits(user_id: str, cost: int, job_id: str, task: str):
-        supabase = get_db()
-        if not supabase:
-            # If no DB, we skip billing (Local Mode)
-            # Or should we enforce it? 
-            # Current logic: "If supabase:"
+    async def deduct_credits(user_id: str, cost: int, job_id: str, task: str):
+        if ledger is None:
+            # If no ledger, we skip billing (Local Mode)
             return
 
+        # Known to be short: reject without a round trip. A local ledger's cached balance
+        # is exact; a shared one may have been credited by another process (e.g. the
+        # webhook), so there only a balance it has just declined counts and the RPC
+        # decides everything else.
+        cached = balance_cache.get(user_id, declined_only=not ledger.local)
+        if cached is not None and cached < cost:
+            raise HTTPException(status_code=402, detail=f"Insufficient credits ({cached} < {cost}). Please top up.")
+
         try:
-            # Check Balance
-            wallet_res = supabase.table("wallets").select("balance").eq("user_id", user_id).single().execute()
-            
-            if wallet_res.data:
-                balance = wallet_res.data.get("balance", 0)
-                
-                if balance < cost:
-                    raise HTTPException(status_code=402, detail=f"Insufficient credits ({balance} < {cost}). Please top up.")
-                
-                # Deduct
-                new_bal = balance - cost
-                supabase.table("wallets").update({"balance": new_bal}).eq("user_id", user_id).execute()
-                
-                # Transaction Log
-                supabase.table("transactions").insert({
-                    "user_id": user_id,
-                    "amount": -cost,
-                    "reason": "generation",
-                    "metadata": {"job_id": job_id, "task": task}
-                }).execute()
-                
-                logger.info(f"User {user_id} spent {cost} credits. New Balance: {new_bal}")
-                
-        except HTTPException:
-            raise
+            # Single atomic debit (balance check, update and transaction log in one call)
+            result = await ledger.debit(user_id, cost, "generation", {"job_id": job_id, "task": task})
         except Exception as e:
             # For Studio Refactor stability: Log error but allow generation if billing fails
             logger.error(f"Billing System Error (Non-blocking): {e}")
-            # raise HTTPException(status_code=500, detail=f"Billing failed: {e}")
+            return
+
+        balance_cache.set(user_id, result.balance, declined=not result.ok)
+        if not result.ok:
+            raise HTTPException(status_code=402, detail=f"Insufficient credits ({result.balance} < {cost}). Please top up.")
+        if result.balance is not None:
+            logger.info(f"User {user_id} spent {cost} credits. New Balance: {result.balance}")
+
     @staticmethod
-    def get_history(user_id: str, limit: int = 20):
+    async def get_history(user_id: str, limit: int = 20):
         """Fetch recent transaction history."""
-        supabase = get_db()
+        supabase = await get_async_db()
         if not supabase: return []
         
         try:
-            res = supabase.table("transactions")\
+            res = await supabase.table("transactions")\
                 .select("*")\
                 .eq("user_id", user_id)\
                 .order("created_at", desc=True)\
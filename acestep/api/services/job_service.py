@@ -4,139 +4,559 @@ import uuid
 import time
 import os
 import re
-import json
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 from fastapi import HTTPException
 from acestep.api.schemas import GenerationRequest, JobStatus
+from acestep.api.core.concurrency import run_blocking
 from acestep.api.core.config import settings
-from acestep.api.core.database import get_db
+from acestep.api.core.job_store import create_job_store
+from acestep.api.core.library import get_library
 from acestep.api.core.model_manager import manager
 from acestep.api.services.billing_service import BillingService
+from acestep.api.services.progress_service import progress_broker
+from acestep.api.services.result_cache import request_key, result_cache
+from acestep.api.services.upload_service import upload_service
+from acestep.cancellation import GenerationCancelled
+from acestep.instrumentation import (
+    JOB_SECONDS,
+    JOBS_TOTAL,
+    QUEUE_DEPTH,
+    QUEUE_WAIT_SECONDS,
+    REAL_TIME_FACTOR,
+    duration_bucket,
+    track_peak_memory,
+)
+from acestep.metadata_store import get_metadata_store
+from acestep.tracing import Span, SpanContext, attach, tracer
 
 logger = logging.getLogger("ace_step_api.jobs")
 
 # Global State
-JOBS: Dict[str, JobStatus] = {}
+JOB_STORE = create_job_store()
 TASK_QUEUE: asyncio.Queue = asyncio.Queue()
-REQUEST_STORE: Dict[str, GenerationRequest] = {}
+RUNNING_TASKS: Set[asyncio.Task] = set()
+CANCEL_REQUESTS: Set[str] = set()
+# Root span of each traced job, open from submit until the job settles
+JOB_SPANS: Dict[str, Span] = {}
+# Submits holding a result-cache reservation while they are billed; resolve to the queued job (or None)
+PENDING_SUBMITS: Dict[str, "asyncio.Future[Optional[JobStatus]]"] = {}
+QUEUE_DEPTH.set_function(TASK_QUEUE.qsize)
+
+GENERATION_COST = 5
 
 class JobService:
     
     @staticmethod
     async def submit_job(req: GenerationRequest) -> JobStatus:
         job_id = str(uuid.uuid4())
-        
-        # 1. Billing
-        if req.user_id:
-            # Check credits (Cost = 5 for now)
-            BillingService.deduct_credits(req.user_id, 5, job_id, req.task)
-            
-        # 2. Enqueue
+        root = tracer.start_span("job", job_id=job_id, task=req.task, duration=req.duration)
+        if root is not None:
+            JOB_SPANS[job_id] = root
+        try:
+            with tracer.span("submit", parent=root.context if root else None):
+                job = await JobService._submit(job_id, req)
+        except BaseException as e:
+            JobService._end_trace(job_id, error=e)
+            raise
+        if job.job_id != job_id or job.status == "completed":
+            # attached to an in-flight job or served from cache
+            JobService._end_trace(job_id)
+        return job
+
+    @staticmethod
+    async def _submit(job_id: str, req: GenerationRequest) -> JobStatus:
+        if req.variant:
+            if req.variant not in settings.ENGINE_VARIANTS:
+                raise HTTPException(status_code=400, detail=f"Unknown variant '{req.variant}'")
+            if settings.NUM_WORKERS > 0 and req.variant != settings.DEFAULT_VARIANT:
+                raise HTTPException(status_code=400, detail="Worker processes serve the default variant only")
+
+        # 0. Identical seeded request: reuse its outputs or join the job producing them
+        cache_key = request_key(req) if settings.RESULT_CACHE else None
+        if cache_key:
+            cached = await JobService._from_cache(job_id, cache_key, req)
+            if cached:
+                return cached
+            # reserve the key before the first await, so that identical requests
+            # arriving while this one is billed join it instead of paying again
+            result_cache.begin(cache_key, job_id)
+            PENDING_SUBMITS[job_id] = asyncio.get_running_loop().create_future()
+
+        job = None
+        try:
+            # 1. Billing
+            if req.user_id:
+                # Check credits (Cost = 5 for now)
+                with tracer.span("billing"):
+                    await BillingService.deduct_credits(req.user_id, GENERATION_COST, job_id, req.task)
+
+            # 2. Enqueue
+            job = JobStatus(
+                job_id=job_id,
+                status="queued",
+                created_at=time.time(),
+                progress=0.0,
+                message="Queued for processing"
+            )
+            JOB_STORE.add(job, req)
+        finally:
+            if cache_key:
+                if job is None:
+                    result_cache.release(cache_key, job_id)
+                PENDING_SUBMITS.pop(job_id).set_result(job)
+
+        await TASK_QUEUE.put(job_id)
+        logger.info(f"Job {job_id} submitted.")
+        return job
+
+    @staticmethod
+    async def _from_cache(job_id: str, cache_key: str, req: GenerationRequest) -> Optional[JobStatus]:
+        # an identical request that is still being billed either queues its job or gives up the key
+        while result_cache.in_flight(cache_key) in PENDING_SUBMITS:
+            job = await asyncio.shield(PENDING_SUBMITS[result_cache.in_flight(cache_key)])
+            if job is not None:
+                logger.info(f"Request matches in-flight job {job.job_id}; attaching.")
+                return job
+
+        in_flight_id = result_cache.in_flight(cache_key)
+        if in_flight_id:
+            job = JOB_STORE.get(in_flight_id)
+            if job is not None and job.status in ("queued", "processing"):
+                logger.info(f"Request matches in-flight job {in_flight_id}; attaching.")
+                return job
+            result_cache.release(cache_key, in_flight_id)
+
+        paths = result_cache.lookup(cache_key)
+        if paths is None:
+            return None
         job = JobStatus(
             job_id=job_id,
-            status="queued",
+            status="completed",
             created_at=time.time(),
-            progress=0.0,
-            message="Queued for processing"
+            progress=1.0,
+            message="Served from cache",
+            result=paths
         )
-        
-        JOBS[job_id] = job
-        REQUEST_STORE[job_id] = req
-        
-        await TASK_QUEUE.put(job_id)
-        logger.info(f"Job {job_id} submitted.")
+        JOB_STORE.add(job, req)
+        JOB_STORE.release_request(job_id)
+        JOBS_TOTAL.inc(status="cached")
+        logger.info(f"Job {job_id} served from result cache.")
         return job
 
     @staticmethod
     def get_job(job_id: str) -> JobStatus:
-        if job_id not in JOBS:
+        job = JOB_STORE.get(job_id)
+        if job is None:
             raise HTTPException(status_code=404, detail="Job not found")
-        return JOBS[job_id]
+        return job
+
+    @staticmethod
+    async def cancel_job(job_id: str) -> JobStatus:
+        job = JobService.get_job(job_id)
+        if job.status not in ("queued", "processing"):
+            raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+
+        CANCEL_REQUESTS.add(job_id)
+        if job.status == "queued":
+            # Never started: settle now, the worker skips it when dequeued
+            await JobService._cancel_job(job_id, job, JOB_STORE.get_request(job_id))
+        else:
+            # The pipeline stops at its next step / window boundary
+            job.message = "Cancelling..."
+            progress_broker.publish(job)
+        logger.info(f"Job {job_id} cancellation requested.")
+        return job
+
+    @staticmethod
+    def list_jobs(user_id: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[JobStatus]:
+        if user_id:
+            jobs = JOB_STORE.list_by_user(user_id, limit=limit)
+            return [job for job in jobs if not status or job.status == status]
+        if status:
+            return JOB_STORE.list_by_status(status, limit=limit)
+        raise HTTPException(status_code=400, detail="user_id or status is required")
+
+    @staticmethod
+    def recover_jobs():
+        """Re-enqueues jobs a previous process left queued or processing."""
+        recovered = 0
+        for job_id in JOB_STORE.pending_job_ids():
+            job = JOB_STORE.get(job_id)
+            if job is None:
+                continue
+            if JOB_STORE.get_request(job_id) is None:
+                job.status = "failed"
+                job.error = "Request data lost during restart"
+                JobService._save(job)
+                continue
+            job.status = "queued"
+            job.progress = 0.0
+            job.message = "Re-queued after restart"
+            JobService._save(job)
+            TASK_QUEUE.put_nowait(job_id)
+            recovered += 1
+        if recovered:
+            logger.info(f"Recovered {recovered} unfinished jobs.")
 
     @staticmethod
     async def process_jobs():
         """Background Worker Loop"""
         logger.info("Job Worker started.")
-        loop = asyncio.get_running_loop()
         
         while True:
             job_id = await TASK_QUEUE.get()
-            job = JOBS.get(job_id)
-            if not job:
-                TASK_QUEUE.task_done()
-                continue
 
-            req = REQUEST_STORE.get(job_id)
-            if not req:
-                logger.error(f"Request data missing for job {job_id}")
-                job.status = "failed"
-                job.error = "Request data corrupt"
-                TASK_QUEUE.task_done()
-                continue
-            
+            if settings.CONTINUOUS_BATCHING:
+                entry = JobService._claim_job(job_id)
+                if not entry:
+                    continue
+                # The engine admits the job into its running batch; keep pulling
+                task = asyncio.create_task(JobService._run_job(*entry, JobService._generate_batched))
+                RUNNING_TASKS.add(task)
+                task.add_done_callback(RUNNING_TASKS.discard)
+
+            elif settings.NUM_WORKERS > 0:
+                entry = JobService._claim_job(job_id)
+                if not entry:
+                    continue
+                # The pool queues the job until a worker process is free
+                task = asyncio.create_task(JobService._run_job(*entry, JobService._generate_pooled))
+                RUNNING_TASKS.add(task)
+                task.add_done_callback(RUNNING_TASKS.discard)
+
+            elif settings.BATCH_WINDOW_MS > 0:
+                # Static batching: collect what arrives within the window, run compatible jobs together
+                job_ids = [job_id] + await JobService._drain_queue(settings.BATCH_WINDOW_MS / 1000)
+                entries = [entry for entry in map(JobService._claim_job, job_ids) if entry]
+                for group in JobService._group_jobs(entries):
+                    if len(group) == 1:
+                        await JobService._run_job(*group[0], JobService._generate_exclusive)
+                    else:
+                        await JobService._run_job_batch(group)
+
+            else:
+                entry = JobService._claim_job(job_id)
+                if entry:
+                    await JobService._run_job(*entry, JobService._generate_exclusive)
+
+    @staticmethod
+    def _save(job: JobStatus):
+        """Records a state transition and pushes it to event subscribers."""
+        JOB_STORE.save(job)
+        progress_broker.publish(job)
+
+    @staticmethod
+    def _claim_job(job_id: str) -> Optional[Tuple[str, JobStatus, GenerationRequest]]:
+        job = JOB_STORE.get(job_id)
+        if not job:
+            TASK_QUEUE.task_done()
+            return None
+
+        if job.status == "cancelled":
+            JobService._release_job(job_id)
+            return None
+
+        req = JOB_STORE.get_request(job_id)
+        if not req:
+            logger.error(f"Request data missing for job {job_id}")
+            job.status = "failed"
+            job.error = "Request data corrupt"
+            JobService._save(job)
+            TASK_QUEUE.task_done()
+            return None
+        return job_id, job, req
+
+    @staticmethod
+    async def _drain_queue(window: float) -> List[str]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + window
+        job_ids = []
+        while True:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
             try:
-                job.status = "processing"
-                job.progress = 0.05
-                job.message = "Initializing pipeline..."
-                
-                # Progress Callback
-                def progress_callback(p, desc=""):
-                    job.progress = p
-                    job.message = desc
-                
-                logger.info(f"Generating for Job {job_id}...")
-                engine = manager.get_engine()
-                
-                pipeline_params = {
-                    "prompt": req.prompt,
-                    "lyrics": req.lyrics or "",
-                    "duration": req.duration,
-                    "steps": req.infer_steps,
-                    "cfg_scale": req.guidance_scale,
-                    "seed": req.seed,
-                    "cfg_type": req.cfg_type,
-                    "scheduler_type": req.scheduler_type,
-                    "use_erg_lyric": False,
-                    "format": req.format,
-                    "progress": progress_callback,
-                    "task": req.task,
-                    "retake_variance": req.retake_variance,
-                    "repaint_start": req.repaint_start,
-                    "repaint_end": req.repaint_end
-                }
-                
-                output_paths = await loop.run_in_executor(
-                    None, 
-                    lambda: engine.generate(pipeline_params)
-                )
-                
-                file_results = [p for p in output_paths if isinstance(p, str)]
-                
-                # --- Post Processing (Rename & Metadata) ---
-                file_results = JobService._handle_renaming(file_results, req, job_id)
+                job_ids.append(await asyncio.wait_for(TASK_QUEUE.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return job_ids
+
+    @staticmethod
+    def _batch_key(req: GenerationRequest) -> Optional[tuple]:
+        # Only plain text2music runs share a pipeline call; everything else runs alone.
+        # Batched samples are not padded, so they need the same latent frame length
+        if req.task != "text2music":
+            return None
+        frame_length = int(req.duration * 44100 / 512 / 8)
+        return (
+            req.task,
+            req.scheduler_type,
+            req.cfg_type,
+            req.infer_steps,
+            req.guidance_scale,
+            req.format,
+            req.variant or settings.DEFAULT_VARIANT,
+            frame_length,
+        )
+
+    @staticmethod
+    def _group_jobs(entries: List[Tuple[str, JobStatus, GenerationRequest]]) -> List[list]:
+        groups: Dict[tuple, list] = {}
+        for entry in entries:
+            key = JobService._batch_key(entry[2])
+            if key is None:
+                key = ("single", entry[0])
+            groups.setdefault(key, []).append(entry)
+
+        batches = []
+        for group in groups.values():
+            for i in range(0, len(group), settings.MAX_BATCH_SIZE):
+                batches.append(group[i:i + settings.MAX_BATCH_SIZE])
+        return batches
+
+    @staticmethod
+    async def _generate_exclusive(engine, pipeline_params: dict) -> list:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, 
+            lambda: JobService._measure_memory(engine.generate, pipeline_params)
+        )
+
+    @staticmethod
+    async def _generate_batched(engine, pipeline_params: dict) -> list:
+        return await asyncio.wrap_future(engine.submit(pipeline_params))
+
+    @staticmethod
+    async def _generate_pooled(engine, pipeline_params: dict) -> list:
+        return await asyncio.wrap_future(manager.get_worker_pool().submit(pipeline_params))
+
+    @staticmethod
+    def _trace_context(job_id: str) -> Optional[SpanContext]:
+        span = JOB_SPANS.get(job_id)
+        return span.context if span else None
+
+    @staticmethod
+    def _end_trace(job_id: str, error: Optional[BaseException] = None, **attributes):
+        span = JOB_SPANS.pop(job_id, None)
+        if span is not None:
+            span.attributes.update(attributes)
+            tracer.end_span(span, error=error)
+
+    @staticmethod
+    def _measure_memory(generate, params):
+        # Only for generations that have the process to themselves
+        with track_peak_memory():
+            return generate(params)
+
+    @staticmethod
+    def _start_job(job: JobStatus, req: GenerationRequest) -> dict:
+        job.status = "processing"
+        job.started_at = time.time()
+        QUEUE_WAIT_SECONDS.observe(job.started_at - job.created_at)
+        trace_context = JobService._trace_context(job.job_id)
+        tracer.record("queue_wait", trace_context, job.created_at, job.started_at)
+        job.progress = 0.05
+        job.message = "Initializing pipeline..."
+        JobService._save(job)
+        
+        # Progress Callback
+        def progress_callback(p, desc=""):
+            job.progress = p
+            job.message = desc
+            progress_broker.publish(job)
+        
+        return {
+            "cancel_check": JobService._cancel_check(job, req),
+            "prompt": req.prompt,
+            "lyrics": req.lyrics or "",
+            "duration": req.duration,
+            "steps": req.infer_steps,
+            "cfg_scale": req.guidance_scale,
+            "seed": req.seed,
+            "cfg_type": req.cfg_type,
+            "scheduler_type": req.scheduler_type,
+            "use_erg_lyric": False,
+            "format": req.format,
+            "progress": progress_callback,
+            "task": req.task,
+            "retake_variance": req.retake_variance,
+            "repaint_start": req.repaint_start,
+            "repaint_end": req.repaint_end,
+            "trace_context": trace_context,
+        }
+
+    @staticmethod
+    async def _complete_job(job_id: str, job: JobStatus, req: GenerationRequest, output_paths: list):
+        file_results = [p for p in output_paths if isinstance(p, str)]
+        
+        # --- Post Processing (Rename, Metadata, Library; file and SQLite I/O) ---
+        file_results = await run_blocking(JobService._postprocess, file_results, req, job_id)
+        
+        job.status = "completed"
+        job.progress = 1.0
+        job.message = "Generation complete"
+        job.result = file_results # Returning Local Paths (Frontend handles URL conversion)
+        elapsed = time.time() - job.started_at
+        JOB_SECONDS.observe(elapsed, task=req.task)
+        REAL_TIME_FACTOR.observe(elapsed / req.duration, duration_bucket=duration_bucket(req.duration))
+        JOBS_TOTAL.inc(status="completed")
+
+        # --- Cloud Sync (in the background; the worker moves on) ---
+        if upload_service and file_results:
+            upload_service.enqueue(
+                job, file_results, on_update=JobService._save, trace_context=JobService._trace_context(job_id)
+            )
+        JobService._save(job)
+
+        cache_key = request_key(req) if settings.RESULT_CACHE else None
+        if cache_key:
+            await run_blocking(result_cache.put, cache_key, job_id, file_results)
+        
+        JobService._end_trace(job_id, status="completed")
+        logger.info(f"Job {job_id} completed.")
+
+    @staticmethod
+    def _postprocess(file_results: List[str], req: GenerationRequest, job_id: str) -> List[str]:
+        with attach(JobService._trace_context(job_id)), tracer.span("postprocess"):
+            file_results = JobService._handle_renaming(file_results, req, job_id)
+            with tracer.span("inject_metadata"):
                 JobService._inject_metadata(file_results, req)
-                
-                # --- Cloud Sync ---
-                cloud_urls = JobService._sync_to_cloud(file_results)
-                
-                job.status = "completed"
-                job.progress = 1.0
-                job.message = "Generation complete"
-                job.result = file_results # Returning Local Paths (Frontend handles URL conversion)
-                
-                logger.info(f"Job {job_id} completed.")
+            for path in file_results:
+                get_library().add(path)
+        return file_results
+
+    @staticmethod
+    def _fail_job(job_id: str, job: JobStatus, e: Exception):
+        logger.error(f"Job {job_id} failed: {e}")
+        job.status = "failed"
+        job.error = str(e)
+        job.message = "Failed"
+        JobService._save(job)
+        JobService._release_cache_key(job_id, JOB_STORE.get_request(job_id))
+        JOBS_TOTAL.inc(status="failed")
+        JobService._end_trace(job_id, error=e, status="failed")
+
+    @staticmethod
+    def _cancel_check(job: JobStatus, req: GenerationRequest):
+        timeout = req.timeout or settings.JOB_TIMEOUT_SECONDS
+        deadline = job.created_at + timeout if timeout > 0 else None
+
+        def cancel_check() -> bool:
+            return job.job_id in CANCEL_REQUESTS or (deadline is not None and time.time() > deadline)
 
+        return cancel_check
+
+    @staticmethod
+    async def _cancel_job(job_id: str, job: JobStatus, req: Optional[GenerationRequest]):
+        reason = "Cancelled" if job_id in CANCEL_REQUESTS else "Deadline exceeded"
+        CANCEL_REQUESTS.discard(job_id)
+        job.status = "cancelled"
+        job.message = reason
+        JobService._save(job)
+        JobService._release_cache_key(job_id, req)
+        JOBS_TOTAL.inc(status="cancelled")
+        JobService._end_trace(job_id, status="cancelled", reason=reason)
+        logger.info(f"Job {job_id} cancelled ({reason}).")
+
+        if req and req.user_id:
+            try:
+                await BillingService.add_credits(
+                    user_id=req.user_id,
+                    amount=GENERATION_COST,
+                    reason="refund",
+                    metadata={"job_id": job_id, "cause": reason}
+                )
             except Exception as e:
-                logger.error(f"Job {job_id} failed: {e}")
-                job.status = "failed"
-                job.error = str(e)
-                job.message = "Failed"
-            
+                logger.error(f"Refund failed for job {job_id}: {e}")
+
+    @staticmethod
+    def _release_cache_key(job_id: str, req: Optional[GenerationRequest]):
+        # the job no longer produces its key; the next identical request runs anew
+        cache_key = request_key(req) if req and settings.RESULT_CACHE else None
+        if cache_key:
+            result_cache.release(cache_key, job_id)
+
+    @staticmethod
+    def _release_job(job_id: str):
+        CANCEL_REQUESTS.discard(job_id)
+        JOB_STORE.release_request(job_id)
+        TASK_QUEUE.task_done()
+
+    @staticmethod
+    async def _run_job(job_id: str, job: JobStatus, req: GenerationRequest, generate):
+        if job.status == "cancelled":
+            JobService._release_job(job_id)
+            return
+        try:
+            pipeline_params = JobService._start_job(job, req)
+            if pipeline_params["cancel_check"]():
+                raise GenerationCancelled("Deadline exceeded while queued")
+            logger.info(f"Generating for Job {job_id}...")
+            if settings.NUM_WORKERS > 0:
+                # Worker processes hold their own engines
+                output_paths = await generate(None, pipeline_params)
+            else:
+                # Held until the job is done so the variant cannot be evicted under it;
+                # loading an evicted variant blocks, so it happens off the event loop
+                engine = await run_blocking(manager.acquire, req.variant)
+                try:
+                    output_paths = await generate(engine, pipeline_params)
+                finally:
+                    # may unload an evicted variant
+                    await run_blocking(manager.release, req.variant)
+            await JobService._complete_job(job_id, job, req, output_paths)
+        except GenerationCancelled:
+            await JobService._cancel_job(job_id, job, req)
+        except Exception as e:
+            JobService._fail_job(job_id, job, e)
+        finally:
+            JobService._release_job(job_id)
+
+    @staticmethod
+    async def _run_job_batch(entries: List[Tuple[str, JobStatus, GenerationRequest]]):
+        loop = asyncio.get_running_loop()
+        for job_id, job, _ in [entry for entry in entries if entry[1].status == "cancelled"]:
+            JobService._release_job(job_id)
+        entries = [entry for entry in entries if entry[1].status != "cancelled"]
+        if not entries:
+            return
+        try:
+            params_list = [JobService._start_job(job, req) for _, job, req in entries]
+            logger.info(f"Generating batch of {len(entries)} jobs: {[job_id for job_id, _, _ in entries]}")
+            # jobs of one batch share a variant (_batch_key)
+            variant = entries[0][2].variant
+            engine = await run_blocking(manager.acquire, variant)
+            try:
+                results = await loop.run_in_executor(
+                    None,
+                    lambda: JobService._measure_memory(engine.generate_batch, params_list)
+                )
             finally:
-                if job_id in REQUEST_STORE:
-                    del REQUEST_STORE[job_id]
-                TASK_QUEUE.task_done()
+                await run_blocking(manager.release, variant)
+        except GenerationCancelled:
+            for job_id, job, req in entries:
+                await JobService._cancel_job(job_id, job, req)
+                JobService._release_job(job_id)
+            return
+        except Exception as e:
+            for job_id, job, _ in entries:
+                JobService._fail_job(job_id, job, e)
+                JobService._release_job(job_id)
+            return
+
+        # Route each sample back to its own job
+        for (job_id, job, req), output_paths in zip(entries, results):
+            try:
+                if JobService._cancel_check(job, req)():
+                    # Its batch ran on for the other jobs; drop this one's result
+                    await JobService._cancel_job(job_id, job, req)
+                    continue
+                await JobService._complete_job(job_id, job, req, output_paths)
+            except Exception as e:
+                JobService._fail_job(job_id, job, e)
+            finally:
+                JobService._release_job(job_id)
 
     @staticmethod
     def _handle_renaming(file_results: List[str], req: GenerationRequest, job_id: str) -> List[str]:
@@ -160,12 +580,7 @@ class JobService:
                     
                     os.rename(old_path, new_path)
                     final_results.append(new_path)
-                    
-                    # Sidecar
-                    old_json = os.path.splitext(old_path)[0] + ".json"
-                    new_json = os.path.splitext(new_path)[0] + ".json"
-                    if os.path.exists(old_json):
-                         os.rename(old_json, new_json)
+                    get_metadata_store(dir_name).rename(os.path.basename(old_path), new_filename)
                 return final_results
             except Exception as e:
                  logger.error(f"Renaming failed: {e}")
@@ -176,49 +591,18 @@ class JobService:
     def _inject_metadata(file_results: List[str], req: GenerationRequest):
         if (req.parent_id or req.cover_image or req.title) and file_results:
             try:
+                meta = {}
+                if req.title: meta['title'] = req.title
+                if req.parent_id: meta['parent_id'] = req.parent_id
+                if req.cover_image: meta['cover_image'] = req.cover_image
+
                 for result_path in file_results:
                         if result_path.lower().endswith(('.wav', '.mp3', '.flac')):
-                            json_path = os.path.splitext(result_path)[0] + ".json"
-                            meta = {}
-                            if os.path.exists(json_path):
-                                with open(json_path, 'r', encoding='utf-8') as f:
-                                    try: meta = json.load(f)
-                                    except: pass
-                            
-                            if req.title: meta['title'] = req.title
-                            if req.parent_id: meta['parent_id'] = req.parent_id
-                            if req.cover_image: meta['cover_image'] = req.cover_image
-                            
-                            with open(json_path, 'w', encoding='utf-8') as f:
-                                json.dump(meta, f, indent=4, ensure_ascii=False)
+                            store = get_metadata_store(os.path.dirname(result_path))
+                            store.update(os.path.basename(result_path), **meta)
             except Exception as e:
                 logger.error(f"Metadata injection failed: {e}")
 
-    @staticmethod
-    def _sync_to_cloud(file_results: List[str]) -> List[str]:
-        supabase = get_db()
-        cloud_urls = []
-        if supabase and file_results:
-            for local_path in file_results:
-                try:
-                    filename = os.path.basename(local_path)
-                    bucket_name = "music"
-                    storage_path = f"generated/{filename}"
-                    
-                    with open(local_path, 'rb') as f:
-                        supabase.storage.from_(bucket_name).upload(storage_path, f, file_options={"upsert": "true"})
-                    
-                    res = supabase.storage.from_(bucket_name).get_public_url(storage_path)
-                    if res: return_url = res # supabase-py returns string or obj? usually string url
-                    # In newer v2 helper it returns string url directly or via .public_url
-                    # Let's assume the previous code `res` was the URL.
-                    # Wait, previous code: `res = ...get_public_url(...)`.
-                    cloud_urls.append(res)
-                    logger.info(f"Uploaded: {filename}")
-                except Exception as up_err:
-                    logger.error(f"Upload Failed for {local_path}: {up_err}")
-        return cloud_urls
-
     @staticmethod
     def delete_local_file(filename: str):
         output_dir = settings.OUTPUT_DIR
@@ -231,11 +615,8 @@ class JobService:
             
         try:
             os.remove(file_path)
-            # Remove JSON Sidecars
-            base_name = os.path.splitext(filename)[0]
-            for c in [base_name + ".json", base_name + "_input_params.json"]:
-                p = os.path.join(output_dir, c)
-                if os.path.exists(p): os.remove(p)
+            get_metadata_store(output_dir).delete(filename)
+            get_library().remove(filename)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -259,13 +640,8 @@ class JobService:
 
         try:
             os.rename(old_path, new_path)
-            # Rename JSONs
-            base_old = os.path.splitext(filename)[0]
-            base_new = os.path.splitext(new_name)[0]
-            for old_j, new_j in [(base_old + ".json", base_new + ".json"), (base_old + "_input_params.json", base_new + "_input_params.json")]:
-                p_old = os.path.join(output_dir, old_j)
-                if os.path.exists(p_old):
-                     os.rename(p_old, os.path.join(output_dir, new_j))
+            get_metadata_store(output_dir).rename(filename, new_name)
+            get_library().rename(filename, new_name)
             return {"old": filename, "new": new_name}
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+from acestep.api.core.config import settings
+from acestep.api.schemas import JobStatus
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+FINAL_EVENTS = ("failed", "cancelled", "synced", "sync_failed")
+
+
+class ProgressBroker:
+    """
+    Fans job updates out to per-subscriber queues (SSE / WebSocket clients).
+    `publish` may be called from any thread; progress events are throttled per job
+    to `min_interval` seconds, status changes and terminal events always go out.
+    """
+
+    QUEUE_SIZE = 64
+
+    def __init__(self, min_interval: float = 0.5):
+        self.min_interval = min_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._last_sent: Dict[str, float] = {}
+        self._last_state: Dict[str, tuple] = {}
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[job_id]
+            self._last_sent.pop(job_id, None)
+            self._last_state.pop(job_id, None)
+
+    def publish(self, job: JobStatus):
+        if job.job_id not in self._subscribers or self._loop is None:
+            return
+
+        now = time.monotonic()
+        state = (job.status, job.sync_status)
+        state_changed = self._last_state.get(job.job_id) != state
+        if not state_changed and now - self._last_sent.get(job.job_id, 0.0) < self.min_interval:
+            return
+        self._last_sent[job.job_id] = now
+        self._last_state[job.job_id] = state
+
+        event = self.make_event(job)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._dispatch(job.job_id, event)
+        else:
+            self._loop.call_soon_threadsafe(self._dispatch, job.job_id, event)
+
+    @staticmethod
+    def make_event(job: JobStatus) -> dict:
+        if job.sync_status in ("synced", "sync_failed"):
+            event = job.sync_status
+        elif job.status in TERMINAL_STATUSES:
+            event = job.status
+        else:
+            event = "progress"
+        return {"event": event, "data": job.model_dump()}
+
+    @staticmethod
+    def is_final(event: dict) -> bool:
+        # a completed job still being uploaded has one more event to come
+        return event["event"] in FINAL_EVENTS or (
+            event["event"] == "completed" and event["data"]["sync_status"] != "completed_local"
+        )
+
+    async def stream(self, job: JobStatus, keepalive: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """
+        Yields the job's current state, then its updates until the final event.
+        Yields None when nothing happened for `keepalive` seconds.
+        """
+        queue = self.subscribe(job.job_id)
+        try:
+            event = self.make_event(job)
+            yield event
+            while not self.is_final(event):
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+        finally:
+            self.unsubscribe(job.job_id, queue)
+
+    def _dispatch(self, job_id: str, event: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                # slow consumer: drop its oldest update rather than block the producer
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+def format_sse(event: Optional[dict]) -> str:
+    if event is None:
+        return ": keepalive\n\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+progress_broker = ProgressBroker(min_interval=settings.PROGRESS_EVENT_INTERVAL)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from acestep.api.core.config import settings
+from acestep.api.core.library import get_library
+from acestep.api.schemas import GenerationRequest
+from acestep.metadata_store import get_metadata_store
+
+logger = logging.getLogger("ace_step_api.result_cache")
+
+# Everything that changes the generated audio. Presentation fields (title, cover,
+# parent, timeout) are deliberately left out. The owner is part of the key too
+# (see request_key), so a hit never hands one user's job or files to another.
+KEY_FIELDS = (
+    "task",
+    "prompt",
+    "lyrics",
+    "duration",
+    "infer_steps",
+    "guidance_scale",
+    "seed",
+    "format",
+    "cfg_type",
+    "scheduler_type",
+    "retake_variance",
+    "repaint_start",
+    "repaint_end",
+)
+
+def request_key(req: GenerationRequest) -> Optional[str]:
+    """Content hash of the request's deterministic inputs, or None if it cannot be cached (no seed)."""
+    if req.seed is None:
+        return None
+    fields = {name: getattr(req, name) for name in KEY_FIELDS}
+    fields["user_id"] = req.user_id
+    fields["checkpoint"] = settings.ACE_CHECKPOINT_PATH
+    if req.variant and req.variant != settings.DEFAULT_VARIANT:
+        fields["variant"] = req.variant
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Maps request keys to the output files of the job that produced them, and
+    tracks which job is currently producing each key (single-flight).
+
+    Entries expire after `ttl` seconds; beyond `max_bytes` of cached audio the
+    least recently used entries are dropped. With `prune_files` the evicted
+    outputs are deleted from disk, otherwise they stay in the history.
+    The index is kept in `index_path` so that it survives restarts.
+    """
+
+    def __init__(self, index_path: str, max_bytes: int, ttl: float, prune_files: bool = False):
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.prune_files = prune_files
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._in_flight: Dict[str, str] = {}
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self._load()
+
+    def lookup(self, key: str) -> Optional[List[str]]:
+        """Output paths of a previous identical request, if they are all still on disk."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["created_at"] > self.ttl or not all(os.path.exists(p) for p in entry["paths"]):
+                # expired, or deleted / renamed since
+                del self._entries[key]
+                self._save()
+                return None
+            self._entries.move_to_end(key)
+            return list(entry["paths"])
+
+    def in_flight(self, key: str) -> Optional[str]:
+        return self._in_flight.get(key)
+
+    def begin(self, key: str, job_id: str):
+        self._in_flight[key] = job_id
+
+    def release(self, key: str, job_id: str):
+        """Forgets the in-flight job (failed or cancelled) without caching anything."""
+        if self._in_flight.get(key) == job_id:
+            del self._in_flight[key]
+
+    def put(self, key: str, job_id: str, paths: List[str]):
+        self.release(key, job_id)
+        size = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+        with self._lock:
+            self._entries[key] = {"job_id": job_id, "paths": list(paths), "size": size, "created_at": time.time()}
+            self._entries.move_to_end(key)
+            self._evict()
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry["size"] for entry in self._entries.values()),
+                "in_flight": len(self._in_flight),
+            }
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry["created_at"] < cutoff]
+        for key in expired:
+            self._drop(key)
+
+        total = sum(entry["size"] for entry in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            total -= self._entries[key]["size"]
+            self._drop(key)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        if not self.prune_files:
+            return
+        for path in entry["paths"]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not prune {path}: {e}")
+                continue
+            get_metadata_store(os.path.dirname(path)).delete(os.path.basename(path))
+            get_library().remove(os.path.basename(path))
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable result cache index: {e}")
+            return
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["created_at"]):
+            self._entries[key] = entry
+
+    def _save(self):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.error(f"Could not write result cache index: {e}")
+
+
+result_cache = ResultCache(
+    index_path=settings.RESULT_CACHE_INDEX_PATH,
+    max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+    ttl=settings.RESULT_CACHE_TTL_SECONDS,
+    prune_files=settings.RESULT_CACHE_PRUNE_FILES,
+)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, List, Optional, Set
+
+from acestep.api.core.config import settings
+from acestep.api.core.database import get_db
+from acestep.api.schemas import JobStatus
+from acestep.instrumentation import UPLOAD_SECONDS
+from acestep.tracing import SpanContext, tracer
+
+logger = logging.getLogger("ace_step_api.uploads")
+
+
+class StorageBackend(ABC):
+    """Bucket the generated files are published to. `upload` blocks; it is run in a thread."""
+
+    @abstractmethod
+    def upload(self, local_path: str, storage_path: str) -> str:
+        """Uploads the file (overwriting) and returns its public URL."""
+        pass
+
+
+class SupabaseStorage(StorageBackend):
+    def __init__(self, bucket: str = "music"):
+        self.bucket = bucket
+
+    def upload(self, local_path: str, storage_path: str) -> str:
+        supabase = get_db()
+        if supabase is None:
+            raise RuntimeError("Supabase is not configured")
+        with open(local_path, "rb") as f:
+            supabase.storage.from_(self.bucket).upload(storage_path, f, file_options={"upsert": "true"})
+        # supabase-py v2 returns the URL as a string
+        return supabase.storage.from_(self.bucket).get_public_url(storage_path)
+
+
+class LocalStorage(StorageBackend):
+    """Copies files into a directory; stands in for the bucket in development and tests."""
+
+    def __init__(self, root: str, base_url: Optional[str] = None):
+        self.root = Path(root)
+        self.base_url = base_url
+
+    def upload(self, local_path: str, storage_path: str) -> str:
+        target = self.root / storage_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(local_path, target)
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{storage_path}"
+        return target.resolve().as_uri()
+
+
+class UploadService:
+    """
+    Publishes finished jobs' files without holding up the generation worker.
+
+    `enqueue` returns immediately; the job goes `completed_local` -> `synced`
+    (its `cloud_urls` set) or `sync_failed` in `sync_status`. A failed sync
+    keeps the URLs of the files that did upload and says why in `sync_error`;
+    `error` stays about the generation itself. At most
+    `concurrency` files upload at once, and each upload is retried with
+    exponential backoff.
+    """
+
+    def __init__(self, backend: StorageBackend, concurrency: int = 4, max_retries: int = 3, backoff: float = 1.0):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def enqueue(
+        self,
+        job: JobStatus,
+        file_results: List[str],
+        on_update: Callable[[JobStatus], None],
+        trace_context: Optional[SpanContext] = None,
+    ):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        job.sync_status = "completed_local"
+        task = asyncio.create_task(self._sync_job(job, list(file_results), on_update, trace_context))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Waits for uploads in flight (e.g. at shutdown)."""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    async def _sync_job(
+        self,
+        job: JobStatus,
+        file_results: List[str],
+        on_update: Callable[[JobStatus], None],
+        trace_context: Optional[SpanContext] = None,
+    ):
+        with tracer.span("upload", parent=trace_context, files=len(file_results)):
+            results = await asyncio.gather(*(self._upload(path) for path in file_results), return_exceptions=True)
+        # the files that made it keep their URLs (None for the others)
+        urls = [None if isinstance(result, BaseException) else result for result in results]
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if any(url is not None for url in urls):
+            job.cloud_urls = urls
+        if failures:
+            job.sync_status = "sync_failed"
+            job.sync_error = f"Cloud sync failed for {len(failures)} of {len(results)} files: {failures[0]}"
+            logger.error(f"{job.sync_error} (job {job.job_id})")
+        else:
+            job.sync_status = "synced"
+            logger.info(f"Job {job.job_id} synced to cloud.")
+        on_update(job)
+
+    async def _upload(self, local_path: str) -> str:
+        storage_path = f"generated/{os.path.basename(local_path)}"
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    with tracer.span("upload_file", file=os.path.basename(local_path), attempt=attempt):
+                        url = await asyncio.to_thread(self.backend.upload, local_path, storage_path)
+                logger.info(f"Uploaded: {storage_path}")
+                UPLOAD_SECONDS.observe(time.perf_counter() - start, outcome="ok")
+                return url
+            except Exception as e:
+                if attempt == self.max_retries:
+                    UPLOAD_SECONDS.observe(time.perf_counter() - start, outcome="failed")
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"Upload of {storage_path} failed ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+def create_upload_service() -> Optional[UploadService]:
+    """
+    Builds the configured uploader, or None when files stay local.
+    Reads 'ACE_UPLOAD_BACKEND' ('supabase', 'local' or 'none'). Defaults to 'supabase'.
+    """
+    if settings.UPLOAD_BACKEND == "supabase":
+        if not settings.is_cloud_enabled:
+            return None
+        backend = SupabaseStorage()
+    elif settings.UPLOAD_BACKEND == "local":
+        backend = LocalStorage(settings.UPLOAD_LOCAL_DIR, settings.UPLOAD_LOCAL_BASE_URL)
+    elif settings.UPLOAD_BACKEND == "none":
+        return None
+    else:
+        raise ValueError(f"Unknown upload backend: {settings.UPLOAD_BACKEND}")
+    return UploadService(
+        backend,
+        concurrency=settings.UPLOAD_CONCURRENCY,
+        max_retries=settings.UPLOAD_MAX_RETRIES,
+        backoff=settings.UPLOAD_RETRY_BACKOFF,
+    )
+
+
+upload_service = create_upload_service()
@@ -0,0 +1,16 @@
+"""
+Cooperative cancellation for long-running generations.
+
+Callers pass a `cancel_check` callable (returning True once the work should stop)
+down the pipeline; the diffusion loops and the audio decoders call
+`raise_if_cancelled` at every step / window boundary.
+"""
+
+
+class GenerationCancelled(Exception):
+    """Raised at a step or window boundary when a generation is cancelled or past its deadline."""
+
+
+def raise_if_cancelled(cancel_check=None):
+    if cancel_check is not None and cancel_check():
+        raise GenerationCancelled("Generation cancelled")
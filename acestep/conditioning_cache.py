@@ -0,0 +1,206 @@
+"""
+Cross-request cache of conditioning tensors: UMT5 text embeddings (plain and
+ERG-null) and the transformer's encoder outputs for a prompt / lyrics pair.
+
+Retakes, repaints, extensions and variations resend the same prompt and lyrics,
+so their conditioning is computed once. Entries are keyed by a hash of the
+inputs and the model that computed them (`ACEStepPipeline.conditioning_key`)
+and kept in memory, least recently used out first. With a directory set they
+are also written to disk and survive restarts. Cached tensors are shared by
+every request that hits them and must not be modified in place.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+from loguru import logger
+
+from acestep.instrumentation import CONDITIONING_CACHE_BYTES, CONDITIONING_CACHE_HIT_RATE, CONDITIONING_CACHE_TOTAL
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+
+
+def conditioning_key(*parts) -> str:
+    """Content hash of JSON-serialisable `parts`."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+class ConditioningCache:
+    """
+    LRU cache of tensors (or tuples of tensors) up to `max_bytes` in memory, with an
+    optional on-disk tier in `directory` (oldest files removed beyond `max_disk_bytes`).
+    Concurrent misses on one key both compute it; the results are identical.
+    """
+
+    def __init__(self, max_bytes: int, directory: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, bytes)
+        self._bytes = 0
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or bool(self.directory)
+
+    def get_or_compute(self, kind: str, key: str, compute: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return compute()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            self._count(kind, "hit")
+            return entry[0]
+
+        value = self._read(key)
+        if value is not None:
+            self._count(kind, "disk_hit")
+        else:
+            value = compute()
+            self._count(kind, "miss")
+            self._write(key, value)
+        self._put(key, value)
+        return value
+
+    def hit_rate(self) -> float:
+        with self._lock:
+            lookups = sum(sum(counts.values()) for counts in self._counts.values())
+            misses = sum(counts["miss"] for counts in self._counts.values())
+        return (lookups - misses) / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            kinds = {
+                kind: {**counts, "hit_rate": (sum(counts.values()) - counts["miss"]) / max(1, sum(counts.values()))}
+                for kind, counts in self._counts.items()
+            }
+            entries, size = len(self._entries), self._bytes
+        return {"entries": entries, "bytes": size, "hit_rate": self.hit_rate(), "kinds": kinds}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._counts.clear()
+        CONDITIONING_CACHE_BYTES.set(0)
+
+    def _count(self, kind: str, result: str):
+        with self._lock:
+            self._counts[kind][result] += 1
+        CONDITIONING_CACHE_TOTAL.inc(kind=kind, result=result)
+
+    def _put(self, key: str, value: Any):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+            CONDITIONING_CACHE_BYTES.set(self._bytes)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pt")
+
+    def _read(self, key: str) -> Any:
+        if not self.directory or not os.path.exists(self._path(key)):
+            return None
+        try:
+            value = torch.load(self._path(key), weights_only=True)
+            os.utime(self._path(key))  # recently used files are pruned last
+            return value
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable conditioning cache file {self._path(key)}: {e}")
+            return None
+
+    def _write(self, key: str, value: Any):
+        if not self.directory:
+            return
+        tmp_path = self._path(key) + f".{os.getpid()}.tmp"
+        try:
+            torch.save(value, tmp_path)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            logger.warning(f"Could not write conditioning cache file: {e}")
+            return
+        if self.max_disk_bytes:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        files = []
+        for path in glob.glob(os.path.join(self.directory, "*.pt")):
+            try:
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                return
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+def startup_inputs(examples_dir: str = EXAMPLES_DIR) -> List[Dict[str, Any]]:
+    """
+    What the cache warms at startup: the UI genre presets (prompt only) and the
+    prompt / lyrics / ERG flags of every examples/*/input_params/*.json.
+    """
+    from acestep.presets import GENRE_PRESETS
+
+    inputs: List[Dict[str, Any]] = [{"prompt": prompt} for prompt in GENRE_PRESETS.values()]
+    for path in sorted(glob.glob(os.path.join(examples_dir, "*", "input_params", "*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                params = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            continue
+        if params.get("prompt"):
+            inputs.append({k: params[k] for k in ("prompt", "lyrics", "use_erg_tag", "use_erg_lyric") if k in params})
+    return inputs
+
+
+def create_conditioning_cache() -> ConditioningCache:
+    """
+    Reads 'ACE_CONDITIONING_CACHE_MB' (memory tier, default 256, 0 = off),
+    'ACE_CONDITIONING_CACHE_DIR' (disk tier, default '' = off) and
+    'ACE_CONDITIONING_CACHE_DISK_MB' (disk tier size, default 4096).
+    """
+    return ConditioningCache(
+        max_bytes=int(float(os.getenv("ACE_CONDITIONING_CACHE_MB", 256)) * 1024**2),
+        directory=os.getenv("ACE_CONDITIONING_CACHE_DIR", "") or None,
+        max_disk_bytes=int(float(os.getenv("ACE_CONDITIONING_CACHE_DISK_MB", 4096)) * 1024**2),
+    )
+
+
+conditioning_cache = create_conditioning_cache()
+CONDITIONING_CACHE_HIT_RATE.set_function(conditioning_cache.hit_rate)
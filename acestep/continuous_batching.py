@@ -0,0 +1,553 @@
+"""
+Continuous (iteration-level) batching for text2music diffusion.
+
+The engine keeps a single running latent batch on the transformer. New requests
+are admitted at any step boundary and finished samples leave the batch, so a
+burst of requests shares decode calls instead of queueing behind one another.
+Every sample carries its own scheduler, timestep, guidance state and length.
+Samples of different lengths share the step loop but not a decode call: the
+patch embedding's convolutions and GroupNorm see every frame, so zero padding
+would leak into the real ones.
+"""
+
+import inspect
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextvars import copy_context
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+import torch.nn.functional as F
+from loguru import logger
+from diffusers.pipelines.stable_diffusion_3.pipeline_stable_diffusion_3 import (
+    retrieve_timesteps,
+)
+from diffusers.utils.torch_utils import randn_tensor
+
+from acestep.cancellation import GenerationCancelled
+from acestep.apg_guidance import (
+    apg_forward,
+    MomentumBuffer,
+    cfg_forward,
+    cfg_zero_star,
+)
+from acestep.cpu_offload import CpuOffloader
+from acestep.instrumentation import record_pipeline_run
+from acestep.metadata_store import save_output_metadata
+from acestep.pipeline_ace_step import ACEStepPipeline, sanitize_filename
+from acestep.tracing import SpanContext, attach, current as current_span, tracer
+from acestep.schedulers.scheduling_flow_match_euler_discrete import (
+    FlowMatchEulerDiscreteScheduler,
+)
+from acestep.schedulers.scheduling_flow_match_heun_discrete import (
+    FlowMatchHeunDiscreteScheduler,
+)
+from acestep.schedulers.scheduling_flow_match_pingpong import (
+    FlowMatchPingPongScheduler,
+)
+
+
+SCHEDULERS = {
+    "euler": FlowMatchEulerDiscreteScheduler,
+    "heun": FlowMatchHeunDiscreteScheduler,
+    "pingpong": FlowMatchPingPongScheduler,
+}
+
+# keyword defaults of ACEStepPipeline.__call__, so that batched requests are
+# resolved exactly like a direct pipeline call
+CALL_DEFAULTS = {
+    name: parameter.default
+    for name, parameter in inspect.signature(ACEStepPipeline.__call__).parameters.items()
+    if parameter.default is not inspect.Parameter.empty
+}
+
+# __call__ arguments that are not recorded in the output's metadata
+UNRECORDED_PARAMS = (
+    "manual_seeds",
+    "retake_seeds",
+    "save_path",
+    "batch_size",
+    "debug",
+    "cancel_check",
+    "progress",
+    "trace_context",
+)
+
+
+@dataclass
+class DiffusionSample:
+    """State of one request inside the running batch."""
+
+    options: Dict[str, Any]
+    future: Future
+    scheduler: Any
+    timesteps: torch.Tensor
+    latents: torch.Tensor
+    generator: torch.Generator
+    encoder_hidden_states: torch.Tensor
+    encoder_hidden_mask: torch.Tensor
+    encoder_hidden_states_null: Optional[torch.Tensor]
+    start_idx: int
+    end_idx: int
+    actual_seeds: List[int]
+    retake_seeds: List[int]
+    momentum_buffer: MomentumBuffer = field(default_factory=MomentumBuffer)
+    step: int = 0
+    timecosts: Dict[str, float] = field(default_factory=dict)
+    diffusion_start: float = 0.0
+    trace_context: Optional[SpanContext] = None
+
+    @property
+    def frame_length(self) -> int:
+        return self.latents.shape[-1]
+
+    @property
+    def num_inference_steps(self) -> int:
+        return len(self.timesteps)
+
+    @property
+    def finished(self) -> bool:
+        return self.step >= self.num_inference_steps
+
+    @property
+    def timestep(self) -> torch.Tensor:
+        return self.timesteps[self.step]
+
+    @property
+    def in_guidance_interval(self) -> bool:
+        guidance_scale = self.options["guidance_scale"]
+        if guidance_scale == 0.0 or guidance_scale == 1.0:
+            return False
+        return self.start_idx <= self.step < self.end_idx
+
+    @property
+    def cancelled(self) -> bool:
+        cancel_check = self.options["cancel_check"]
+        return cancel_check is not None and cancel_check()
+
+    @property
+    def use_erg_diffusion(self) -> bool:
+        return bool(self.options["use_erg_diffusion"])
+
+    def current_guidance_scale(self) -> float:
+        guidance_scale = self.options["guidance_scale"]
+        guidance_interval_decay = self.options["guidance_interval_decay"]
+        if guidance_interval_decay <= 0:
+            return guidance_scale
+        # Linearly interpolate to calculate the current guidance scale
+        progress = (self.step - self.start_idx) / (self.end_idx - self.start_idx - 1)
+        min_guidance_scale = self.options["min_guidance_scale"]
+        return (
+            guidance_scale
+            - (guidance_scale - min_guidance_scale) * progress * guidance_interval_decay
+        )
+
+
+class ContinuousBatchingEngine:
+    """
+    Runs text2music requests of an `ACEStepPipeline` in a shared, continuously refilled batch.
+
+    `submit` takes the keyword arguments of `ACEStepPipeline.__call__` and returns a
+    `concurrent.futures.Future` resolving to the same value (`output_paths + [input_params_json]`).
+    Requests that cannot share a batch (edit / repaint / audio2audio, LoRA switches, double condition
+    guidance, ...) run through the plain pipeline call once the running batch has drained.
+    """
+
+    def __init__(self, pipeline: ACEStepPipeline, max_batch_size: int = 4, poll_interval: float = 0.1):
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.poll_interval = poll_interval
+        self._incoming: "queue.Queue" = queue.Queue()
+        self._exclusive: "queue.Queue" = queue.Queue()
+        self._active: List[DiffusionSample] = []
+        self._resident = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="ace-step-continuous-batching", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Continuous batching engine started (max_batch_size={self.max_batch_size})")
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, **kwargs) -> Future:
+        future = Future()
+        if self.is_batchable(kwargs):
+            self._incoming.put((kwargs, future, current_span()))
+        else:
+            context = copy_context()
+            self._exclusive.put((lambda: context.run(self.pipeline, **kwargs), future))
+        return future
+
+    def submit_exclusive(self, fn: Callable[[], Any]) -> Future:
+        """Run `fn` on the engine thread while no batch is in flight."""
+        future = Future()
+        self._exclusive.put((fn, future))
+        return future
+
+    def is_batchable(self, kwargs: Dict[str, Any]) -> bool:
+        options = {**CALL_DEFAULTS, **kwargs}
+        if options["task"] != "text2music" or options["audio2audio_enable"]:
+            return False
+        if options["src_audio_path"] is not None or options["batch_size"] != 1:
+            return False
+        if options["oss_steps"]:
+            return False
+        if options["scheduler_type"] not in SCHEDULERS:
+            return False
+        if (options["lora_name_or_path"] or "none") != self.pipeline.lora_path:
+            return False
+        guidance_scale_text = options["guidance_scale_text"]
+        guidance_scale_lyric = options["guidance_scale_lyric"]
+        if (
+            guidance_scale_text is not None
+            and guidance_scale_text > 1.0
+            and guidance_scale_lyric is not None
+            and guidance_scale_lyric > 1.0
+        ):
+            return False
+        return True
+
+    @property
+    def num_active(self) -> int:
+        return len(self._active)
+
+    def _run(self):
+        with torch.no_grad():
+            while not self._stop_event.is_set():
+                if not self._active:
+                    self._release_transformer()
+                    if self._run_exclusive():
+                        continue
+                if self._exclusive.empty():
+                    # block for new work only while the batch is idle
+                    self._admit(block=not self._active)
+                if self._active:
+                    self._step()
+        self._release_transformer()
+        for sample in self._active:
+            sample.future.set_exception(RuntimeError("Continuous batching engine stopped"))
+        self._active = []
+
+    def _run_exclusive(self) -> bool:
+        try:
+            fn, future = self._exclusive.get_nowait()
+        except queue.Empty:
+            return False
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                logger.error(f"Exclusive job failed: {e}")
+                future.set_exception(e)
+        return True
+
+    def _hold_transformer(self):
+        # keep the transformer on the device for as long as the batch is non-empty
+        if self._resident is None:
+            pipeline = self.pipeline
+            if not pipeline.loaded:
+                if pipeline.quantized:
+                    pipeline.load_quantized_checkpoint(pipeline.checkpoint_dir)
+                else:
+                    pipeline.load_checkpoint(pipeline.checkpoint_dir)
+            self._resident = (
+                CpuOffloader(pipeline.ace_step_transformer, pipeline.device)
+                if pipeline.cpu_offload
+                else nullcontext()
+            )
+            self._resident.__enter__()
+
+    def _release_transformer(self):
+        if self._resident is not None:
+            self._resident.__exit__(None, None, None)
+            self._resident = None
+            self.pipeline.cleanup_memory()
+
+    def _admit(self, block: bool):
+        timeout = self.poll_interval if block else None
+        while len(self._active) < self.max_batch_size:
+            try:
+                if timeout is not None:
+                    kwargs, future, trace_context = self._incoming.get(timeout=timeout)
+                    timeout = None
+                else:
+                    kwargs, future, trace_context = self._incoming.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._hold_transformer()
+                with attach(trace_context), tracer.span("admit"):
+                    sample = self._prepare_sample(kwargs, future)
+                sample.trace_context = trace_context
+                self._active.append(sample)
+            except Exception as e:
+                logger.error(f"Failed to admit request into the running batch: {e}")
+                future.set_exception(e)
+
+    def _prepare_sample(self, kwargs: Dict[str, Any], future: Future) -> DiffusionSample:
+        pipeline = self.pipeline
+        options = {**CALL_DEFAULTS, **kwargs}
+        progress = options["progress"]
+        start_time = time.time()
+
+        random_generators, actual_seeds = pipeline.set_seeds(1, options["manual_seeds"])
+        _, actual_retake_seeds = pipeline.set_seeds(1, options["retake_seeds"])
+
+        texts = [options["prompt"]]
+        encoder_text_hidden_states, text_attention_mask = pipeline.get_text_embeddings(texts)
+        encoder_text_hidden_states_null = None
+        if options["use_erg_tag"]:
+            encoder_text_hidden_states_null = pipeline.get_text_embeddings_null(texts)
+
+        # not support for released checkpoint
+        speaker_embeds = torch.zeros(1, 512).to(pipeline.device).to(pipeline.dtype)
+
+        lyrics = options["lyrics"]
+        lyric_token_idx, lyric_mask = pipeline.lyric_inputs(lyrics, debug=options["debug"])
+
+        if options["audio_duration"] <= 0:
+            options["audio_duration"] = random.uniform(30.0, 240.0)
+            logger.info(f"random audio duration: {options['audio_duration']}")
+        options["oss_steps"] = []
+
+        # shares the cache entries of single-sample pipeline calls
+        guidance_scale = options["guidance_scale"]
+        encoder_hidden_states, encoder_hidden_mask, encoder_hidden_states_null, _ = pipeline.encode_conditioning(
+            encoder_text_hidden_states,
+            text_attention_mask,
+            speaker_embeds,
+            lyric_token_idx,
+            lyric_mask,
+            encoder_text_hidden_states_null=encoder_text_hidden_states_null,
+            use_erg_lyric=options["use_erg_lyric"],
+            with_null=guidance_scale != 0.0 and guidance_scale != 1.0,
+            source=pipeline.conditioning_source(texts, lyrics, 1, options["use_erg_tag"]),
+        )
+
+        scheduler = SCHEDULERS[options["scheduler_type"]](
+            num_train_timesteps=1000,
+            shift=3.0,
+        )
+        timesteps, num_inference_steps = retrieve_timesteps(
+            scheduler,
+            num_inference_steps=options["infer_step"],
+            device=pipeline.device,
+            timesteps=None,
+        )
+        frame_length = int(options["audio_duration"] * 44100 / 512 / 8)
+        latents = randn_tensor(
+            shape=(1, 8, 16, frame_length),
+            generator=random_generators,
+            device=pipeline.device,
+            dtype=pipeline.dtype,
+        )
+
+        guidance_interval = options["guidance_interval"]
+        sample = DiffusionSample(
+            options=options,
+            future=future,
+            scheduler=scheduler,
+            timesteps=timesteps,
+            latents=latents,
+            generator=random_generators[0],
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_hidden_mask=encoder_hidden_mask,
+            encoder_hidden_states_null=encoder_hidden_states_null,
+            start_idx=int(num_inference_steps * ((1 - guidance_interval) / 2)),
+            end_idx=int(num_inference_steps * (guidance_interval / 2 + 0.5)),
+            actual_seeds=actual_seeds,
+            retake_seeds=actual_retake_seeds,
+        )
+        sample.diffusion_start = time.time()
+        sample.timecosts["preprocess"] = sample.diffusion_start - start_time
+        if progress:
+            progress(0.1, desc="Joined running batch...")
+        logger.info(
+            f"Admitted request into running batch ({len(self._active) + 1} active, "
+            f"{num_inference_steps} steps, {frame_length} frames)"
+        )
+        return sample
+
+    def _step(self):
+        # cancelled / expired samples leave the batch at the step boundary
+        for sample in self._active:
+            if sample.cancelled:
+                sample.future.set_exception(GenerationCancelled("Generation cancelled"))
+        active = [sample for sample in self._active if not sample.cancelled]
+        self._active = active
+        if not active:
+            return
+        step_start = time.time()
+        try:
+            self._decode_step(active)
+        except Exception as e:
+            logger.error(f"Batched diffusion step failed: {e}")
+            for sample in active:
+                sample.future.set_exception(e)
+            self._active = []
+            return
+
+        step_end = time.time()
+        for sample in active:
+            tracer.record(
+                "diffusion_step", sample.trace_context, step_start, step_end,
+                step=sample.step - 1, batch_size=len(active),
+            )
+
+        self._active = [sample for sample in active if not sample.finished]
+        for sample in active:
+            if sample.finished:
+                with attach(sample.trace_context):
+                    self._finish(sample)
+
+    def _decode_step(self, active: List[DiffusionSample]):
+        # one decode call per frame length, in admission order
+        frame_lengths = dict.fromkeys(sample.frame_length for sample in active)
+        for frame_length in frame_lengths:
+            self._decode_group([sample for sample in active if sample.frame_length == frame_length])
+
+    def _decode_group(self, active: List[DiffusionSample]):
+        pipeline = self.pipeline
+        bsz = len(active)
+        # uncond rows follow the cond rows; ERG rows first so that the temperature hook hits one slice
+        guided = sorted(
+            (sample for sample in active if sample.in_guidance_interval),
+            key=lambda sample: not sample.use_erg_diffusion,
+        )
+        num_erg = sum(1 for sample in guided if sample.use_erg_diffusion)
+        rows = active + guided
+
+        frame_length = active[0].frame_length
+        seq_length = max(sample.encoder_hidden_states.shape[1] for sample in active)
+
+        hidden_states = torch.cat([sample.latents for sample in rows])
+        attention_mask = torch.ones(len(rows), frame_length, device=pipeline.device, dtype=pipeline.dtype)
+
+        encoder_states = [sample.encoder_hidden_states for sample in active] + [
+            sample.encoder_hidden_states_null for sample in guided
+        ]
+        encoder_hidden_states = torch.cat(
+            [F.pad(states, (0, 0, 0, seq_length - states.shape[1])) for states in encoder_states]
+        )
+        encoder_hidden_mask = torch.cat(
+            [
+                F.pad(sample.encoder_hidden_mask, (0, seq_length - sample.encoder_hidden_mask.shape[1]))
+                for sample in rows
+            ]
+        )
+        timestep = torch.stack([sample.timestep for sample in rows])
+
+        inputs = {
+            "encoder_hidden_states": encoder_hidden_states,
+            "encoder_hidden_mask": encoder_hidden_mask,
+            "output_length": frame_length,
+            "attention_mask": attention_mask,
+        }
+        if num_erg > 0:
+            noise_pred_rows = pipeline.forward_diffusion_with_temperature(
+                hidden_states=hidden_states,
+                timestep=timestep,
+                inputs=inputs,
+                batch_slice=slice(bsz, bsz + num_erg),
+            )
+        else:
+            noise_pred_rows = pipeline.ace_step_transformer.decode(
+                hidden_states=hidden_states,
+                timestep=timestep,
+                **inputs,
+            ).sample
+
+        uncond_rows = {id(sample): bsz + j for j, sample in enumerate(guided)}
+        for i, sample in enumerate(active):
+            noise_pred = noise_pred_rows[i : i + 1]
+            if id(sample) in uncond_rows:
+                j = uncond_rows[id(sample)]
+                noise_pred_uncond = noise_pred_rows[j : j + 1]
+                noise_pred = self._guide(sample, noise_pred, noise_pred_uncond)
+
+            sample.latents = sample.scheduler.step(
+                model_output=noise_pred,
+                timestep=sample.timestep,
+                sample=sample.latents,
+                return_dict=False,
+                omega=sample.options["omega_scale"],
+                generator=sample.generator,
+            )[0]
+            sample.step += 1
+            progress = sample.options["progress"]
+            if progress:
+                progress(sample.step / sample.num_inference_steps, desc="Generating...")
+
+    def _guide(self, sample: DiffusionSample, noise_pred_with_cond, noise_pred_uncond):
+        cfg_type = sample.options["cfg_type"]
+        current_guidance_scale = sample.current_guidance_scale()
+        if cfg_type == "apg":
+            return apg_forward(
+                pred_cond=noise_pred_with_cond,
+                pred_uncond=noise_pred_uncond,
+                guidance_scale=current_guidance_scale,
+                momentum_buffer=sample.momentum_buffer,
+            )
+        elif cfg_type == "cfg":
+            return cfg_forward(
+                cond_output=noise_pred_with_cond,
+                uncond_output=noise_pred_uncond,
+                cfg_strength=current_guidance_scale,
+            )
+        elif cfg_type == "cfg_star":
+            return cfg_zero_star(
+                noise_pred_with_cond=noise_pred_with_cond,
+                noise_pred_uncond=noise_pred_uncond,
+                guidance_scale=current_guidance_scale,
+                i=sample.step,
+            )
+        return noise_pred_with_cond
+
+    def _finish(self, sample: DiffusionSample):
+        pipeline = self.pipeline
+        options = sample.options
+        try:
+            start_time = time.time()
+            sample.timecosts["diffusion"] = start_time - sample.diffusion_start
+            output_paths = pipeline.latents2audio(
+                latents=sample.latents,
+                target_wav_duration_second=options["audio_duration"],
+                save_path=options["save_path"],
+                format=options["format"],
+                filename_prefix=sanitize_filename(options["prompt"]),
+                cancel_check=options["cancel_check"],
+            )
+            sample.timecosts["latent2audio"] = time.time() - start_time
+            record_pipeline_run(sample.timecosts, sample.num_inference_steps, batch_size="continuous")
+
+            input_params_json = {
+                key: value for key, value in options.items() if key not in UNRECORDED_PARAMS
+            }
+            input_params_json["timecosts"] = sample.timecosts
+            input_params_json["actual_seeds"] = sample.actual_seeds
+            input_params_json["retake_seeds"] = sample.retake_seeds
+            for output_audio_path in output_paths:
+                input_params_json["audio_path"] = output_audio_path
+                save_output_metadata(output_audio_path, input_params_json)
+            sample.future.set_result(output_paths + [input_params_json])
+        except Exception as e:
+            logger.error(f"Failed to finalize batched request: {e}")
+            sample.future.set_exception(e)
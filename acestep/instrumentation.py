@@ -0,0 +1,290 @@
+"""
+Process-local metrics, rendered in the Prometheus text exposition format.
+
+The API (JobService, uploads, event loop), the pipeline and the audio decoder
+record into the metrics defined at the bottom of this module; `/metrics`
+serves `render()`. Metrics recorded inside worker processes stay in those
+processes, so job-level numbers (queue, wait, RTF, memory) are recorded by the
+API and the finer pipeline / decoder stages only when generation runs in-process.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+QUEUE_WAIT_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+RATE_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+MEMORY_BUCKETS = tuple(2 ** i * 1024 ** 3 for i in range(-2, 8))  # 256 MiB .. 128 GiB
+AUDIO_DURATION_BUCKETS = (30, 60, 120, 240)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Reads the (unlabelled) value from `function` at render time."""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # per label set: [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def totals(self, **labels) -> Tuple[float, int]:
+        """(sum, count) observed so far for one label set."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+        return (state[-2], int(state[-1])) if state else (0.0, 0)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(state[-1])}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def duration_bucket(seconds: float) -> str:
+    """Label for an audio duration: the smallest of AUDIO_DURATION_BUCKETS it fits in."""
+    for bound in AUDIO_DURATION_BUCKETS:
+        if seconds <= bound:
+            return f"le{bound}s"
+    return f"gt{AUDIO_DURATION_BUCKETS[-1]}s"
+
+
+def record_pipeline_run(timecosts: Dict[str, float], infer_steps: int, batch_size: Union[int, str] = 1):
+    """
+    Called by the pipeline after a generation with its measured `timecosts`.
+    `batch_size` labels the throughput; the continuous batcher passes "continuous".
+    """
+    for stage in ("preprocess", "diffusion", "latent2audio"):
+        if stage in timecosts:
+            STAGE_SECONDS.observe(timecosts[stage], stage=stage)
+    if timecosts.get("diffusion"):
+        DIFFUSION_STEPS_PER_SECOND.observe(infer_steps / timecosts["diffusion"], batch_size=batch_size)
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (None where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def process_memory(pid="self") -> Optional[Dict[str, int]]:
+    """
+    Memory of a process in bytes from /proc/<pid>/smaps_rollup (None where unavailable):
+    'rss', 'pss' (shared pages split between the processes mapping them), 'shared'
+    and 'private' (pages no other process maps).
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+@contextmanager
+def track_peak_memory(interval: float = 0.05):
+    """
+    Records the process's peak RSS (sampled) and peak CUDA allocation while the
+    block runs into JOB_PEAK_MEMORY_BYTES. With concurrent jobs in one process
+    each job sees the shared peak.
+    """
+    torch = sys.modules.get("torch")
+    use_cuda = torch is not None and torch.cuda.is_available()
+    if use_cuda:
+        torch.cuda.reset_peak_memory_stats()
+
+    peak = [current_rss() or 0]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], current_rss() or 0)
+
+    sampler = threading.Thread(target=sample, name="peak-memory-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        done.set()
+        sampler.join()
+        peak[0] = max(peak[0], current_rss() or 0)
+        if peak[0]:
+            JOB_PEAK_MEMORY_BYTES.observe(peak[0], device="cpu")
+        if use_cuda:
+            JOB_PEAK_MEMORY_BYTES.observe(torch.cuda.max_memory_allocated(), device="cuda")
+
+
+# --- API ---
+QUEUE_DEPTH = Gauge("ace_queue_depth", "Jobs waiting in the queue")
+QUEUE_WAIT_SECONDS = Histogram(
+    "ace_queue_wait_seconds", "Time from submission until a job starts processing", buckets=QUEUE_WAIT_BUCKETS
+)
+JOBS_TOTAL = Counter("ace_jobs_total", "Finished jobs by outcome", labels=("status",))
+JOB_SECONDS = Histogram("ace_job_seconds", "Processing time of completed jobs (start to results)", labels=("task",))
+REAL_TIME_FACTOR = Histogram(
+    "ace_real_time_factor",
+    "Processing seconds per second of generated audio",
+    labels=("duration_bucket",),
+    buckets=RTF_BUCKETS,
+)
+JOB_PEAK_MEMORY_BYTES = Histogram(
+    "ace_job_peak_memory_bytes", "Peak memory while a job generated", labels=("device",), buckets=MEMORY_BUCKETS
+)
+UPLOAD_SECONDS = Histogram("ace_upload_seconds", "Cloud upload time per file", labels=("outcome",))
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "ace_event_loop_lag_seconds", "How late the event loop woke up from a timed sleep", buckets=LATENCY_BUCKETS
+)
+
+# --- Pipeline / decoder ---
+STAGE_SECONDS = Histogram("ace_stage_seconds", "Pipeline stage latency", labels=("stage",))
+DIFFUSION_STEPS_PER_SECOND = Histogram(
+    "ace_diffusion_steps_per_second", "Diffusion throughput per generation", labels=("batch_size",), buckets=RATE_BUCKETS
+)
+DECODE_WINDOW_SECONDS = Histogram(
+    "ace_decode_window_seconds", "Audio decoder host time per DCAE / vocoder window", labels=("decoder",)
+)
+ENGINE_EVENTS_TOTAL = Counter("ace_engine_events_total", "Engine variant loads and evictions", labels=("event", "variant"))
+ENGINE_RESIDENT_BYTES = Gauge(
+    "ace_engine_resident_bytes", "Memory held by each loaded engine variant", labels=("variant", "memory")
+)
+MODEL_LOAD_SECONDS = Gauge("ace_model_load_seconds", "Checkpoint load time of the last load", labels=("component",))
+MODEL_LOAD_PEAK_RSS_BYTES = Gauge(
+    "ace_model_load_peak_rss_bytes", "Peak process RSS while the component loaded (shared by concurrent loads)", labels=("component",)
+)
+CONDITIONING_CACHE_TOTAL = Counter(
+    "ace_conditioning_cache_total", "Conditioning cache lookups by outcome (hit / disk_hit / miss)", labels=("kind", "result")
+)
+CONDITIONING_CACHE_BYTES = Gauge("ace_conditioning_cache_bytes", "Conditioning tensors held in memory")
+CONDITIONING_CACHE_HIT_RATE = Gauge("ace_conditioning_cache_hit_rate", "Share of conditioning lookups served from the cache")
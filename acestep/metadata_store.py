@@ -0,0 +1,224 @@
+"""
+One metadata record per generated output.
+
+Records live in one SQLite database per output directory, kept in
+'ACE_METADATA_DIR' (default: a `metadata` directory beside the output directory)
+rather than next to the audio, since output directories may be served publicly. They are keyed by the audio filename.
+A record holds the generation params the pipeline used plus whatever the API
+adds later (title, parent, cover, ...).
+
+Outputs written before the store existed have two JSON sidecars,
+`<name>_input_params.json` and `<name>.json`. Those are imported the first time
+the record is read and left in place; `tools/migrate_metadata.py` imports a
+whole directory and can then remove them.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+from loguru import logger
+
+from acestep.tracing import traced
+
+LEGACY_SUFFIXES = ("_input_params.json", ".json")
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg")
+
+
+class MetadataStore:
+    """Read-through metadata records for the audio files in one directory (safe across threads and processes)."""
+
+    def __init__(self, directory: str, path: str):
+        self.directory = directory
+        self.path = path
+        self._lock = threading.Lock()
+        self._legacy_swept = False
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                filename TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_updated ON records (updated_at)")
+
+    def get(self, filename: str) -> Dict[str, Any]:
+        """The file's record ({} if it has none)."""
+        return self.get_many([filename])[filename]
+
+    def get_many(self, filenames: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        filenames = list(filenames)
+        records: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for i in range(0, len(filenames), 500):
+                chunk = filenames[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT filename, data FROM records WHERE filename IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                records.update((filename, json.loads(data)) for filename, data in rows)
+        for filename in filenames:
+            if filename not in records:
+                records[filename] = self._import_legacy(filename)
+        return records
+
+    def put(self, filename: str, data: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO records (filename, data, updated_at) VALUES (?, ?, ?)",
+                (filename, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+
+    def update(self, filename: str, **fields) -> Dict[str, Any]:
+        """Merges `fields` into the file's record and returns the result."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM records WHERE filename = ?", (filename,)).fetchone()
+                data = json.loads(row[0]) if row else self._read_legacy(filename)
+                data.update(fields)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO records (filename, data, updated_at) VALUES (?, ?, ?)",
+                    (filename, json.dumps(data, ensure_ascii=False), time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return data
+
+    def rename(self, filename: str, new_name: str):
+        self.get(filename)  # imports legacy sidecars under the old name first
+        with self._lock:
+            self._conn.execute(
+                "UPDATE OR REPLACE records SET filename = ?, updated_at = ? WHERE filename = ?",
+                (new_name, time.time(), filename),
+            )
+        # sidecars follow their audio so they keep describing it
+        base_name, new_base = os.path.splitext(filename)[0], os.path.splitext(new_name)[0]
+        for suffix in LEGACY_SUFFIXES:
+            old_path = os.path.join(self.directory, base_name + suffix)
+            if os.path.exists(old_path):
+                try:
+                    os.replace(old_path, os.path.join(self.directory, new_base + suffix))
+                except OSError as e:
+                    logger.warning(f"Could not rename sidecar {base_name + suffix}: {e}")
+
+    def delete(self, filename: str):
+        """Drops the record of a deleted output, and its sidecars so they are not imported again."""
+        with self._lock:
+            self._conn.execute("DELETE FROM records WHERE filename = ?", (filename,))
+        self._remove_legacy(filename)
+
+    def filenames(self) -> List[str]:
+        """Every file with a record, most recently written first."""
+        if not self._legacy_swept:
+            self._import_directory()
+        with self._lock:
+            rows = self._conn.execute("SELECT filename FROM records ORDER BY updated_at DESC").fetchall()
+        return [row[0] for row in rows]
+
+    def migrate(self, remove_sidecars: bool = False) -> Dict[str, int]:
+        """
+        Imports the sidecars of every output in the directory. With `remove_sidecars`
+        the sidecars of outputs that have a record afterwards are deleted.
+        """
+        names = self._import_directory()
+        removed = 0
+        if remove_sidecars:
+            with self._lock:
+                recorded = {row[0] for row in self._conn.execute("SELECT filename FROM records").fetchall()}
+            for name in names:
+                if name in recorded:
+                    removed += self._remove_legacy(name)
+        return {"outputs": len(names), "sidecars_removed": removed}
+
+    def _import_directory(self) -> List[str]:
+        names = [
+            name for name in os.listdir(self.directory)
+            if name.lower().endswith(AUDIO_EXTENSIONS)
+        ]
+        self.get_many(names)
+        self._legacy_swept = True
+        return names
+
+    def _import_legacy(self, filename: str) -> Dict[str, Any]:
+        data = self._read_legacy(filename)
+        if data or os.path.exists(os.path.join(self.directory, filename)):
+            # an empty record too, so files without sidecars are not probed again
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO records (filename, data, updated_at) VALUES (?, ?, ?)",
+                    (filename, json.dumps(data, ensure_ascii=False), time.time()),
+                )
+        return data
+
+    def _read_legacy(self, filename: str) -> Dict[str, Any]:
+        base_name = os.path.splitext(filename)[0]
+        data: Dict[str, Any] = {}
+        # generation params first, user metadata on top
+        for suffix in LEGACY_SUFFIXES:
+            try:
+                with open(os.path.join(self.directory, base_name + suffix), "r", encoding="utf-8") as f:
+                    data.update(json.load(f))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning(f"Unreadable sidecar {base_name + suffix}: {e}")
+        return data
+
+    def _remove_legacy(self, filename: str) -> int:
+        base_name = os.path.splitext(filename)[0]
+        removed = 0
+        for suffix in LEGACY_SUFFIXES:
+            try:
+                os.remove(os.path.join(self.directory, base_name + suffix))
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove sidecar {base_name + suffix}: {e}")
+        return removed
+
+
+_STORES: Dict[str, MetadataStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def metadata_db_path(directory: str) -> str:
+    """
+    Where the records of `directory` are kept: 'ACE_METADATA_DIR' (default
+    <parent of directory>/metadata) / <directory name>-<hash of its absolute path>.db.
+    """
+    key = os.path.abspath(directory)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+    name = os.path.basename(key.rstrip(os.sep)) or "root"
+    root = os.getenv("ACE_METADATA_DIR") or os.path.join(os.path.dirname(key.rstrip(os.sep)), "metadata")
+    return os.path.join(os.path.abspath(root), f"{name}-{digest}.db")
+
+
+def get_metadata_store(directory: str) -> MetadataStore:
+    """The (per-process) store of a directory."""
+    key = os.path.abspath(directory)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            path = metadata_db_path(key)
+            os.makedirs(key, exist_ok=True)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            store = _STORES[key] = MetadataStore(key, path)
+        return store
+
+
+@traced()
+def save_output_metadata(audio_path: str, data: Dict[str, Any]):
+    """Records the params an output was generated with."""
+    get_metadata_store(os.path.dirname(audio_path) or ".").put(os.path.basename(audio_path), data)
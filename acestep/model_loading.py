@@ -0,0 +1,225 @@
+"""
+Checkpoint loading for the pipeline's components.
+
+`load_pretrained` builds a model with empty (meta) parameters and fills it tensor
+by tensor from its memory-mapped safetensors files, casting each tensor to the
+target dtype and moving it to the target device as it is read. A component is
+therefore never held in host RAM twice (full-precision copy + cast copy), which
+is what `from_pretrained(...).to(device).to(dtype)` does.
+
+`load_components` runs several loads side by side (safetensors reads and tensor
+copies release the GIL) and reports each one's load time and the peak RSS seen
+while it ran.
+
+`share_weights` moves a loaded CPU model's weights into shared memory, and
+`load_shared` builds the same model in another process around them, so several
+worker processes serve from one copy.
+"""
+
+import glob
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Any, Callable, Dict, List, Tuple
+
+import torch
+from accelerate import init_empty_weights
+from accelerate.utils import set_module_tensor_to_device
+from loguru import logger
+from safetensors import safe_open
+
+from acestep.instrumentation import MODEL_LOAD_PEAK_RSS_BYTES, MODEL_LOAD_SECONDS, current_rss
+
+
+def _build_empty(model_class, directory: str) -> torch.nn.Module:
+    with init_empty_weights():
+        if hasattr(model_class, "load_config"):
+            # diffusers ModelMixin
+            return model_class.from_config(model_class.load_config(directory))
+        # transformers PreTrainedModel
+        return model_class(model_class.config_class.from_pretrained(directory))
+
+
+def load_pretrained(model_class, directory: str, dtype: torch.dtype, device: torch.device) -> torch.nn.Module:
+    """
+    Loads a diffusers / transformers model saved in `directory` onto `device` in
+    `dtype` (floating-point tensors only, like `.to(dtype)`), in eval mode.
+    Falls back to `from_pretrained` when the weights are not safetensors or do not
+    cover every parameter.
+    """
+    files = sorted(glob.glob(os.path.join(directory, "*.safetensors")))
+    if files:
+        try:
+            model = _build_empty(model_class, directory)
+            expected = set(model.state_dict())
+            # safetensors maps the file and can read straight into CUDA memory
+            read_device = str(device) if device.type == "cuda" else "cpu"
+            for file in files:
+                with safe_open(file, framework="pt", device=read_device) as f:
+                    for name in f.keys():
+                        if name in expected:
+                            set_module_tensor_to_device(model, name, device, value=f.get_tensor(name), dtype=dtype)
+            if hasattr(model, "tie_weights"):
+                model.tie_weights()
+            missing = [
+                name for name, tensor in chain(model.named_parameters(), model.named_buffers())
+                if tensor.device.type == "meta"
+            ]
+            if not missing:
+                # buffers built in __init__ (not in the checkpoint) still need to be moved;
+                # everything already in place is left as is
+                return model.to(device).to(dtype).eval()
+            logger.warning(f"{directory}: {len(missing)} tensors missing from safetensors (e.g. {missing[0]}); using from_pretrained")
+        except Exception as e:
+            logger.warning(f"{directory}: memory-mapped load failed ({type(e).__name__}: {e}); using from_pretrained")
+
+    return model_class.from_pretrained(directory, torch_dtype=dtype).to(device).to(dtype).eval()
+
+
+def load_components(
+    loaders: Dict[str, Callable[[], Any]], max_workers: int = 4, sample_interval: float = 0.05
+) -> Tuple[Dict[str, Any], Dict[str, dict]]:
+    """
+    Runs `loaders` (name -> zero-argument callable) on up to `max_workers` threads.
+    Returns the loaded objects by name and a report of `seconds` and
+    `peak_rss_bytes` per name plus a 'total' entry. Concurrent loads share one
+    process, so a component's peak RSS includes whatever loaded alongside it.
+    """
+    samples: List[Tuple[float, int]] = []
+    windows: Dict[str, Tuple[float, float]] = {}
+    done = threading.Event()
+
+    def sample():
+        while True:
+            samples.append((time.perf_counter(), current_rss() or 0))
+            if done.wait(sample_interval):
+                return
+
+    def run(name: str, loader: Callable[[], Any]):
+        start = time.perf_counter()
+        result = loader()
+        end = time.perf_counter()
+        samples.append((end, current_rss() or 0))
+        windows[name] = (start, end)
+        return result
+
+    started = time.perf_counter()
+    sampler = threading.Thread(target=sample, name="load-rss-sampler", daemon=True)
+    sampler.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="checkpoint-load") as executor:
+            futures = {name: executor.submit(run, name, loader) for name, loader in loaders.items()}
+            components = {name: future.result() for name, future in futures.items()}
+    finally:
+        done.set()
+        sampler.join()
+
+    report = {}
+    for name, (start, end) in windows.items():
+        peak = max((rss for at, rss in samples if start <= at <= end), default=0)
+        report[name] = {"seconds": end - start, "peak_rss_bytes": peak}
+    report["total"] = {
+        "seconds": time.perf_counter() - started,
+        "peak_rss_bytes": max((rss for _, rss in samples), default=0),
+    }
+    for name, entry in report.items():
+        MODEL_LOAD_SECONDS.set(entry["seconds"], component=name)
+        MODEL_LOAD_PEAK_RSS_BYTES.set(entry["peak_rss_bytes"], component=name)
+        logger.info(f"Loaded {name} in {entry['seconds']:.2f}s (peak RSS {entry['peak_rss_bytes'] / 2**30:.2f} GiB)")
+    return components, report
+
+
+class SharedWeights:
+    """
+    A model's parameters and buffers packed into one shared-memory tensor per dtype.
+    Pickling it for another process (torch.multiprocessing, e.g. as a spawn
+    argument) sends handles to the segments, not the data.
+    """
+
+    def __init__(self, buffers: Dict[str, torch.Tensor], layout: Dict[str, Tuple[str, int, Tuple[int, ...]]]):
+        self.buffers = buffers  # dtype name -> flat shared tensor
+        self.layout = layout  # state-dict name -> (dtype name, offset, shape)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.numel() * buffer.element_size() for buffer in self.buffers.values())
+
+    def tensors(self) -> Dict[str, torch.Tensor]:
+        """Views into the shared buffers by state-dict name; tied names get the same view."""
+        views = {}
+        tensors = {}
+        for name, (dtype, offset, shape) in self.layout.items():
+            key = (dtype, offset, shape)
+            if key not in views:
+                views[key] = self.buffers[dtype][offset:offset + math.prod(shape)].view(shape)
+            tensors[name] = views[key]
+        return tensors
+
+
+def _assign(model: torch.nn.Module, tensors: Dict[str, torch.Tensor]):
+    """Points the model's parameters / buffers at `tensors` without copying."""
+    parameters = {}
+    for name, tensor in tensors.items():
+        module_name, _, leaf = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        if leaf in module._parameters:
+            # one Parameter per tensor keeps tied weights tied
+            if id(tensor) not in parameters:
+                parameters[id(tensor)] = torch.nn.Parameter(tensor, requires_grad=False)
+            module._parameters[leaf] = parameters[id(tensor)]
+        else:
+            module._buffers[leaf] = tensor
+
+
+def share_weights(model: torch.nn.Module) -> SharedWeights:
+    """
+    Copies the state dict of a CPU model into shared memory and points the model at
+    the shared copy (its own tensors are freed). The weights are read-only from then
+    on: a write in any process is seen by all of them.
+    """
+    state = model.state_dict(keep_vars=True)
+    off_cpu = [name for name, tensor in state.items() if tensor.device.type != "cpu"]
+    if off_cpu:
+        raise ValueError(f"Only CPU weights can be shared ({off_cpu[0]} is on {state[off_cpu[0]].device})")
+
+    layout = {}
+    placed = {}
+    sizes: Dict[str, int] = defaultdict(int)
+    for name, tensor in state.items():
+        # tied weights appear under several names but are stored once
+        key = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape))
+        if key not in placed:
+            dtype = str(tensor.dtype).replace("torch.", "")
+            placed[key] = (dtype, sizes[dtype], tuple(tensor.shape))
+            sizes[dtype] += tensor.numel()
+        layout[name] = placed[key]
+
+    shared = SharedWeights(
+        {dtype: torch.empty(size, dtype=getattr(torch, dtype)).share_memory_() for dtype, size in sizes.items()},
+        layout,
+    )
+    views = shared.tensors()
+    with torch.no_grad():
+        for name, tensor in state.items():
+            views[name].copy_(tensor)
+    _assign(model, views)
+    return shared
+
+
+def load_shared(model_class, directory: str, shared: SharedWeights) -> torch.nn.Module:
+    """
+    Builds the model saved in `directory` (only its config is read) around weights
+    another process published with `share_weights`, in eval mode. Nothing is copied.
+    """
+    model = _build_empty(model_class, directory)
+    _assign(model, shared.tensors())
+    if hasattr(model, "tie_weights"):
+        model.tie_weights()
+    missing = [name for name, tensor in chain(model.named_parameters(), model.named_buffers()) if tensor.device.type == "meta"]
+    if missing:
+        raise ValueError(f"{directory}: {len(missing)} tensors are not in the shared weights (e.g. {missing[0]})")
+    return model.eval()
@@ -203,6 +203,22 @@ class Transformer2DModelOutput(BaseOutput):
     proj_losses: Optional[Tuple[Tuple[str, torch.Tensor]]] = None
 
 
+@dataclass
+class CrossAttentionCache:
+    """
+    Cross-attention keys / values of every transformer block for one conditioning branch, plus the combined
+    latent x encoder mask shared by all blocks. The conditioning does not change during the diffusion loop, so
+    this is built once per request with `ACEStepTransformer2DModel.build_cross_attention_cache`.
+    """
+
+    key_values: List[Tuple[torch.Tensor, torch.Tensor]]
+    attention_mask: Optional[torch.Tensor] = None
+
+    def __getitem__(self, index_block):
+        key, value = self.key_values[index_block]
+        return key, value, self.attention_mask
+
+
 class ACEStepTransformer2DModel(
     ModelMixin, ConfigMixin, PeftAdapterMixin, FromOriginalModelMixin
 ):
@@ -411,6 +427,50 @@ class ACEStepTransformer2DModel(
         )
         return encoder_hidden_states, encoder_hidden_mask
 
+    def build_cross_attention_cache(
+        self,
+        encoder_hidden_states: torch.Tensor,
+        encoder_hidden_mask: torch.Tensor,
+        attention_mask: torch.Tensor,
+    ) -> CrossAttentionCache:
+        """
+        Precompute the cross-attention keys / values (projection, key norm, encoder RoPE) and the combined mask
+        for every transformer block, so that `decode` does not redo them at every diffusion step.
+        """
+        encoder_rotary_freqs_cis = self.rotary_emb(
+            encoder_hidden_states, seq_len=encoder_hidden_states.shape[1]
+        )
+        key_values = [
+            block.cross_attn.processor.prepare_key_value(
+                block.cross_attn,
+                encoder_hidden_states,
+                rotary_freqs_cis_cross=encoder_rotary_freqs_cis,
+            )
+            for block in self.transformer_blocks
+        ]
+        cross_attention_mask = self.transformer_blocks[
+            0
+        ].cross_attn.processor.prepare_cross_attention_mask(
+            attention_mask, encoder_hidden_mask, key_values[0][0].dtype
+        )
+        return CrossAttentionCache(
+            key_values=key_values, attention_mask=cross_attention_mask
+        )
+
+    def precompute_timestep_embeddings(
+        self,
+        timesteps: torch.Tensor,
+        dtype: torch.dtype,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Embed a whole timestep schedule at once. Returns `(embedded_timestep, temb)`, one row per timestep;
+        slice and expand a row to the batch size and pass it to `decode` as `timestep_embedding`.
+        """
+        embedded_timesteps = self.timestep_embedder(
+            self.time_proj(timesteps).to(dtype=dtype)
+        )
+        return embedded_timesteps, self.t_block(embedded_timesteps)
+
     def decode(
         self,
         hidden_states: torch.Tensor,
@@ -425,12 +485,17 @@ class ACEStepTransformer2DModel(
         ] = None,
         controlnet_scale: Union[float, torch.Tensor] = 1.0,
         return_dict: bool = True,
+        cross_attention_cache: Optional[CrossAttentionCache] = None,
+        timestep_embedding: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
     ):
 
-        embedded_timestep = self.timestep_embedder(
-            self.time_proj(timestep).to(dtype=hidden_states.dtype)
-        )
-        temb = self.t_block(embedded_timestep)
+        if timestep_embedding is not None:
+            embedded_timestep, temb = timestep_embedding
+        else:
+            embedded_timestep = self.timestep_embedder(
+                self.time_proj(timestep).to(dtype=hidden_states.dtype)
+            )
+            temb = self.t_block(embedded_timestep)
 
         hidden_states = self.proj_in(hidden_states)
 
@@ -444,11 +509,18 @@ class ACEStepTransformer2DModel(
         rotary_freqs_cis = self.rotary_emb(
             hidden_states, seq_len=hidden_states.shape[1]
         )
-        encoder_rotary_freqs_cis = self.rotary_emb(
-            encoder_hidden_states, seq_len=encoder_hidden_states.shape[1]
-        )
+        encoder_rotary_freqs_cis = None
+        if cross_attention_cache is None:
+            encoder_rotary_freqs_cis = self.rotary_emb(
+                encoder_hidden_states, seq_len=encoder_hidden_states.shape[1]
+            )
 
         for index_block, block in enumerate(self.transformer_blocks):
+            block_cross_attention_cache = (
+                cross_attention_cache[index_block]
+                if cross_attention_cache is not None
+                else None
+            )
 
             if self.training and self.gradient_checkpointing:
 
@@ -461,6 +533,7 @@ class ACEStepTransformer2DModel(
                     rotary_freqs_cis=rotary_freqs_cis,
                     rotary_freqs_cis_cross=encoder_rotary_freqs_cis,
                     temb=temb,
+                    cross_attention_cache=block_cross_attention_cache,
                     use_reentrant=False,
                 )
 
@@ -473,6 +546,7 @@ class ACEStepTransformer2DModel(
                     rotary_freqs_cis=rotary_freqs_cis,
                     rotary_freqs_cis_cross=encoder_rotary_freqs_cis,
                     temb=temb,
+                    cross_attention_cache=block_cross_attention_cache,
                 )
 
             for ssl_encoder_depth in self.ssl_encoder_depths:
@@ -267,6 +267,7 @@ class LinearTransformerBlock(nn.Module):
         rotary_freqs_cis: Union[torch.Tensor, Tuple[torch.Tensor]] = None,
         rotary_freqs_cis_cross: Union[torch.Tensor, Tuple[torch.Tensor]] = None,
         temb: torch.FloatTensor = None,
+        cross_attention_cache: Tuple[torch.Tensor, torch.Tensor, torch.Tensor] = None,
     ):
 
         N = hidden_states.shape[0]
@@ -313,6 +314,7 @@ class LinearTransformerBlock(nn.Module):
                 encoder_attention_mask=encoder_attention_mask,
                 rotary_freqs_cis=rotary_freqs_cis,
                 rotary_freqs_cis_cross=rotary_freqs_cis_cross,
+                cross_attention_cache=cross_attention_cache,
             )
             hidden_states = attn_output + hidden_states
 
@@ -285,6 +285,67 @@ class CustomerAttnProcessor2_0:
 
         return out
 
+    def prepare_cross_attention_mask(
+        self,
+        attention_mask: torch.Tensor,
+        encoder_attention_mask: torch.Tensor,
+        dtype: torch.dtype,
+    ) -> torch.Tensor:
+        """
+        Combine the latent mask (N x S1) and the encoder mask (N x S2) into an additive bias of shape
+        (N, 1, S1, S2) that `scaled_dot_product_attention` broadcasts over the heads.
+        Rows of padded latent frames are fully masked; they are left unmasked instead so that softmax does not
+        produce NaN there (their outputs are discarded by the caller anyway).
+        """
+        # cross attention 整合attention_mask和encoder_attention_mask
+        combined_mask = attention_mask[:, :, None] * encoder_attention_mask[:, None, :]
+        attention_mask = torch.where(combined_mask == 1, 0.0, -torch.inf)
+        fully_masked_rows = (combined_mask == 0).all(dim=-1, keepdim=True)
+        attention_mask = attention_mask.masked_fill(fully_masked_rows, 0.0)
+        return attention_mask[:, None, :, :].to(dtype)
+
+    def prepare_key_value(
+        self,
+        attn: Attention,
+        encoder_hidden_states: torch.FloatTensor,
+        rotary_freqs_cis_cross: Union[torch.Tensor, Tuple[torch.Tensor]] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Project, normalize and rotate the cross-attention keys / values. Both only depend on the conditioning, so
+        they can be computed once per request and passed back in through `cross_attention_cache`.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: key and value, each of shape [B, H, S_enc, D].
+        """
+        batch_size = encoder_hidden_states.shape[0]
+        has_encoder_hidden_state_proj = (
+            hasattr(attn, "add_q_proj")
+            and hasattr(attn, "add_k_proj")
+            and hasattr(attn, "add_v_proj")
+        )
+
+        if attn.norm_cross:
+            encoder_hidden_states = attn.norm_encoder_hidden_states(
+                encoder_hidden_states
+            )
+
+        key = attn.to_k(encoder_hidden_states)
+        value = attn.to_v(encoder_hidden_states)
+
+        inner_dim = key.shape[-1]
+        head_dim = inner_dim // attn.heads
+
+        key = key.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+        value = value.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+
+        if attn.norm_k is not None:
+            key = attn.norm_k(key)
+
+        if rotary_freqs_cis_cross is not None and has_encoder_hidden_state_proj:
+            key = self.apply_rotary_emb(key, rotary_freqs_cis_cross)
+
+        return key, value
+
     def __call__(
         self,
         attn: Attention,
@@ -294,6 +355,7 @@ class CustomerAttnProcessor2_0:
         encoder_attention_mask: Optional[torch.FloatTensor] = None,
         rotary_freqs_cis: Union[torch.Tensor, Tuple[torch.Tensor]] = None,
         rotary_freqs_cis_cross: Union[torch.Tensor, Tuple[torch.Tensor]] = None,
+        cross_attention_cache: Optional[Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]] = None,
         *args,
         **kwargs,
     ) -> torch.Tensor:
@@ -307,10 +369,13 @@ class CustomerAttnProcessor2_0:
                 batch_size, channel, height * width
             ).transpose(1, 2)
 
-        batch_size, sequence_length, _ = (
-            hidden_states.shape
+        batch_size = hidden_states.shape[0]
+        if encoder_hidden_states is not None:
+            batch_size = encoder_hidden_states.shape[0]
+        sequence_length = (
+            hidden_states.shape[1]
             if encoder_hidden_states is None
-            else encoder_hidden_states.shape
+            else encoder_hidden_states.shape[1]
         )
 
         has_encoder_hidden_state_proj = (
@@ -326,64 +391,62 @@ class CustomerAttnProcessor2_0:
 
         query = attn.to_q(hidden_states)
 
-        if encoder_hidden_states is None:
-            encoder_hidden_states = hidden_states
-        elif attn.norm_cross:
-            encoder_hidden_states = attn.norm_encoder_hidden_states(
-                encoder_hidden_states
-            )
-
-        key = attn.to_k(encoder_hidden_states)
-        value = attn.to_v(encoder_hidden_states)
-
-        inner_dim = key.shape[-1]
+        inner_dim = query.shape[-1]
         head_dim = inner_dim // attn.heads
 
         query = query.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
 
-        key = key.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
-        value = value.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
-
         if attn.norm_q is not None:
             query = attn.norm_q(query)
-        if attn.norm_k is not None:
-            key = attn.norm_k(key)
 
         # Apply RoPE if needed
         if rotary_freqs_cis is not None:
             query = self.apply_rotary_emb(query, rotary_freqs_cis)
-            if not attn.is_cross_attention:
-                key = self.apply_rotary_emb(key, rotary_freqs_cis)
-            elif rotary_freqs_cis_cross is not None and has_encoder_hidden_state_proj:
-                key = self.apply_rotary_emb(key, rotary_freqs_cis_cross)
 
-        if (
-            attn.is_cross_attention
-            and encoder_attention_mask is not None
-            and has_encoder_hidden_state_proj
-        ):
-            # attention_mask: N x S1
-            # encoder_attention_mask: N x S2
-            # cross attention 整合attention_mask和encoder_attention_mask
-            combined_mask = (
-                attention_mask[:, :, None] * encoder_attention_mask[:, None, :]
-            )
-            attention_mask = torch.where(combined_mask == 1, 0.0, -torch.inf)
-            attention_mask = (
-                attention_mask[:, None, :, :]
-                .expand(-1, attn.heads, -1, -1)
-                .to(query.dtype)
+        if attn.is_cross_attention and cross_attention_cache is not None:
+            # keys / values / mask were precomputed for this request
+            key, value, attention_mask = cross_attention_cache
+        elif attn.is_cross_attention:
+            key, value = self.prepare_key_value(
+                attn,
+                encoder_hidden_states,
+                rotary_freqs_cis_cross=(
+                    rotary_freqs_cis_cross if rotary_freqs_cis is not None else None
+                ),
             )
+            if encoder_attention_mask is not None and has_encoder_hidden_state_proj:
+                attention_mask = self.prepare_cross_attention_mask(
+                    attention_mask, encoder_attention_mask, query.dtype
+                )
+        else:
+            if encoder_hidden_states is None:
+                encoder_hidden_states = hidden_states
+            elif attn.norm_cross:
+                encoder_hidden_states = attn.norm_encoder_hidden_states(
+                    encoder_hidden_states
+                )
+
+            key = attn.to_k(encoder_hidden_states)
+            value = attn.to_v(encoder_hidden_states)
+
+            key = key.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+            value = value.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+
+            if attn.norm_k is not None:
+                key = attn.norm_k(key)
+
+            if rotary_freqs_cis is not None:
+                key = self.apply_rotary_emb(key, rotary_freqs_cis)
 
-        elif not attn.is_cross_attention and attention_mask is not None:
-            attention_mask = attn.prepare_attention_mask(
-                attention_mask, sequence_length, batch_size
-            )
-            # scaled_dot_product_attention expects attention_mask shape to be
-            # (batch, heads, source_length, target_length)
-            attention_mask = attention_mask.view(
-                batch_size, attn.heads, -1, attention_mask.shape[-1]
-            )
+            if attention_mask is not None:
+                attention_mask = attn.prepare_attention_mask(
+                    attention_mask, sequence_length, batch_size
+                )
+                # scaled_dot_product_attention expects attention_mask shape to be
+                # (batch, heads, source_length, target_length)
+                attention_mask = attention_mask.view(
+                    batch_size, attn.heads, -1, attention_mask.shape[-1]
+                )
 
         # the output of sdp = (batch, num_heads, seq_len, head_dim)
         # TODO: add support for attn.scale when we move to Torch 2.1
@@ -1,7 +1,12 @@
+import tempfile
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
 from typing import Dict, Any, List, Optional
 
 class AudioEngine(ABC):
+    # set by a worker process before `load_model` to reuse another process's weights
+    shared_weights: Any = None
+
     @abstractmethod
     def load_model(self, checkpoint_path: Optional[str] = None):
         """Loads the model weights into memory."""
@@ -14,3 +19,62 @@ class AudioEngine(ABC):
         Returns: List of output file paths.
         """
         pass
+
+    def generate_batch(self, params_list: List[Dict[str, Any]]) -> List[List[str]]:
+        """
+        Generates several compatible jobs together.
+        Returns: one `generate` result per job, in order.
+        """
+        return [self.generate(params) for params in params_list]
+
+    def submit(self, params: Dict[str, Any]) -> Future:
+        """
+        Queues a generation on the engine's continuous batcher.
+        Returns: Future resolving to the same value as `generate`.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support continuous batching")
+
+    def unload(self):
+        """Releases the model so its memory can be reclaimed."""
+        pass
+
+    def memory_footprint(self) -> Dict[str, int]:
+        """Bytes the loaded model holds, by memory kind ('ram' / 'vram')."""
+        return {}
+
+    def share_weights(self) -> Any:
+        """
+        Moves the loaded weights into shared memory and returns a picklable handle for
+        other processes' engines (their `shared_weights`). None if the engine cannot share.
+        """
+        return None
+
+    def warm_up(self, params: Dict[str, Any]):
+        """
+        Runs one throwaway generation so the first real job does not pay for
+        kernel compilation and allocator growth. Outputs go to a temporary directory.
+        """
+        with tempfile.TemporaryDirectory(prefix="ace-warmup-") as directory:
+            self.generate({**params, "save_path": directory})
+
+
+# Engine params that only steer the engine and never reach ACEStepPipeline.__call__
+# ('trace_context' is attached by the engine around the call instead)
+ENGINE_ONLY_PARAMS = ("prompt", "lyrics", "duration", "steps", "cfg_scale", "seed", "trace_context")
+
+
+def pipeline_kwargs(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps engine params (as built by JobService) to ACEStepPipeline.__call__ keyword arguments."""
+    # Extract normalized params
+    lyrics = params.get("lyrics", "")
+    seed = params.get("seed", -1)
+    return dict(
+        prompt=params.get("prompt", ""),
+        lyrics=lyrics if lyrics else None,
+        audio_duration=float(params.get("duration", 30.0)),  # Ensure float
+        infer_step=int(params.get("steps", 50)),
+        guidance_scale=float(params.get("cfg_scale", 4.5)),
+        manual_seeds=seed if seed != -1 else None,
+        # Pass through any extra kwargs if they exist in params
+        **{k: v for k, v in params.items() if k not in ENGINE_ONLY_PARAMS}
+    )
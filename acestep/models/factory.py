@@ -1,16 +1,26 @@
 import os
+from typing import Optional
 from acestep.models.engine import AudioEngine
-from acestep.models.wrappers.acestep_engine import ACEStepEngine
 
-def get_audio_engine() -> AudioEngine:
+def get_audio_engine(model_type: Optional[str] = None, **options) -> AudioEngine:
     """
     Factory function to return the configured AudioEngine.
-    Reads 'AUDIO_MODEL_TYPE' env var. Defaults to 'acestep'.
+    Reads 'AUDIO_MODEL_TYPE' env var ('acestep' or 'mock') unless `model_type` is given. Defaults to 'acestep'.
+    `options` (quantized, lora, lora_weight) go to the engine's constructor.
     """
-    model_type = os.getenv("AUDIO_MODEL_TYPE", "acestep").lower()
+    model_type = (model_type or os.getenv("AUDIO_MODEL_TYPE", "acestep")).lower()
     
+    # engines import their model stacks (torch, diffusers, ...) only when selected
     if model_type == "acestep":
-        return ACEStepEngine()
+        from acestep.models.wrappers.acestep_engine import ACEStepEngine
+
+        return ACEStepEngine(**options)
+
+    if model_type == "mock":
+        # load testing the API without a model (tools/loadtest.py)
+        from acestep.models.wrappers.mock_engine import MockEngine
+
+        return MockEngine(**options)
     
     # Placeholder for future expansion
     # if model_type == "musicgen":
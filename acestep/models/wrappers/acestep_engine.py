@@ -1,14 +1,30 @@
+import gc
 import logging
 import os
+import random
+from concurrent.futures import Future
 from typing import Dict, Any, List, Optional
-from acestep.models.engine import AudioEngine
+
+import torch
+
+from acestep.models.engine import AudioEngine, pipeline_kwargs
 from acestep.pipeline_ace_step import ACEStepPipeline
+from acestep.tracing import attach, tracer
 
 logger = logging.getLogger(__name__)
 
 class ACEStepEngine(AudioEngine):
-    def __init__(self):
+    """
+    `quantized` loads the int4 checkpoint; `lora` (hub repo or directory) is
+    activated with `lora_weight` right after loading.
+    """
+
+    def __init__(self, quantized: bool = False, lora: Optional[str] = None, lora_weight: float = 1.0):
         self.pipeline = None
+        self.batcher = None
+        self.quantized = quantized
+        self.lora = lora
+        self.lora_weight = lora_weight
 
     def load_model(self, checkpoint_path: Optional[str] = None):
         if self.pipeline is not None:
@@ -20,10 +36,20 @@ class ACEStepEngine(AudioEngine):
                 checkpoint_dir=checkpoint_path,
                 dtype="bfloat16",  
                 torch_compile=False,
-                cpu_offload=True 
+                cpu_offload=True,
+                batched_guidance=os.getenv("ACE_BATCHED_GUIDANCE", "false").lower() == "true",
+                quantized=self.quantized,
             )
             # Eager load
-            self.pipeline.load_checkpoint(self.pipeline.checkpoint_dir)
+            if self.quantized:
+                self.pipeline.load_quantized_checkpoint(self.pipeline.checkpoint_dir)
+            else:
+                self.pipeline.load_checkpoint(self.pipeline.checkpoint_dir, shared_weights=self.shared_weights)
+            if self.lora:
+                self.pipeline.load_lora(self.lora, self.lora_weight)
+            if os.getenv("ACE_CONDITIONING_CACHE_WARM", "true").lower() == "true":
+                # UI presets and bundled examples hit the cache from their first request
+                self.pipeline.warm_conditioning_cache()
             logger.info("ACE-Step Engine Ready.")
         except Exception as e:
             logger.error(f"Failed to load ACE-Step: {e}")
@@ -33,29 +59,103 @@ class ACEStepEngine(AudioEngine):
         if not self.pipeline:
             raise RuntimeError("Model not loaded.")
 
-        # Extract normalized params
-        prompt = params.get("prompt", "")
-        lyrics = params.get("lyrics", "")
-        duration = float(params.get("duration", 30.0)) # Ensure float
-        steps = int(params.get("steps", 50))
-        cfg_scale = float(params.get("cfg_scale", 4.5))
-        seed = params.get("seed", -1)
-        
-        # ACE-Step Specifics
-        # Default to neutral/safe values for specialized args
-        logger.info(f"Generating with ACE-Step: {prompt[:50]}...")
-        
         # Invoke Pipeline __call__
         # ACEStepPipeline returns List[str] (paths)
-        output_paths = self.pipeline(
-            prompt=prompt,
-            lyrics=lyrics if lyrics else None,
-            audio_duration=duration,
-            infer_step=steps,
-            guidance_scale=cfg_scale,
-            manual_seeds=seed if seed != -1 else None,
-            # Pass through any extra kwargs if they exist in params
-            **{k: v for k, v in params.items() if k not in ["prompt", "lyrics", "duration", "steps", "cfg_scale", "seed"]}
-        )
+        with attach(params.get("trace_context")):
+            output_paths = self.pipeline(**self._pipeline_kwargs(params))
         
         return output_paths
+
+    def generate_batch(self, params_list: List[Dict[str, Any]]) -> List[List[Any]]:
+        """
+        Runs compatible jobs (same task / scheduler / cfg / steps) as one pipeline call.
+        Returns: one `generate`-style result (audio path + input params) per job, in order.
+        """
+        if not self.pipeline:
+            raise RuntimeError("Model not loaded.")
+
+        kwargs_list = [self._pipeline_kwargs(params) for params in params_list]
+        progress_callbacks = [kwargs.get("progress") for kwargs in kwargs_list]
+        cancel_checks = [kwargs.get("cancel_check") for kwargs in kwargs_list]
+
+        def progress(p, desc=""):
+            for callback in progress_callbacks:
+                if callback:
+                    callback(p, desc=desc)
+
+        # samples cannot leave a static batch, so stop only once every job wants to
+        def cancel_check():
+            return all(check is not None and check() for check in cancel_checks)
+
+        # every job keeps its own seed; unseeded jobs get a fresh one each
+        seeds = [
+            kwargs["manual_seeds"] if isinstance(kwargs["manual_seeds"], int) else random.randint(0, 2**32 - 1)
+            for kwargs in kwargs_list
+        ]
+        # traced under the first job's trace; the batch span links the other jobs' traces
+        trace_contexts = [params.get("trace_context") for params in params_list]
+        with attach(trace_contexts[0]), tracer.span("batch", links=trace_contexts[1:], batch_size=len(kwargs_list)):
+            output = self.pipeline(**{
+                **kwargs_list[0],
+                "prompt": [kwargs["prompt"] for kwargs in kwargs_list],
+                "lyrics": [kwargs["lyrics"] for kwargs in kwargs_list],
+                "audio_duration": [kwargs["audio_duration"] for kwargs in kwargs_list],
+                "manual_seeds": seeds,
+                "batch_size": len(kwargs_list),
+                "cancel_check": cancel_check,
+                "progress": progress,
+            })
+
+        n = len(kwargs_list)
+        output_paths, input_params = output[:n], output[n:]
+        return [[output_paths[i], input_params[i]] for i in range(n)]
+
+    def submit(self, params: Dict[str, Any]) -> Future:
+        if not self.pipeline:
+            raise RuntimeError("Model not loaded.")
+
+        if self.batcher is None:
+            from acestep.continuous_batching import ContinuousBatchingEngine
+
+            self.batcher = ContinuousBatchingEngine(
+                self.pipeline,
+                max_batch_size=int(os.getenv("ACE_MAX_BATCH_SIZE", 4)),
+            )
+            self.batcher.start()
+        with attach(params.get("trace_context")):
+            return self.batcher.submit(**self._pipeline_kwargs(params))
+
+    def unload(self):
+        if self.batcher is not None:
+            self.batcher.stop(timeout=30)
+            self.batcher = None
+        self.pipeline = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def share_weights(self):
+        if not self.pipeline:
+            raise RuntimeError("Model not loaded.")
+        if self.quantized or self.lora:
+            # int4 tensor subclasses and adapter layers are not packed
+            logger.warning("Weight sharing needs the plain checkpoint; workers will load their own copies.")
+            return None
+        return self.pipeline.share_weights()
+
+    def memory_footprint(self) -> Dict[str, int]:
+        footprint = {"ram": 0, "vram": 0}
+        if not self.pipeline:
+            return footprint
+        for name in ("ace_step_transformer", "music_dcae", "text_encoder_model"):
+            module = getattr(self.pipeline, name, None)
+            if module is None:
+                continue
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                kind = "ram" if tensor.device.type == "cpu" else "vram"
+                footprint[kind] += tensor.numel() * tensor.element_size()
+        return footprint
+
+    def _pipeline_kwargs(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        logger.info(f"Generating with ACE-Step: {params.get('prompt', '')[:50]}...")
+        return pipeline_kwargs(params)
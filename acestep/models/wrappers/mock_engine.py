@@ -0,0 +1,86 @@
+import logging
+import os
+import time
+import uuid
+import wave
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from acestep.cancellation import raise_if_cancelled
+from acestep.metadata_store import save_output_metadata
+from acestep.models.engine import AudioEngine, pipeline_kwargs
+
+logger = logging.getLogger(__name__)
+
+
+class MockEngine(AudioEngine):
+    """
+    Stand-in engine for load-testing the API without a model or GPU.
+
+    A generation sleeps for `overhead + steps * duration * step_cost` seconds
+    (reporting progress and honoring cancellation once per step), then writes
+    a short silent WAV plus its metadata, and returns what the real engine
+    returns: the output path followed by the input params. A static batch
+    costs its longest sample, plus `batch_scaling` of that per extra sample.
+
+    Reads 'ACE_MOCK_OVERHEAD_SECONDS' (0.05), 'ACE_MOCK_STEP_COST' (seconds per
+    step per second of audio, 0.0002) and 'ACE_MOCK_BATCH_SCALING' (0.25).
+    Variant options (quantized, lora, ...) are accepted and ignored.
+    """
+
+    def __init__(self, **options):
+        self.output_dir = os.getenv("ACE_OUTPUT_DIR", "./outputs")
+        self.overhead = float(os.getenv("ACE_MOCK_OVERHEAD_SECONDS", 0.05))
+        self.step_cost = float(os.getenv("ACE_MOCK_STEP_COST", 0.0002))
+        self.batch_scaling = float(os.getenv("ACE_MOCK_BATCH_SCALING", 0.25))
+        self.pipeline = None  # no underlying model
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def load_model(self, checkpoint_path: Optional[str] = None):
+        os.makedirs(self.output_dir, exist_ok=True)
+        logger.info(f"Mock engine ready (step cost {self.step_cost}s per step per second of audio).")
+
+    def generate(self, params: Dict[str, Any]) -> List[Any]:
+        steps = int(params.get("steps", 50))
+        self._run(self.overhead + steps * float(params.get("duration", 30.0)) * self.step_cost, steps, [params])
+        return self._write_output(params)
+
+    def generate_batch(self, params_list: List[Dict[str, Any]]) -> List[List[Any]]:
+        steps = max(int(params.get("steps", 50)) for params in params_list)
+        longest = max(float(params.get("duration", 30.0)) for params in params_list)
+        cost = steps * longest * self.step_cost * (1 + self.batch_scaling * (len(params_list) - 1))
+        self._run(self.overhead + cost, steps, params_list)
+        return [self._write_output(params) for params in params_list]
+
+    def submit(self, params: Dict[str, Any]) -> Future:
+        # samples of a continuous batch run side by side
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("ACE_MAX_BATCH_SIZE", 4)), thread_name_prefix="mock-engine"
+            )
+        return self._executor.submit(self.generate, params)
+
+    def _run(self, seconds: float, steps: int, params_list: List[Dict[str, Any]]):
+        for step in range(steps):
+            for params in params_list:
+                raise_if_cancelled(params.get("cancel_check"))
+                if params.get("progress"):
+                    params["progress"]((step + 1) / steps, desc="Generating...")
+            time.sleep(seconds / steps)
+
+    def _write_output(self, params: Dict[str, Any]) -> List[Any]:
+        # the same kwargs the real engine hands to the pipeline
+        kwargs = pipeline_kwargs(params)
+        path = os.path.join(kwargs.get("save_path") or self.output_dir, f"mock_{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(b"\0" * 4 * 800)  # 0.1 s of silence
+        # what the pipeline leaves out of its metadata (continuous_batching.UNRECORDED_PARAMS)
+        input_params = {
+            key: value for key, value in kwargs.items() if key not in ("progress", "cancel_check", "save_path")
+        }
+        input_params["audio_path"] = path
+        save_output_metadata(path, input_params)
+        return [path, input_params]
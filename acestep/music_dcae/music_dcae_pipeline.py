@@ -16,6 +16,10 @@ from diffusers.loaders import FromOriginalModelMixin
 from diffusers.configuration_utils import ConfigMixin, register_to_config
 from tqdm import tqdm
 
+from acestep.cancellation import raise_if_cancelled
+from acestep.instrumentation import DECODE_WINDOW_SECONDS
+from acestep.tracing import tracer
+
 try:
     from .music_vocoder import ADaMoSHiFiGANV1
 except ImportError:
@@ -28,17 +32,22 @@ VOCODER_PRETRAINED_PATH = os.path.join(root_dir, "checkpoints", "music_vocoder")
 
 
 class MusicDCAE(ModelMixin, ConfigMixin, FromOriginalModelMixin):
+    # already-loaded parts (see ACEStepPipeline.load_checkpoint) are not config
+    ignore_for_config = ["dcae", "vocoder"]
+
     @register_to_config
     def __init__(
         self,
         source_sample_rate=None,
         dcae_checkpoint_path=DEFAULT_PRETRAINED_PATH,
         vocoder_checkpoint_path=VOCODER_PRETRAINED_PATH,
+        dcae=None,
+        vocoder=None,
     ):
         super(MusicDCAE, self).__init__()
 
-        self.dcae = AutoencoderDC.from_pretrained(dcae_checkpoint_path)
-        self.vocoder = ADaMoSHiFiGANV1.from_pretrained(vocoder_checkpoint_path)
+        self.dcae = dcae if dcae is not None else AutoencoderDC.from_pretrained(dcae_checkpoint_path)
+        self.vocoder = vocoder if vocoder is not None else ADaMoSHiFiGANV1.from_pretrained(vocoder_checkpoint_path)
 
         if source_sample_rate is None:
             source_sample_rate = 48000
@@ -112,20 +121,23 @@ class MusicDCAE(ModelMixin, ConfigMixin, FromOriginalModelMixin):
         return latents, latent_lengths
 
     @torch.no_grad()
-    def decode(self, latents, audio_lengths=None, sr=None):
+    def decode(self, latents, audio_lengths=None, sr=None, cancel_check=None):
         latents = latents / self.scale_factor + self.shift_factor
 
         pred_wavs = []
 
         for latent in latents:
-            mels = self.dcae.decoder(latent.unsqueeze(0))
+            raise_if_cancelled(cancel_check)
+            with DECODE_WINDOW_SECONDS.time(decoder="dcae"), tracer.span("dcae_window"):
+                mels = self.dcae.decoder(latent.unsqueeze(0))
             mels = mels * 0.5 + 0.5
             mels = mels * (self.max_mel_value - self.min_mel_value) + self.min_mel_value
 
             # wav = self.vocoder.decode(mels[0]).squeeze(1)
             # decode waveform for each channels to reduce vram footprint
-            wav_ch1 = self.vocoder.decode(mels[:,0,:,:]).squeeze(1).cpu()
-            wav_ch2 = self.vocoder.decode(mels[:,1,:,:]).squeeze(1).cpu()
+            with DECODE_WINDOW_SECONDS.time(decoder="vocoder"), tracer.span("vocoder_window"):
+                wav_ch1 = self.vocoder.decode(mels[:,0,:,:]).squeeze(1).cpu()
+                wav_ch2 = self.vocoder.decode(mels[:,1,:,:]).squeeze(1).cpu()
             wav = torch.cat([wav_ch1, wav_ch2],dim=0)
 
             if sr is not None:
@@ -144,7 +156,7 @@ class MusicDCAE(ModelMixin, ConfigMixin, FromOriginalModelMixin):
         return sr, pred_wavs
 
     @torch.no_grad()
-    def decode_overlap(self, latents, audio_lengths=None, sr=None):
+    def decode_overlap(self, latents, audio_lengths=None, sr=None, cancel_check=None):
         """
         Decodes latents into waveforms using an overlapped DCAE and Vocoder.
         """
@@ -202,13 +214,15 @@ class MusicDCAE(ModelMixin, ConfigMixin, FromOriginalModelMixin):
                     dcae_anchors = [dcae_anchor_offset]
                 
                 for i, anchor in enumerate(dcae_anchors):
+                    raise_if_cancelled(cancel_check)
                     win_start_idx = max(0, anchor - dcae_anchor_offset)
                     win_end_idx = min(latent_len, win_start_idx + dcae_win_len_latent)
                     
                     dcae_input_segment = current_latent[:, :, :, win_start_idx:win_end_idx]
                     if dcae_input_segment.shape[3] == 0: continue
 
-                    mel_output_full = self.dcae.decoder(dcae_input_segment) # (1, C, H_mel, W_mel_fixed_from_dcae)
+                    with DECODE_WINDOW_SECONDS.time(decoder="dcae"), tracer.span("dcae_window"):
+                        mel_output_full = self.dcae.decoder(dcae_input_segment) # (1, C, H_mel, W_mel_fixed_from_dcae)
 
                     is_first = (i == 0)
                     is_last = (i == len(dcae_anchors) - 1)
@@ -264,7 +278,8 @@ class MusicDCAE(ModelMixin, ConfigMixin, FromOriginalModelMixin):
                     pad_len = vocoder_input_mel_frames_per_block - mel_block.shape[2]
                     mel_block = torch.nn.functional.pad(mel_block, (0, pad_len), mode='constant', value=0) # Pad last dim
                 
-                current_audio_output = self.vocoder.decode(mel_block) # (C_audio, 1, Samples)
+                with DECODE_WINDOW_SECONDS.time(decoder="vocoder"), tracer.span("vocoder_window"):
+                    current_audio_output = self.vocoder.decode(mel_block) # (C_audio, 1, Samples)
                 current_audio_output = current_audio_output[:, :, :-vocoder_overlap_len_audio] # Remove end overlap
 
                 # p_audio_samples tracks the start of the *next* audio segment to generate (in conceptual total audio samples)
@@ -278,6 +293,7 @@ class MusicDCAE(ModelMixin, ConfigMixin, FromOriginalModelMixin):
                 # pbar.update(1) # For initial window
                 # The loop for subsequent windows
                 while p_audio_samples < conceptual_total_audio_len_native_sr:
+                    raise_if_cancelled(cancel_check)
                     mel_frame_start = p_audio_samples // VOCODER_AUDIO_SAMPLES_PER_MEL_FRAME
                     mel_frame_end = mel_frame_start + vocoder_input_mel_frames_per_block
                     
@@ -292,7 +308,8 @@ class MusicDCAE(ModelMixin, ConfigMixin, FromOriginalModelMixin):
                         pad_len = vocoder_input_mel_frames_per_block - mel_block.shape[2]
                         mel_block = torch.nn.functional.pad(mel_block, (0, pad_len), mode='constant', value=0)
 
-                    new_audio_win = self.vocoder.decode(mel_block) # (C_audio, 1, Samples)
+                    with DECODE_WINDOW_SECONDS.time(decoder="vocoder"), tracer.span("vocoder_window"):
+                        new_audio_win = self.vocoder.decode(mel_block) # (C_audio, 1, Samples)
 
                     # Crossfade
                     # Determine actual crossfade length based on available audio
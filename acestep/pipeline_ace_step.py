@@ -13,11 +13,10 @@ import re
 import soundfile as sf
 
 import torch
+import torch.nn.functional as F
 from loguru import logger
 from tqdm import tqdm
-import json
 import math
-from huggingface_hub import snapshot_download
 
 # from diffusers.pipelines.pipeline_utils import DiffusionPipeline
 from acestep.schedulers.scheduling_flow_match_euler_discrete import (
@@ -32,14 +31,13 @@ from acestep.schedulers.scheduling_flow_match_pingpong import (
 from diffusers.pipelines.stable_diffusion_3.pipeline_stable_diffusion_3 import (
     retrieve_timesteps,
 )
+from diffusers import AutoencoderDC
 from diffusers.utils.torch_utils import randn_tensor
-from diffusers.utils.peft_utils import set_weights_and_activate_adapters
 from transformers import UMT5EncoderModel, AutoTokenizer
 
-from acestep.language_segmentation import LangSegment, language_filters
 from acestep.music_dcae.music_dcae_pipeline import MusicDCAE
+from acestep.music_dcae.music_vocoder import ADaMoSHiFiGANV1
 from acestep.models.ace_step_transformer import ACEStepTransformer2DModel
-from acestep.models.lyrics_utils.lyric_tokenizer import VoiceBpeTokenizer
 from acestep.apg_guidance import (
     apg_forward,
     MomentumBuffer,
@@ -47,8 +45,13 @@ from acestep.apg_guidance import (
     cfg_zero_star,
     cfg_double_condition_forward,
 )
-import torchaudio
 from .cpu_offload import cpu_offload
+from .cancellation import raise_if_cancelled
+from .instrumentation import record_pipeline_run
+from .tracing import current as current_span, traced, tracer
+from .metadata_store import save_output_metadata
+from .model_loading import load_components, load_pretrained, load_shared, share_weights
+from .conditioning_cache import conditioning_cache, conditioning_key, startup_inputs
 
 
 torch.backends.cudnn.benchmark = False
@@ -58,6 +61,20 @@ torch.backends.cuda.matmul.allow_tf32 = True
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 
+def load_lyric_frontend():
+    """
+    Language segmenter and lyric tokenizer. Imported here rather than at module
+    level: they pull in spacy, pypinyin, num2words and friends, which only a
+    loaded pipeline needs.
+    """
+    from acestep.language_segmentation import LangSegment, language_filters
+    from acestep.models.lyrics_utils.lyric_tokenizer import VoiceBpeTokenizer
+
+    lang_segment = LangSegment()
+    lang_segment.setfilters(language_filters.default)
+    return lang_segment, VoiceBpeTokenizer()
+
+
 SUPPORT_LANGUAGES = {
     "en": 259,
     "de": 260,
@@ -112,6 +129,7 @@ class ACEStepPipeline:
         cpu_offload=False,
         quantized=False,
         overlapped_decode=False,
+        batched_guidance=False,
         **kwargs,
     ):
         if not checkpoint_dir:
@@ -143,10 +161,13 @@ class ACEStepPipeline:
             self.dtype = getattr(torch, os.environ['ACE_PIPELINE_DTYPE'])
         self.device = device
         self.loaded = False
+        # per-component load time and peak RSS of the last load_checkpoint
+        self.load_report = None
         self.torch_compile = torch_compile
         self.cpu_offload = cpu_offload
         self.quantized = quantized
         self.overlapped_decode = overlapped_decode
+        self.batched_guidance = batched_guidance
 
     def cleanup_memory(self):
         """Clean up GPU and CPU memory to prevent VRAM overflow during multiple generations."""
@@ -180,6 +201,8 @@ class ACEStepPipeline:
                 checkpoint_dir_models = checkpoint_dir
         
         if checkpoint_dir_models is None:
+            from huggingface_hub import snapshot_download
+
             if checkpoint_dir is None:
                 logger.info(f"Download models from Hugging Face: {repo}")
                 checkpoint_dir_models = snapshot_download(repo)
@@ -188,31 +211,46 @@ class ACEStepPipeline:
                 checkpoint_dir_models = snapshot_download(repo, cache_dir=checkpoint_dir)
         return checkpoint_dir_models
 
-    def load_checkpoint(self, checkpoint_dir=None, export_quantized_weights=False):
+    def load_checkpoint(self, checkpoint_dir=None, export_quantized_weights=False, shared_weights=None):
         checkpoint_dir = self.get_checkpoint_path(checkpoint_dir, REPO_ID)
         dcae_checkpoint_path = os.path.join(checkpoint_dir, "music_dcae_f8c8")
         vocoder_checkpoint_path = os.path.join(checkpoint_dir, "music_vocoder")
         ace_step_checkpoint_path = os.path.join(checkpoint_dir, "ace_step_transformer")
         text_encoder_checkpoint_path = os.path.join(checkpoint_dir, "umt5-base")
 
-        self.ace_step_transformer = ACEStepTransformer2DModel.from_pretrained(
-            ace_step_checkpoint_path, torch_dtype=self.dtype
+        # The components load side by side, each read from memory-mapped safetensors
+        # straight into its dtype and device (acestep/model_loading.py).
+        # ACE_LOAD_WORKERS=1 loads them one after another. With `shared_weights`
+        # (another process's `share_weights()`) only the configs are read.
+        device = torch.device("cpu") if self.cpu_offload else self.device
+
+        def load(name, model_class, path):
+            if shared_weights is not None:
+                return lambda: load_shared(model_class, path, shared_weights[name])
+            return lambda: load_pretrained(model_class, path, dtype=self.dtype, device=device)
+
+        components, self.load_report = load_components(
+            {
+                "ace_step_transformer": load("ace_step_transformer", ACEStepTransformer2DModel, ace_step_checkpoint_path),
+                "dcae": load("dcae", AutoencoderDC, dcae_checkpoint_path),
+                "vocoder": load("vocoder", ADaMoSHiFiGANV1, vocoder_checkpoint_path),
+                "text_encoder": load("text_encoder", UMT5EncoderModel, text_encoder_checkpoint_path),
+                "text_tokenizer": lambda: AutoTokenizer.from_pretrained(text_encoder_checkpoint_path),
+                "lyric_frontend": load_lyric_frontend,
+            },
+            max_workers=int(os.getenv("ACE_LOAD_WORKERS", 4)),
         )
-        # self.ace_step_transformer.to(self.device).eval().to(self.dtype)
-        if self.cpu_offload:
-            self.ace_step_transformer = (
-                self.ace_step_transformer.to("cpu").eval().to(self.dtype)
-            )
-        else:
-            self.ace_step_transformer = (
-                self.ace_step_transformer.to(self.device).eval().to(self.dtype)
-            )
+
+        self.ace_step_transformer = components["ace_step_transformer"]
         if self.torch_compile:
             self.ace_step_transformer = torch.compile(self.ace_step_transformer)
 
+        # moves only the resampler; the dcae and vocoder are already in place
         self.music_dcae = MusicDCAE(
             dcae_checkpoint_path=dcae_checkpoint_path,
             vocoder_checkpoint_path=vocoder_checkpoint_path,
+            dcae=components["dcae"],
+            vocoder=components["vocoder"],
         )
         # self.music_dcae.to(self.device).eval().to(self.dtype)
         if self.cpu_offload:  # might be redundant
@@ -222,27 +260,15 @@ class ACEStepPipeline:
         if self.torch_compile:
             self.music_dcae = torch.compile(self.music_dcae)
 
-        lang_segment = LangSegment()
-        lang_segment.setfilters(language_filters.default)
-        self.lang_segment = lang_segment
-        self.lyric_tokenizer = VoiceBpeTokenizer()
+        self.lang_segment, self.lyric_tokenizer = components["lyric_frontend"]
 
-        text_encoder_model = UMT5EncoderModel.from_pretrained(
-            text_encoder_checkpoint_path, torch_dtype=self.dtype
-        ).eval()
-        # text_encoder_model = text_encoder_model.to(self.device).to(self.dtype)
-        if self.cpu_offload:
-            text_encoder_model = text_encoder_model.to("cpu").eval().to(self.dtype)
-        else:
-            text_encoder_model = text_encoder_model.to(self.device).eval().to(self.dtype)
+        text_encoder_model = components["text_encoder"]
         text_encoder_model.requires_grad_(False)
         self.text_encoder_model = text_encoder_model
         if self.torch_compile:
             self.text_encoder_model = torch.compile(self.text_encoder_model)
 
-        self.text_tokenizer = AutoTokenizer.from_pretrained(
-            text_encoder_checkpoint_path
-        )
+        self.text_tokenizer = components["text_tokenizer"]
         self.loaded = True
 
         # compile
@@ -286,6 +312,18 @@ class ACEStepPipeline:
                     os.path.join(text_encoder_checkpoint_path, "pytorch_model_int4wo.bin"),
                 )
 
+    def share_weights(self):
+        """
+        Moves the loaded weights into shared memory. Returns what `load_checkpoint`
+        takes as `shared_weights` in another process (CPU weights only).
+        """
+        return {
+            "ace_step_transformer": share_weights(self.ace_step_transformer),
+            "dcae": share_weights(self.music_dcae.dcae),
+            "vocoder": share_weights(self.music_dcae.vocoder),
+            "text_encoder": share_weights(self.text_encoder_model),
+        }
+
     def load_quantized_checkpoint(self, checkpoint_dir=None):
         checkpoint_dir = self.get_checkpoint_path(checkpoint_dir, REPO_ID_QUANT)
         dcae_checkpoint_path = os.path.join(checkpoint_dir, "music_dcae_f8c8")
@@ -329,15 +367,21 @@ class ACEStepPipeline:
             text_encoder_checkpoint_path
         )
 
-        lang_segment = LangSegment()
-        lang_segment.setfilters(language_filters.default)
-        self.lang_segment = lang_segment
-        self.lyric_tokenizer = VoiceBpeTokenizer()
+        self.lang_segment, self.lyric_tokenizer = load_lyric_frontend()
 
         self.loaded = True
 
-    @cpu_offload("text_encoder_model")
+    @traced()
     def get_text_embeddings(self, texts, text_max_length=256):
+        # UMT5 only runs on a cache miss (acestep/conditioning_cache.py)
+        return conditioning_cache.get_or_compute(
+            "text",
+            self.conditioning_key("text", texts, text_max_length),
+            lambda: self._encode_texts(texts, text_max_length),
+        )
+
+    @cpu_offload("text_encoder_model")
+    def _encode_texts(self, texts, text_max_length=256):
         inputs = self.text_tokenizer(
             texts,
             return_tensors="pt",
@@ -354,9 +398,19 @@ class ACEStepPipeline:
         attention_mask = inputs["attention_mask"]
         return last_hidden_states, attention_mask
 
-    @cpu_offload("text_encoder_model")
+    @traced()
     def get_text_embeddings_null(
         self, texts, text_max_length=256, tau=0.01, l_min=8, l_max=10
+    ):
+        return conditioning_cache.get_or_compute(
+            "text_null",
+            self.conditioning_key("text_null", texts, text_max_length, tau, l_min, l_max),
+            lambda: self._encode_texts_null(texts, text_max_length, tau, l_min, l_max),
+        )
+
+    @cpu_offload("text_encoder_model")
+    def _encode_texts_null(
+        self, texts, text_max_length=256, tau=0.01, l_min=8, l_max=10
     ):
         inputs = self.text_tokenizer(
             texts,
@@ -396,6 +450,218 @@ class ACEStepPipeline:
         last_hidden_states = forward_with_temperature(inputs, tau, l_min, l_max)
         return last_hidden_states
 
+    def conditioning_key(self, kind, *inputs):
+        """Cache key of conditioning `kind` computed from `inputs` by this model."""
+        model = [self.checkpoint_dir, self.quantized, str(self.dtype), str(self.device)]
+        if not kind.startswith("text"):
+            # adapters do not touch the text encoder
+            model += [self.lora_path, self.lora_weight]
+        return conditioning_key(kind, model, inputs)
+
+    @staticmethod
+    def conditioning_source(prompts, lyrics, batch_size, use_erg_tag):
+        """What `encode_conditioning`'s inputs were computed from; its cache key."""
+        return {"prompts": list(prompts), "lyrics": lyrics or "", "batch_size": batch_size, "erg_tag": use_erg_tag}
+
+    def lyric_inputs(self, lyrics, batch_size=1, debug=False):
+        """Token ids and mask of one lyrics text repeated `batch_size` times (a single 0 without lyrics)."""
+        if not lyrics:
+            lyric_token_idx = torch.tensor([0]).repeat(batch_size, 1).to(self.device).long()
+            lyric_mask = torch.tensor([0]).repeat(batch_size, 1).to(self.device).long()
+            return lyric_token_idx, lyric_mask
+        lyric_token_idx = self.tokenize_lyrics(lyrics, debug=debug)
+        lyric_mask = [1] * len(lyric_token_idx)
+        lyric_token_idx = torch.tensor(lyric_token_idx).unsqueeze(0).to(self.device).repeat(batch_size, 1)
+        lyric_mask = torch.tensor(lyric_mask).unsqueeze(0).to(self.device).repeat(batch_size, 1)
+        return lyric_token_idx, lyric_mask
+
+    def encode_conditioning(
+        self,
+        encoder_text_hidden_states,
+        text_attention_mask,
+        speaker_embds,
+        lyric_token_ids,
+        lyric_mask,
+        encoder_text_hidden_states_null=None,
+        use_erg_lyric=False,
+        with_null=True,
+        with_no_lyric=False,
+        source=None,
+    ):
+        """
+        Runs the condition encoder for the conditional and guidance branches.
+        Returns (encoder_hidden_states, encoder_hidden_mask, encoder_hidden_states_null,
+        encoder_hidden_states_no_lyric); the last two are None unless requested.
+        With `source` (see `conditioning_source`) the outputs are cached across requests.
+        """
+
+        def cached(kind, compute):
+            if source is None:
+                return compute()
+            return conditioning_cache.get_or_compute(kind, self.conditioning_key(kind, source), compute)
+
+        # P(speaker, text, lyric)
+        encoder_hidden_states, encoder_hidden_mask = cached(
+            "encoder",
+            lambda: self.ace_step_transformer.encode(
+                encoder_text_hidden_states,
+                text_attention_mask,
+                speaker_embds,
+                lyric_token_ids,
+                lyric_mask,
+            ),
+        )
+
+        encoder_hidden_states_null = None
+        if with_null and use_erg_lyric:
+            # P(null_speaker, text_weaker, lyric_weaker)
+            encoder_hidden_states_null = cached(
+                "encoder_null_erg",
+                lambda: self.forward_encoder_with_temperature(
+                    inputs={
+                        "encoder_text_hidden_states": (
+                            encoder_text_hidden_states_null
+                            if encoder_text_hidden_states_null is not None
+                            else torch.zeros_like(encoder_text_hidden_states)
+                        ),
+                        "text_attention_mask": text_attention_mask,
+                        "speaker_embeds": torch.zeros_like(speaker_embds),
+                        "lyric_token_idx": lyric_token_ids,
+                        "lyric_mask": lyric_mask,
+                    },
+                ),
+            )
+        elif with_null:
+            # P(null_speaker, null_text, null_lyric)
+            encoder_hidden_states_null, _ = cached(
+                "encoder_null",
+                lambda: self.ace_step_transformer.encode(
+                    torch.zeros_like(encoder_text_hidden_states),
+                    text_attention_mask,
+                    torch.zeros_like(speaker_embds),
+                    torch.zeros_like(lyric_token_ids),
+                    lyric_mask,
+                ),
+            )
+
+        encoder_hidden_states_no_lyric = None
+        if with_no_lyric and use_erg_lyric:
+            # P(null_speaker, text, lyric_weaker)
+            encoder_hidden_states_no_lyric = cached(
+                "encoder_no_lyric_erg",
+                lambda: self.forward_encoder_with_temperature(
+                    inputs={
+                        "encoder_text_hidden_states": encoder_text_hidden_states,
+                        "text_attention_mask": text_attention_mask,
+                        "speaker_embeds": torch.zeros_like(speaker_embds),
+                        "lyric_token_idx": lyric_token_ids,
+                        "lyric_mask": lyric_mask,
+                    },
+                ),
+            )
+        elif with_no_lyric:
+            # P(null_speaker, text, no_lyric)
+            encoder_hidden_states_no_lyric, _ = cached(
+                "encoder_no_lyric",
+                lambda: self.ace_step_transformer.encode(
+                    encoder_text_hidden_states,
+                    text_attention_mask,
+                    torch.zeros_like(speaker_embds),
+                    torch.zeros_like(lyric_token_ids),
+                    lyric_mask,
+                ),
+            )
+
+        return encoder_hidden_states, encoder_hidden_mask, encoder_hidden_states_null, encoder_hidden_states_no_lyric
+
+    def encode_conditioning_per_sample(
+        self,
+        encoder_text_hidden_states,
+        text_attention_mask,
+        speaker_embds,
+        lyric_token_ids,
+        lyric_mask,
+        encoder_text_hidden_states_null=None,
+        sources=None,
+        **kwargs,
+    ):
+        """
+        `encode_conditioning` for a batch of independent requests (one `source` each).
+        Every sample is encoded at its own text and lyric length, as in a single-sample
+        call, and the outputs are right-padded: padding between the text and the lyric
+        tokens would shift the positions the cross-attention's rotary embedding sees.
+        """
+        outputs = []
+        for i in range(encoder_text_hidden_states.shape[0]):
+            text_length = max(int(text_attention_mask[i].sum()), 1)
+            lyric_length = max(int(lyric_mask[i].sum()), 1)
+            outputs.append(
+                self.encode_conditioning(
+                    encoder_text_hidden_states[i : i + 1, :text_length],
+                    text_attention_mask[i : i + 1, :text_length],
+                    speaker_embds[i : i + 1],
+                    lyric_token_ids[i : i + 1, :lyric_length],
+                    lyric_mask[i : i + 1, :lyric_length],
+                    encoder_text_hidden_states_null=(
+                        encoder_text_hidden_states_null[i : i + 1, :text_length]
+                        if encoder_text_hidden_states_null is not None
+                        else None
+                    ),
+                    source=sources[i] if sources is not None else None,
+                    **kwargs,
+                )
+            )
+        seq_length = max(output[0].shape[1] for output in outputs)
+
+        def right_padded(tensors):
+            if tensors[0] is None:
+                return None
+            return torch.cat(
+                [
+                    F.pad(tensor, (0, 0) * (tensor.dim() - 2) + (0, seq_length - tensor.shape[1]))
+                    for tensor in tensors
+                ]
+            )
+
+        return tuple(right_padded([output[k] for output in outputs]) for k in range(4))
+
+    def warm_conditioning_cache(self, inputs=None):
+        """
+        Computes the conditioning of single-sample requests for `inputs` (dicts with a
+        'prompt' and optionally 'lyrics', 'use_erg_tag', 'use_erg_lyric'; default:
+        `startup_inputs()`) so that their first requests hit the cache. Inputs
+        without lyrics only warm the text embeddings.
+        """
+        if not conditioning_cache.enabled:
+            return
+        inputs = startup_inputs() if inputs is None else inputs
+        start_time = time.time()
+        for params in inputs:
+            try:
+                texts = [params["prompt"]]
+                use_erg_tag = params.get("use_erg_tag", True)
+                encoder_text_hidden_states, text_attention_mask = self.get_text_embeddings(texts)
+                encoder_text_hidden_states_null = self.get_text_embeddings_null(texts) if use_erg_tag else None
+                if "lyrics" not in params:
+                    continue
+                lyric_token_idx, lyric_mask = self.lyric_inputs(params["lyrics"])
+                self.encode_conditioning(
+                    encoder_text_hidden_states,
+                    text_attention_mask,
+                    torch.zeros(1, 512).to(self.device).to(self.dtype),
+                    lyric_token_idx,
+                    lyric_mask,
+                    encoder_text_hidden_states_null=encoder_text_hidden_states_null,
+                    use_erg_lyric=params.get("use_erg_lyric", True),
+                    source=self.conditioning_source(texts, params["lyrics"], 1, use_erg_tag),
+                )
+            except Exception as e:
+                logger.warning(f"Could not warm the conditioning of {params.get('prompt', '')[:50]!r}: {e}")
+        logger.info(
+            f"Warmed the conditioning cache with {len(inputs)} inputs in {time.time() - start_time:.2f}s "
+            f"({conditioning_cache.stats()['entries']} entries)"
+        )
+
     def set_seeds(self, batch_size, manual_seeds=None):
         processed_input_seeds = None
         if manual_seeds is not None:
@@ -453,46 +719,56 @@ class ACEStepPipeline:
                 lyric_token_idx += [2]
                 continue
 
-            lang = self.get_lang(line)
-
-            if lang not in SUPPORT_LANGUAGES:
-                lang = "en"
-            if "zh" in lang:
-                lang = "zh"
-            if "spa" in lang:
-                lang = "es"
-
-            try:
-                if structure_pattern.match(line):
-                    token_idx = self.lyric_tokenizer.encode(line, "en")
-                else:
-                    token_idx = self.lyric_tokenizer.encode(line, lang)
-                if debug:
-                    toks = self.lyric_tokenizer.batch_decode(
-                        [[tok_id] for tok_id in token_idx]
-                    )
-                    logger.info(f"debbug {line} --> {lang} --> {toks}")
-                lyric_token_idx = lyric_token_idx + token_idx + [2]
-            except Exception as e:
-                print("tokenize error", e, "for line", line, "major_language", lang)
+            with tracer.span("tokenize_lyrics", chars=len(line)) as span:
+                lang = self.get_lang(line)
+
+                if lang not in SUPPORT_LANGUAGES:
+                    lang = "en"
+                if "zh" in lang:
+                    lang = "zh"
+                if "spa" in lang:
+                    lang = "es"
+                if span is not None:
+                    span.set_attribute("lang", lang)
+
+                try:
+                    if structure_pattern.match(line):
+                        token_idx = self.lyric_tokenizer.encode(line, "en")
+                    else:
+                        token_idx = self.lyric_tokenizer.encode(line, lang)
+                    if debug:
+                        toks = self.lyric_tokenizer.batch_decode(
+                            [[tok_id] for tok_id in token_idx]
+                        )
+                        logger.info(f"debbug {line} --> {lang} --> {toks}")
+                    lyric_token_idx = lyric_token_idx + token_idx + [2]
+                except Exception as e:
+                    print("tokenize error", e, "for line", line, "major_language", lang)
         return lyric_token_idx
 
-    @cpu_offload("ace_step_transformer")
+    def tokenize_lyrics_batch(self, lyrics_list, debug=False):
+        """Tokenize one lyrics string per sample into right-padded `(lyric_token_idx, lyric_mask)` tensors."""
+        token_ids = [
+            self.tokenize_lyrics(lyrics, debug=debug) if lyrics and len(lyrics) > 0 else []
+            for lyrics in lyrics_list
+        ]
+        max_length = max([len(ids) for ids in token_ids] + [1])
+        lyric_token_idx = torch.zeros(len(token_ids), max_length, dtype=torch.long)
+        lyric_mask = torch.zeros(len(token_ids), max_length, dtype=torch.long)
+        for i, ids in enumerate(token_ids):
+            lyric_token_idx[i, : len(ids)] = torch.tensor(ids, dtype=torch.long)
+            lyric_mask[i, : len(ids)] = 1
+        return lyric_token_idx.to(self.device), lyric_mask.to(self.device)
+
     def calc_v(
         self,
         zt_src,
         zt_tar,
         t,
-        encoder_text_hidden_states,
-        text_attention_mask,
-        target_encoder_text_hidden_states,
-        target_text_attention_mask,
-        speaker_embds,
-        target_speaker_embeds,
-        lyric_token_ids,
-        lyric_mask,
-        target_lyric_token_ids,
-        target_lyric_mask,
+        encoder_hidden_states,
+        encoder_hidden_mask,
+        target_encoder_hidden_states,
+        target_encoder_hidden_mask,
         do_classifier_free_guidance=False,
         guidance_scale=1.0,
         target_guidance_scale=1.0,
@@ -501,6 +777,9 @@ class ACEStepPipeline:
         momentum_buffer=None,
         momentum_buffer_tar=None,
         return_src_pred=True,
+        cross_attention_cache=None,
+        target_cross_attention_cache=None,
+        timestep_embedding=None,
     ):
         noise_pred_src = None
         if return_src_pred:
@@ -509,15 +788,22 @@ class ACEStepPipeline:
             )
             timestep = t.expand(src_latent_model_input.shape[0])
             # source
-            noise_pred_src = self.ace_step_transformer(
+            noise_pred_src = self.ace_step_transformer.decode(
                 hidden_states=src_latent_model_input,
                 attention_mask=attention_mask,
-                encoder_text_hidden_states=encoder_text_hidden_states,
-                text_attention_mask=text_attention_mask,
-                speaker_embeds=speaker_embds,
-                lyric_token_idx=lyric_token_ids,
-                lyric_mask=lyric_mask,
+                encoder_hidden_states=encoder_hidden_states,
+                encoder_hidden_mask=encoder_hidden_mask,
+                output_length=src_latent_model_input.shape[-1],
                 timestep=timestep,
+                cross_attention_cache=cross_attention_cache,
+                timestep_embedding=(
+                    tuple(
+                        embedding.expand(src_latent_model_input.shape[0], -1)
+                        for embedding in timestep_embedding
+                    )
+                    if timestep_embedding is not None
+                    else None
+                ),
             ).sample
 
             if do_classifier_free_guidance:
@@ -543,15 +829,22 @@ class ACEStepPipeline:
         )
         timestep = t.expand(tar_latent_model_input.shape[0])
         # target
-        noise_pred_tar = self.ace_step_transformer(
+        noise_pred_tar = self.ace_step_transformer.decode(
             hidden_states=tar_latent_model_input,
             attention_mask=attention_mask,
-            encoder_text_hidden_states=target_encoder_text_hidden_states,
-            text_attention_mask=target_text_attention_mask,
-            speaker_embeds=target_speaker_embeds,
-            lyric_token_idx=target_lyric_token_ids,
-            lyric_mask=target_lyric_mask,
+            encoder_hidden_states=target_encoder_hidden_states,
+            encoder_hidden_mask=target_encoder_hidden_mask,
+            output_length=tar_latent_model_input.shape[-1],
             timestep=timestep,
+            cross_attention_cache=target_cross_attention_cache,
+            timestep_embedding=(
+                tuple(
+                    embedding.expand(tar_latent_model_input.shape[0], -1)
+                    for embedding in timestep_embedding
+                )
+                if timestep_embedding is not None
+                else None
+            ),
         ).sample
 
         if do_classifier_free_guidance:
@@ -571,6 +864,7 @@ class ACEStepPipeline:
                 )
         return noise_pred_src, noise_pred_tar
 
+    @cpu_offload("ace_step_transformer")
     @torch.no_grad()
     def flowedit_diffusion_process(
         self,
@@ -592,6 +886,7 @@ class ACEStepPipeline:
         n_max=1.0,
         n_avg=1,
         scheduler_type="euler",
+        cancel_check=None,
         progress=None,
     ):
 
@@ -657,9 +952,66 @@ class ACEStepPipeline:
                 [target_lyric_mask, torch.zeros_like(target_lyric_mask)], 0
             )
 
+        # source and target conditioning are fixed for the whole edit,
+        # so the speaker / genre / lyric encoders only run once
+        encoder_hidden_states, encoder_hidden_mask = self.ace_step_transformer.encode(
+            encoder_text_hidden_states,
+            text_attention_mask,
+            speaker_embds,
+            lyric_token_ids,
+            lyric_mask,
+        )
+        target_encoder_hidden_states, target_encoder_hidden_mask = (
+            self.ace_step_transformer.encode(
+                target_encoder_text_hidden_states,
+                target_text_attention_mask,
+                target_speaker_embeds,
+                target_lyric_token_ids,
+                target_lyric_mask,
+            )
+        )
+
+        def repeat_for_avg(x):
+            # [cfg * bsz, ...] -> [cfg * n_avg * bsz, ...], keeping cond / uncond halves contiguous
+            if n_avg == 1:
+                return x
+            branches = x.chunk(2) if do_classifier_free_guidance else (x,)
+            return torch.cat(
+                [branch.repeat(n_avg, *([1] * (branch.dim() - 1))) for branch in branches],
+                dim=0,
+            )
+
+        # the n_avg noise draws are evaluated as a single batch
+        avg_encoder_hidden_states = repeat_for_avg(encoder_hidden_states)
+        avg_encoder_hidden_mask = repeat_for_avg(encoder_hidden_mask)
+        avg_target_encoder_hidden_states = repeat_for_avg(target_encoder_hidden_states)
+        avg_target_encoder_hidden_mask = repeat_for_avg(target_encoder_hidden_mask)
+        avg_attention_mask = repeat_for_avg(attention_mask)
+
+        # cross-attention K/V and timestep embeddings are fixed for the whole edit
+        timestep_embeddings = self.ace_step_transformer.precompute_timestep_embeddings(
+            timesteps, self.dtype
+        )
+        build_cross_attention_cache = self.ace_step_transformer.build_cross_attention_cache
+        avg_cross_attention_cache = build_cross_attention_cache(
+            avg_encoder_hidden_states, avg_encoder_hidden_mask, avg_attention_mask
+        )
+        avg_target_cross_attention_cache = build_cross_attention_cache(
+            avg_target_encoder_hidden_states,
+            avg_target_encoder_hidden_mask,
+            avg_attention_mask,
+        )
+        # only needed once regular sampling takes over after n_max
+        target_cross_attention_cache = (
+            avg_target_cross_attention_cache if n_avg == 1 else None
+        )
+
+        # batched draws keep their own APG momentum (running one draw after another
+        # shared it); with momentum off both agree (tests/test_flowedit.py)
         momentum_buffer = MomentumBuffer()
         momentum_buffer_tar = MomentumBuffer()
         x_src = src_latents
+        x_src_avg = x_src.repeat(n_avg, 1, 1, 1)
         zt_edit = x_src.clone()
         xt_tar = None
         n_min = int(infer_steps * n_min)
@@ -668,11 +1020,13 @@ class ACEStepPipeline:
         logger.info("flowedit start from {} to {}".format(n_min, n_max))
 
         for i, t in tqdm(enumerate(timesteps), total=T_steps):
+            raise_if_cancelled(cancel_check)
             if progress:
                 progress((i + 1) / T_steps, desc="Generating...")
 
             if i < n_min:
                 continue
+            step_start = time.time()
 
             t_i = t / 1000
 
@@ -683,40 +1037,43 @@ class ACEStepPipeline:
 
             if i < n_max:
                 # Calculate the average of the V predictions
-                V_delta_avg = torch.zeros_like(x_src)
-                for k in range(n_avg):
-                    fwd_noise = randn_tensor(
-                        shape=x_src.shape,
-                        generator=random_generators,
-                        device=self.device,
-                        dtype=self.dtype,
-                    )
+                fwd_noise = torch.cat(
+                    [
+                        randn_tensor(
+                            shape=x_src.shape,
+                            generator=random_generators,
+                            device=self.device,
+                            dtype=self.dtype,
+                        )
+                        for _ in range(n_avg)
+                    ],
+                    dim=0,
+                )
 
-                    zt_src = (1 - t_i) * x_src + (t_i) * fwd_noise
-
-                    zt_tar = zt_edit + zt_src - x_src
-
-                    Vt_src, Vt_tar = self.calc_v(
-                        zt_src=zt_src,
-                        zt_tar=zt_tar,
-                        t=t,
-                        encoder_text_hidden_states=encoder_text_hidden_states,
-                        text_attention_mask=text_attention_mask,
-                        target_encoder_text_hidden_states=target_encoder_text_hidden_states,
-                        target_text_attention_mask=target_text_attention_mask,
-                        speaker_embds=speaker_embds,
-                        target_speaker_embeds=target_speaker_embeds,
-                        lyric_token_ids=lyric_token_ids,
-                        lyric_mask=lyric_mask,
-                        target_lyric_token_ids=target_lyric_token_ids,
-                        target_lyric_mask=target_lyric_mask,
-                        do_classifier_free_guidance=do_classifier_free_guidance,
-                        guidance_scale=guidance_scale,
-                        target_guidance_scale=target_guidance_scale,
-                        attention_mask=attention_mask,
-                        momentum_buffer=momentum_buffer,
-                    )
-                    V_delta_avg += (1 / n_avg) * (Vt_tar - Vt_src)  # - (hfg - 1) * (x_src)
+                zt_src = (1 - t_i) * x_src_avg + (t_i) * fwd_noise
+
+                zt_tar = zt_edit.repeat(n_avg, 1, 1, 1) + zt_src - x_src_avg
+
+                Vt_src, Vt_tar = self.calc_v(
+                    zt_src=zt_src,
+                    zt_tar=zt_tar,
+                    t=t,
+                    encoder_hidden_states=avg_encoder_hidden_states,
+                    encoder_hidden_mask=avg_encoder_hidden_mask,
+                    target_encoder_hidden_states=avg_target_encoder_hidden_states,
+                    target_encoder_hidden_mask=avg_target_encoder_hidden_mask,
+                    do_classifier_free_guidance=do_classifier_free_guidance,
+                    guidance_scale=guidance_scale,
+                    target_guidance_scale=target_guidance_scale,
+                    attention_mask=avg_attention_mask,
+                    momentum_buffer=momentum_buffer,
+                    cross_attention_cache=avg_cross_attention_cache,
+                    target_cross_attention_cache=avg_target_cross_attention_cache,
+                    timestep_embedding=tuple(
+                        embedding[i : i + 1] for embedding in timestep_embeddings
+                    ),
+                )
+                V_delta_avg = (Vt_tar - Vt_src).view(n_avg, *x_src.shape).mean(dim=0)  # - (hfg - 1) * (x_src)
 
                 zt_edit = zt_edit.to(torch.float32)  # arbitrary, should be settable for compatibility
                 if scheduler_type != "pingpong":
@@ -742,26 +1099,31 @@ class ACEStepPipeline:
                     xt_src = sigma * fwd_noise + (1.0 - sigma) * x_src
                     xt_tar = zt_edit + xt_src - x_src
 
+                if target_cross_attention_cache is None:
+                    target_cross_attention_cache = build_cross_attention_cache(
+                        target_encoder_hidden_states,
+                        target_encoder_hidden_mask,
+                        attention_mask,
+                    )
+
                 _, Vt_tar = self.calc_v(
                     zt_src=None,
                     zt_tar=xt_tar,
                     t=t,
-                    encoder_text_hidden_states=encoder_text_hidden_states,
-                    text_attention_mask=text_attention_mask,
-                    target_encoder_text_hidden_states=target_encoder_text_hidden_states,
-                    target_text_attention_mask=target_text_attention_mask,
-                    speaker_embds=speaker_embds,
-                    target_speaker_embeds=target_speaker_embeds,
-                    lyric_token_ids=lyric_token_ids,
-                    lyric_mask=lyric_mask,
-                    target_lyric_token_ids=target_lyric_token_ids,
-                    target_lyric_mask=target_lyric_mask,
+                    encoder_hidden_states=encoder_hidden_states,
+                    encoder_hidden_mask=encoder_hidden_mask,
+                    target_encoder_hidden_states=target_encoder_hidden_states,
+                    target_encoder_hidden_mask=target_encoder_hidden_mask,
                     do_classifier_free_guidance=do_classifier_free_guidance,
                     guidance_scale=guidance_scale,
                     target_guidance_scale=target_guidance_scale,
                     attention_mask=attention_mask,
                     momentum_buffer_tar=momentum_buffer_tar,
                     return_src_pred=False,
+                    target_cross_attention_cache=target_cross_attention_cache,
+                    timestep_embedding=tuple(
+                        embedding[i : i + 1] for embedding in timestep_embeddings
+                    ),
                 )
 
                 xt_tar = xt_tar.to(torch.float32)
@@ -774,6 +1136,7 @@ class ACEStepPipeline:
                     noise = torch.empty_like(zt_edit).normal_(generator=random_generators[0] if random_generators else None)
                     prev_sample = (1 - t_im1) * prev_sample + t_im1 * noise
                     xt_tar = prev_sample
+            tracer.record("diffusion_step", current_span(), step_start, time.time(), step=i)
 
         target_latents = zt_edit if xt_tar is None else xt_tar
         return target_latents
@@ -818,6 +1181,63 @@ class ACEStepPipeline:
         logger.info(f"{scheduler.sigma_min=} {scheduler.sigma_max=} {timesteps=} {num_inference_steps=}")
         return noisy_image, timesteps, scheduler, num_inference_steps
 
+    def forward_encoder_with_temperature(self, inputs, tau=0.01, l_min=4, l_max=6):
+        handlers = []
+
+        def hook(module, input, output):
+            output[:] *= tau
+            return output
+
+        for i in range(l_min, l_max):
+            handler = self.ace_step_transformer.lyric_encoder.encoders[
+                i
+            ].self_attn.linear_q.register_forward_hook(hook)
+            handlers.append(handler)
+
+        encoder_hidden_states, encoder_hidden_mask = (
+            self.ace_step_transformer.encode(**inputs)
+        )
+
+        for hook in handlers:
+            hook.remove()
+
+        return encoder_hidden_states
+
+    def forward_diffusion_with_temperature(
+        self,
+        hidden_states,
+        timestep,
+        inputs,
+        tau=0.01,
+        l_min=15,
+        l_max=20,
+        batch_slice=slice(None),
+    ):
+        handlers = []
+
+        def hook(module, input, output):
+            output[batch_slice] *= tau
+            return output
+
+        for i in range(l_min, l_max):
+            handler = self.ace_step_transformer.transformer_blocks[
+                i
+            ].attn.to_q.register_forward_hook(hook)
+            handlers.append(handler)
+            handler = self.ace_step_transformer.transformer_blocks[
+                i
+            ].cross_attn.to_q.register_forward_hook(hook)
+            handlers.append(handler)
+
+        sample = self.ace_step_transformer.decode(
+            hidden_states=hidden_states, timestep=timestep, **inputs
+        ).sample
+
+        for hook in handlers:
+            hook.remove()
+
+        return sample
+
     @cpu_offload("ace_step_transformer")
     @torch.no_grad()
     def text2music_diffusion_process(
@@ -854,7 +1274,9 @@ class ACEStepPipeline:
         audio2audio_enable=False,
         ref_audio_strength=0.5,
         ref_latents=None,
+        cancel_check=None,
         progress=None,
+        conditioning_source=None,
     ):
 
         logger.info(
@@ -1088,118 +1510,91 @@ class ACEStepPipeline:
 
         momentum_buffer = MomentumBuffer()
 
-        def forward_encoder_with_temperature(self, inputs, tau=0.01, l_min=4, l_max=6):
-            handlers = []
-
-            def hook(module, input, output):
-                output[:] *= tau
-                return output
-
-            for i in range(l_min, l_max):
-                handler = self.ace_step_transformer.lyric_encoder.encoders[
-                    i
-                ].self_attn.linear_q.register_forward_hook(hook)
-                handlers.append(handler)
-
-            encoder_hidden_states, encoder_hidden_mask = (
-                self.ace_step_transformer.encode(**inputs)
-            )
-
-            for hook in handlers:
-                hook.remove()
-
-            return encoder_hidden_states
-
-        # P(speaker, text, lyric)
-        encoder_hidden_states, encoder_hidden_mask = self.ace_step_transformer.encode(
+        # a list holds one conditioning source per independent request
+        per_sample = isinstance(conditioning_source, list)
+        (
+            encoder_hidden_states,
+            encoder_hidden_mask,
+            encoder_hidden_states_null,
+            encoder_hidden_states_no_lyric,
+        ) = (self.encode_conditioning_per_sample if per_sample else self.encode_conditioning)(
             encoder_text_hidden_states,
             text_attention_mask,
             speaker_embds,
             lyric_token_ids,
             lyric_mask,
+            encoder_text_hidden_states_null=encoder_text_hidden_states_null,
+            use_erg_lyric=use_erg_lyric,
+            with_no_lyric=do_double_condition_guidance,
+            **({"sources": conditioning_source} if per_sample else {"source": conditioning_source}),
         )
 
-        if use_erg_lyric:
-            # P(null_speaker, text_weaker, lyric_weaker)
-            encoder_hidden_states_null = forward_encoder_with_temperature(
-                self,
-                inputs={
-                    "encoder_text_hidden_states": (
-                        encoder_text_hidden_states_null
-                        if encoder_text_hidden_states_null is not None
-                        else torch.zeros_like(encoder_text_hidden_states)
-                    ),
-                    "text_attention_mask": text_attention_mask,
-                    "speaker_embeds": torch.zeros_like(speaker_embds),
-                    "lyric_token_idx": lyric_token_ids,
-                    "lyric_mask": lyric_mask,
-                },
+        # batched guidance: stack cond / text-only / uncond on the batch axis
+        # so that every guided step runs a single decode call
+        if self.batched_guidance and do_classifier_free_guidance:
+            guidance_branches = [encoder_hidden_states]
+            if (
+                do_double_condition_guidance
+                and encoder_hidden_states_no_lyric is not None
+            ):
+                guidance_branches.append(encoder_hidden_states_no_lyric)
+            guidance_branches.append(encoder_hidden_states_null)
+            num_guidance_branches = len(guidance_branches)
+            guidance_encoder_hidden_states = torch.cat(guidance_branches, dim=0)
+            guidance_encoder_hidden_mask = encoder_hidden_mask.repeat(
+                num_guidance_branches, 1
             )
-        else:
-            # P(null_speaker, null_text, null_lyric)
-            encoder_hidden_states_null, _ = self.ace_step_transformer.encode(
-                torch.zeros_like(encoder_text_hidden_states),
-                text_attention_mask,
-                torch.zeros_like(speaker_embds),
-                torch.zeros_like(lyric_token_ids),
-                lyric_mask,
+            guidance_attention_mask = attention_mask.repeat(num_guidance_branches, 1)
+            # the unconditional branch is always the last slice
+            uncond_slice = slice(
+                (num_guidance_branches - 1) * bsz, num_guidance_branches * bsz
             )
+            logger.info(f"batched guidance with {num_guidance_branches} branches")
 
-        encoder_hidden_states_no_lyric = None
-        if do_double_condition_guidance:
-            # P(null_speaker, text, lyric_weaker)
-            if use_erg_lyric:
-                encoder_hidden_states_no_lyric = forward_encoder_with_temperature(
-                    self,
-                    inputs={
-                        "encoder_text_hidden_states": encoder_text_hidden_states,
-                        "text_attention_mask": text_attention_mask,
-                        "speaker_embeds": torch.zeros_like(speaker_embds),
-                        "lyric_token_idx": lyric_token_ids,
-                        "lyric_mask": lyric_mask,
-                    },
-                )
-            # P(null_speaker, text, no_lyric)
-            else:
-                encoder_hidden_states_no_lyric, _ = self.ace_step_transformer.encode(
-                    encoder_text_hidden_states,
-                    text_attention_mask,
-                    torch.zeros_like(speaker_embds),
-                    torch.zeros_like(lyric_token_ids),
-                    lyric_mask,
-                )
-
-        def forward_diffusion_with_temperature(
-            self, hidden_states, timestep, inputs, tau=0.01, l_min=15, l_max=20
-        ):
-            handlers = []
-
-            def hook(module, input, output):
-                output[:] *= tau
-                return output
-
-            for i in range(l_min, l_max):
-                handler = self.ace_step_transformer.transformer_blocks[
-                    i
-                ].attn.to_q.register_forward_hook(hook)
-                handlers.append(handler)
-                handler = self.ace_step_transformer.transformer_blocks[
-                    i
-                ].cross_attn.to_q.register_forward_hook(hook)
-                handlers.append(handler)
-
-            sample = self.ace_step_transformer.decode(
-                hidden_states=hidden_states, timestep=timestep, **inputs
-            ).sample
+        # the timestep schedule and every conditioning branch are fixed for the
+        # whole loop, so embed the timesteps and build the cross-attention K/V once
+        timestep_embeddings = self.ace_step_transformer.precompute_timestep_embeddings(
+            timesteps, self.dtype
+        )
 
-            for hook in handlers:
-                hook.remove()
+        def step_timestep_embedding(step_idx, batch_size):
+            return tuple(
+                embedding[step_idx : step_idx + 1].expand(batch_size, -1)
+                for embedding in timestep_embeddings
+            )
 
-            return sample
+        cross_attention_cache = self.ace_step_transformer.build_cross_attention_cache(
+            encoder_hidden_states, encoder_hidden_mask, attention_mask
+        )
+        if do_classifier_free_guidance and self.batched_guidance:
+            guidance_cross_attention_cache = (
+                self.ace_step_transformer.build_cross_attention_cache(
+                    guidance_encoder_hidden_states,
+                    guidance_encoder_hidden_mask,
+                    guidance_attention_mask,
+                )
+            )
+        elif do_classifier_free_guidance:
+            cross_attention_cache_null = (
+                self.ace_step_transformer.build_cross_attention_cache(
+                    encoder_hidden_states_null, encoder_hidden_mask, attention_mask
+                )
+            )
+            cross_attention_cache_no_lyric = None
+            if encoder_hidden_states_no_lyric is not None:
+                cross_attention_cache_no_lyric = (
+                    self.ace_step_transformer.build_cross_attention_cache(
+                        encoder_hidden_states_no_lyric,
+                        encoder_hidden_mask,
+                        attention_mask,
+                    )
+                )
 
         for i, t in tqdm(enumerate(timesteps), total=num_inference_steps):
+            raise_if_cancelled(cancel_check)
             if progress:
                 progress((i + 1) / num_inference_steps, desc="Generating...")
+            step_start = time.time()
 
             if is_repaint:
                 if i < n_min:
@@ -1230,55 +1625,102 @@ class ACEStepPipeline:
                 else:
                     current_guidance_scale = guidance_scale
 
-                latent_model_input = latents
-                timestep = t.expand(latent_model_input.shape[0])
-                output_length = latent_model_input.shape[-1]
-                # P(x|speaker, text, lyric)
-                noise_pred_with_cond = self.ace_step_transformer.decode(
-                    hidden_states=latent_model_input,
-                    attention_mask=attention_mask,
-                    encoder_hidden_states=encoder_hidden_states,
-                    encoder_hidden_mask=encoder_hidden_mask,
-                    output_length=output_length,
-                    timestep=timestep,
-                ).sample
-
-                noise_pred_with_only_text_cond = None
-                if (
-                    do_double_condition_guidance
-                    and encoder_hidden_states_no_lyric is not None
-                ):
-                    noise_pred_with_only_text_cond = self.ace_step_transformer.decode(
-                        hidden_states=latent_model_input,
-                        attention_mask=attention_mask,
-                        encoder_hidden_states=encoder_hidden_states_no_lyric,
-                        encoder_hidden_mask=encoder_hidden_mask,
-                        output_length=output_length,
-                        timestep=timestep,
-                    ).sample
-
-                if use_erg_diffusion:
-                    noise_pred_uncond = forward_diffusion_with_temperature(
-                        self,
-                        hidden_states=latent_model_input,
-                        timestep=timestep,
-                        inputs={
-                            "encoder_hidden_states": encoder_hidden_states_null,
-                            "encoder_hidden_mask": encoder_hidden_mask,
-                            "output_length": output_length,
-                            "attention_mask": attention_mask,
-                        },
+                if self.batched_guidance:
+                    latent_model_input = torch.cat(
+                        [latents] * num_guidance_branches, dim=0
+                    )
+                    timestep = t.expand(latent_model_input.shape[0])
+                    output_length = latent_model_input.shape[-1]
+                    guidance_inputs = {
+                        "encoder_hidden_states": guidance_encoder_hidden_states,
+                        "encoder_hidden_mask": guidance_encoder_hidden_mask,
+                        "output_length": output_length,
+                        "attention_mask": guidance_attention_mask,
+                        "cross_attention_cache": guidance_cross_attention_cache,
+                        "timestep_embedding": step_timestep_embedding(
+                            i, latent_model_input.shape[0]
+                        ),
+                    }
+                    if use_erg_diffusion:
+                        # temperature only applies to the unconditional slice
+                        noise_pred_batched = self.forward_diffusion_with_temperature(
+                            hidden_states=latent_model_input,
+                            timestep=timestep,
+                            inputs=guidance_inputs,
+                            batch_slice=uncond_slice,
+                        )
+                    else:
+                        noise_pred_batched = self.ace_step_transformer.decode(
+                            hidden_states=latent_model_input,
+                            timestep=timestep,
+                            **guidance_inputs,
+                        ).sample
+                    noise_pred_branches = noise_pred_batched.chunk(num_guidance_branches)
+                    noise_pred_with_cond = noise_pred_branches[0]
+                    noise_pred_uncond = noise_pred_branches[-1]
+                    noise_pred_with_only_text_cond = (
+                        noise_pred_branches[1] if num_guidance_branches == 3 else None
                     )
                 else:
-                    noise_pred_uncond = self.ace_step_transformer.decode(
+                    latent_model_input = latents
+                    timestep = t.expand(latent_model_input.shape[0])
+                    output_length = latent_model_input.shape[-1]
+                    timestep_embedding = step_timestep_embedding(
+                        i, latent_model_input.shape[0]
+                    )
+                    # P(x|speaker, text, lyric)
+                    noise_pred_with_cond = self.ace_step_transformer.decode(
                         hidden_states=latent_model_input,
                         attention_mask=attention_mask,
-                        encoder_hidden_states=encoder_hidden_states_null,
+                        encoder_hidden_states=encoder_hidden_states,
                         encoder_hidden_mask=encoder_hidden_mask,
                         output_length=output_length,
                         timestep=timestep,
+                        cross_attention_cache=cross_attention_cache,
+                        timestep_embedding=timestep_embedding,
                     ).sample
 
+                    noise_pred_with_only_text_cond = None
+                    if (
+                        do_double_condition_guidance
+                        and encoder_hidden_states_no_lyric is not None
+                    ):
+                        noise_pred_with_only_text_cond = self.ace_step_transformer.decode(
+                            hidden_states=latent_model_input,
+                            attention_mask=attention_mask,
+                            encoder_hidden_states=encoder_hidden_states_no_lyric,
+                            encoder_hidden_mask=encoder_hidden_mask,
+                            output_length=output_length,
+                            timestep=timestep,
+                            cross_attention_cache=cross_attention_cache_no_lyric,
+                            timestep_embedding=timestep_embedding,
+                        ).sample
+
+                    if use_erg_diffusion:
+                        noise_pred_uncond = self.forward_diffusion_with_temperature(
+                            hidden_states=latent_model_input,
+                            timestep=timestep,
+                            inputs={
+                                "encoder_hidden_states": encoder_hidden_states_null,
+                                "encoder_hidden_mask": encoder_hidden_mask,
+                                "output_length": output_length,
+                                "attention_mask": attention_mask,
+                                "cross_attention_cache": cross_attention_cache_null,
+                                "timestep_embedding": timestep_embedding,
+                            },
+                        )
+                    else:
+                        noise_pred_uncond = self.ace_step_transformer.decode(
+                            hidden_states=latent_model_input,
+                            attention_mask=attention_mask,
+                            encoder_hidden_states=encoder_hidden_states_null,
+                            encoder_hidden_mask=encoder_hidden_mask,
+                            output_length=output_length,
+                            timestep=timestep,
+                            cross_attention_cache=cross_attention_cache_null,
+                            timestep_embedding=timestep_embedding,
+                        ).sample
+
                 if (
                     do_double_condition_guidance
                     and noise_pred_with_only_text_cond is not None
@@ -1323,6 +1765,10 @@ class ACEStepPipeline:
                     encoder_hidden_mask=encoder_hidden_mask,
                     output_length=latent_model_input.shape[-1],
                     timestep=timestep,
+                    cross_attention_cache=cross_attention_cache,
+                    timestep_embedding=step_timestep_embedding(
+                        i, latent_model_input.shape[0]
+                    ),
                 ).sample
 
             if is_repaint and i >= n_min:
@@ -1348,6 +1794,7 @@ class ACEStepPipeline:
                     omega=omega_scale,
                     generator=random_generators[0],
                 )[0]
+            tracer.record("diffusion_step", current_span(), step_start, time.time(), step=i)
 
         if is_extend:
             if to_right_pad_gt_latents is not None:
@@ -1360,6 +1807,7 @@ class ACEStepPipeline:
                 )
         return target_latents
 
+    @traced()
     @cpu_offload("music_dcae")
     def latents2audio(
         self,
@@ -1369,15 +1817,20 @@ class ACEStepPipeline:
         save_path=None,
         format="wav",
         filename_prefix="output",
+        cancel_check=None,
     ):
         output_audio_paths = []
         bs = latents.shape[0]
         pred_latents = latents
         with torch.no_grad():
             if self.overlapped_decode and target_wav_duration_second > 48:
-                _, pred_wavs = self.music_dcae.decode_overlap(pred_latents, sr=sample_rate)
+                _, pred_wavs = self.music_dcae.decode_overlap(
+                    pred_latents, sr=sample_rate, cancel_check=cancel_check
+                )
             else:
-                _, pred_wavs = self.music_dcae.decode(pred_latents, sr=sample_rate)
+                _, pred_wavs = self.music_dcae.decode(
+                    pred_latents, sr=sample_rate, cancel_check=cancel_check
+                )
         pred_wavs = [pred_wav.cpu().float() for pred_wav in pred_wavs]
         for i in tqdm(range(bs)):
             output_audio_path = self.save_wav_file(
@@ -1386,11 +1839,14 @@ class ACEStepPipeline:
                 save_path=save_path,
                 sample_rate=sample_rate,
                 format=format,
-                filename_prefix=filename_prefix,
+                filename_prefix=(
+                    filename_prefix[i] if isinstance(filename_prefix, list) else filename_prefix
+                ),
             )
             output_audio_paths.append(output_audio_path)
         return output_audio_paths
 
+    @traced()
     def save_wav_file(
         self, target_wav, idx, save_path=None, sample_rate=48000, format="wav", filename_prefix="output"
     ):
@@ -1424,6 +1880,8 @@ class ACEStepPipeline:
             sf.write(output_path_wav, audio_np, sample_rate)
         except Exception as e:
             logger.error(f"Failed to save with soundfile, falling back to torchaudio (which may fail): {e}")
+            import torchaudio
+
             torchaudio.save(
                 output_path_wav, target_wav, sample_rate=sample_rate, format=format, backend=backend
             )
@@ -1441,6 +1899,10 @@ class ACEStepPipeline:
 
     def load_lora(self, lora_name_or_path, lora_weight):
         if (lora_name_or_path != self.lora_path or lora_weight != self.lora_weight) and lora_name_or_path != "none":
+            # LoRA support (peft, hub downloads) is imported on first use
+            from diffusers.utils.peft_utils import set_weights_and_activate_adapters
+            from huggingface_hub import snapshot_download
+
             if not os.path.exists(lora_name_or_path):
                 lora_download_path = snapshot_download(lora_name_or_path, cache_dir=self.checkpoint_dir)
             else:
@@ -1456,6 +1918,7 @@ class ACEStepPipeline:
             logger.info("No lora weights to load.")
             self.ace_step_transformer.unload_lora()
 
+    @traced("generate")
     def __call__(
         self,
         format: str = "wav",
@@ -1496,6 +1959,7 @@ class ACEStepPipeline:
         save_path: str = None,
         batch_size: int = 1,
         debug: bool = False,
+        cancel_check=None,
         progress=None,
     ):
 
@@ -1506,6 +1970,20 @@ class ACEStepPipeline:
         if audio2audio_enable and ref_audio_input is not None:
             task = "audio2audio"
 
+        # a list of prompts batches independent requests: one sample per prompt,
+        # with its own lyrics (padded and masked) and a duration of the same frame length
+        is_multi_request = isinstance(prompt, list)
+        if is_multi_request:
+            assert task == "text2music", "per-sample prompts are only supported for text2music"
+            prompts = prompt
+            batch_size = len(prompts)
+            lyrics_list = lyrics if isinstance(lyrics, list) else [lyrics] * batch_size
+            audio_durations = (
+                list(audio_duration)
+                if isinstance(audio_duration, list)
+                else [audio_duration] * batch_size
+            )
+
         if not self.loaded:
             logger.warning("Checkpoint not loaded, loading checkpoint...")
             if progress:
@@ -1533,13 +2011,18 @@ class ACEStepPipeline:
         else:
             oss_steps = []
 
-        texts = [prompt]
-        encoder_text_hidden_states, text_attention_mask = self.get_text_embeddings(texts)
-        encoder_text_hidden_states = encoder_text_hidden_states.repeat(batch_size, 1, 1)
-        text_attention_mask = text_attention_mask.repeat(batch_size, 1)
+        if is_multi_request:
+            encoder_text_hidden_states, text_attention_mask = self.get_text_embeddings(prompts)
+        else:
+            texts = [prompt]
+            encoder_text_hidden_states, text_attention_mask = self.get_text_embeddings(texts)
+            encoder_text_hidden_states = encoder_text_hidden_states.repeat(batch_size, 1, 1)
+            text_attention_mask = text_attention_mask.repeat(batch_size, 1)
 
         encoder_text_hidden_states_null = None
-        if use_erg_tag:
+        if use_erg_tag and is_multi_request:
+            encoder_text_hidden_states_null = self.get_text_embeddings_null(prompts)
+        elif use_erg_tag:
             encoder_text_hidden_states_null = self.get_text_embeddings_null(texts)
             encoder_text_hidden_states_null = encoder_text_hidden_states_null.repeat(batch_size, 1, 1)
 
@@ -1547,25 +2030,25 @@ class ACEStepPipeline:
         speaker_embeds = torch.zeros(batch_size, 512).to(self.device).to(self.dtype)
 
         # 6 lyric
-        lyric_token_idx = torch.tensor([0]).repeat(batch_size, 1).to(self.device).long()
-        lyric_mask = torch.tensor([0]).repeat(batch_size, 1).to(self.device).long()
-        if lyrics and len(lyrics) > 0:
-            lyric_token_idx = self.tokenize_lyrics(lyrics, debug=debug)
-            lyric_mask = [1] * len(lyric_token_idx)
-            lyric_token_idx = (
-                torch.tensor(lyric_token_idx)
-                .unsqueeze(0)
-                .to(self.device)
-                .repeat(batch_size, 1)
-            )
-            lyric_mask = (
-                torch.tensor(lyric_mask)
-                .unsqueeze(0)
-                .to(self.device)
-                .repeat(batch_size, 1)
-            )
-
-        if audio_duration <= 0:
+        if is_multi_request:
+            lyric_token_idx, lyric_mask = self.tokenize_lyrics_batch(lyrics_list, debug=debug)
+            # per sample, so that the entries are shared with single-sample calls
+            conditioning_source = [
+                self.conditioning_source([sample_prompt], sample_lyrics, 1, use_erg_tag)
+                for sample_prompt, sample_lyrics in zip(prompts, lyrics_list)
+            ]
+        else:
+            lyric_token_idx, lyric_mask = self.lyric_inputs(lyrics, batch_size, debug=debug)
+            conditioning_source = self.conditioning_source([prompt], lyrics, batch_size, use_erg_tag)
+
+        if is_multi_request:
+            # zero padding is not transparent to the patch embedding (convs + GroupNorm),
+            # so the samples of one call must share a latent frame length
+            frame_lengths = {int(duration * 44100 / 512 / 8) for duration in audio_durations}
+            if len(frame_lengths) > 1 or min(audio_durations) <= 0:
+                raise ValueError("per-sample audio durations must map to one latent frame length")
+            audio_duration = max(audio_durations)
+        elif audio_duration <= 0:
             audio_duration = random.uniform(30.0, 240.0)
             logger.info(f"random audio duration: {audio_duration}")
 
@@ -1656,6 +2139,7 @@ class ACEStepPipeline:
                 n_max=edit_n_max,
                 n_avg=edit_n_avg,
                 scheduler_type=scheduler_type,
+                cancel_check=cancel_check,
                 progress=progress,
             )
         else:
@@ -1690,7 +2174,9 @@ class ACEStepPipeline:
                 audio2audio_enable=audio2audio_enable,
                 ref_audio_strength=ref_audio_strength,
                 ref_latents=ref_latents,
+                cancel_check=cancel_check,
                 progress=progress,
+                conditioning_source=conditioning_source,
             )
 
         end_time = time.time()
@@ -1702,7 +2188,12 @@ class ACEStepPipeline:
             target_wav_duration_second=audio_duration,
             save_path=save_path,
             format=format,
-            filename_prefix=sanitize_filename(prompt if task != "edit" else edit_target_prompt),
+            filename_prefix=(
+                [sanitize_filename(p) for p in prompts]
+                if is_multi_request
+                else sanitize_filename(prompt if task != "edit" else edit_target_prompt)
+            ),
+            cancel_check=cancel_check,
         )
 
         # Clean up memory after generation
@@ -1715,6 +2206,7 @@ class ACEStepPipeline:
             "diffusion": diffusion_time_cost,
             "latent2audio": latent2audio_time_cost,
         }
+        record_pipeline_run(timecosts, infer_step, batch_size)
 
         input_params_json = {
             "format": format,
@@ -1754,13 +2246,27 @@ class ACEStepPipeline:
             "ref_audio_strength": ref_audio_strength,
             "ref_audio_input": ref_audio_input,
         }
-        # save input_params_json
-        for output_audio_path in output_paths:
-            input_params_json_save_path = output_audio_path.replace(
-                f".{format}", "_input_params.json"
-            )
-            input_params_json["audio_path"] = output_audio_path
-            with open(input_params_json_save_path, "w", encoding="utf-8") as f:
-                json.dump(input_params_json, f, indent=4, ensure_ascii=False)
+        if is_multi_request:
+            # one record per sample, returned in sample order after the audio paths
+            input_params_jsons = [
+                {
+                    **input_params_json,
+                    "prompt": prompts[i],
+                    "lyrics": lyrics_list[i],
+                    "audio_duration": audio_durations[i],
+                    "actual_seeds": [actual_seeds[i]],
+                    "retake_seeds": [actual_retake_seeds[i]],
+                }
+                for i in range(batch_size)
+            ]
+        else:
+            input_params_jsons = [input_params_json] * len(output_paths)
+
+        # record input_params_json in the output directory's metadata store
+        for output_audio_path, sample_params_json in zip(output_paths, input_params_jsons):
+            sample_params_json["audio_path"] = output_audio_path
+            save_output_metadata(output_audio_path, sample_params_json)
 
+        if is_multi_request:
+            return output_paths + input_params_jsons
         return output_paths + [input_params_json]
@@ -327,7 +327,8 @@ class FlowMatchEulerDiscreteScheduler(SchedulerMixin, ConfigMixin):
         ## --
         ## mean shift 1
         dx = (sigma_next - sigma) * model_output
-        m = dx.mean()
+        # per sample, so that the samples of a batch do not shift each other
+        m = dx.mean(dim=tuple(range(1, dx.dim())), keepdim=True)
         # print(dx.shape) # torch.Size([1, 16, 128, 128])
         # print(f'm: {m}') # m: -0.0014209747314453125
         # raise NotImplementedError
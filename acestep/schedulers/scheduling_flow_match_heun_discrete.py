@@ -345,7 +345,8 @@ class FlowMatchHeunDiscreteScheduler(SchedulerMixin, ConfigMixin):
         # prev_sample = sample + derivative * dt
 
         dx = derivative * dt
-        m = dx.mean()
+        # per sample, so that the samples of a batch do not shift each other
+        m = dx.mean(dim=tuple(range(1, dx.dim())), keepdim=True)
         dx_ = (dx - m) * omega + m
         prev_sample = sample + dx_
 
@@ -0,0 +1,237 @@
+"""
+Lightweight per-job span tracing.
+
+Spans follow the OpenTelemetry data model (trace / span ids, parent, links,
+attributes, status) and are exported as OTLP/JSON lines (one
+`ExportTraceServiceRequest` per line) to the file named by 'ACE_TRACE_FILE';
+tracing is off when it is unset. The file can be read back offline or fed
+to an OpenTelemetry collector (`otlpjsonfile` receiver).
+
+The current span lives in a context variable. Code that hands work to another
+thread or process passes `current()` along and re-enters it with `attach()`.
+A trace's spans are buffered in the process and written out whenever its
+last open span there ends.
+"""
+
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+SERVICE_NAME = "ace-step"
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """Identifies a span; picklable, so it can travel to worker processes."""
+
+    trace_id: str
+    span_id: str
+
+
+@dataclass
+class Span:
+    name: str
+    context: SpanContext
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    links: Sequence[SpanContext] = ()
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.links:
+            span["links"] = [{"traceId": link.trace_id, "spanId": link.span_id} for link in self.links]
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class JsonFileExporter:
+    """Appends one OTLP/JSON document per export; safe across threads and processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[Span]):
+        document = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            _otlp_attribute("service.name", SERVICE_NAME),
+                            _otlp_attribute("process.pid", os.getpid()),
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "acestep"}, "spans": [span.to_otlp() for span in spans]}],
+                }
+            ]
+        }
+        line = (json.dumps(document) + "\n").encode()
+        with self._lock:
+            # a single O_APPEND write keeps lines from different workers intact
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+
+_current: ContextVar[Optional[SpanContext]] = ContextVar("ace_current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, exporter: Optional[JsonFileExporter] = None):
+        self.exporter = exporter
+        self._lock = threading.Lock()
+        self._finished: Dict[str, List[Span]] = {}
+        self._open: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[SpanContext] = None,
+        links: Sequence[SpanContext] = (),
+        start_ns: Optional[int] = None,
+        **attributes,
+    ) -> Optional[Span]:
+        """
+        Opens a span under `parent` (default: the current span; a new trace if
+        there is none). Returns None when tracing is off. Does not make it current.
+        """
+        if not self.enabled:
+            return None
+        parent = parent or _current.get()
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        span = Span(
+            name=name,
+            context=SpanContext(trace_id, secrets.token_hex(8)),
+            parent_id=parent.span_id if parent else None,
+            start_ns=start_ns or time.time_ns(),
+            attributes=attributes,
+            links=tuple(link for link in links if link is not None),
+        )
+        with self._lock:
+            self._open[trace_id] = self._open.get(trace_id, 0) + 1
+        return span
+
+    def end_span(self, span: Optional[Span], error: Optional[BaseException] = None, end_ns: Optional[int] = None):
+        if span is None or span.end_ns is not None:
+            return
+        span.end_ns = end_ns or time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        trace_id = span.context.trace_id
+        with self._lock:
+            self._finished.setdefault(trace_id, []).append(span)
+            self._open[trace_id] -= 1
+            if self._open[trace_id] > 0:
+                return
+            del self._open[trace_id]
+            spans = self._finished.pop(trace_id)
+        self.exporter.export(spans)
+
+    def record(self, name: str, parent: Optional[SpanContext], start: float, end: float, **attributes):
+        """Records an already finished span from wall-clock `start` / `end` seconds under `parent` (no-op without one)."""
+        if parent is None:
+            return
+        span = self.start_span(name, parent=parent, start_ns=int(start * 1e9), **attributes)
+        self.end_span(span, end_ns=int(end * 1e9))
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, links: Sequence[SpanContext] = (), **attributes):
+        """Runs the block in a new span, made current for its duration. Yields the span (None when off)."""
+        span = self.start_span(name, parent=parent, links=links, **attributes)
+        if span is None:
+            yield None
+            return
+        token = _current.set(span.context)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            _current.reset(token)
+
+
+def current() -> Optional[SpanContext]:
+    return _current.get()
+
+
+@contextmanager
+def attach(context: Optional[SpanContext]):
+    """Makes `context` (from another thread or process) the current span for the block."""
+    token = _current.set(context)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: runs the function in a span named `name` (default: its own name)."""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def create_tracer() -> Tracer:
+    """Reads 'ACE_TRACE_FILE' (path of the OTLP/JSON lines file). Defaults to '' (tracing off)."""
+    path = os.getenv("ACE_TRACE_FILE", "")
+    return Tracer(JsonFileExporter(path) if path else None)
+
+
+tracer = create_tracer()
@@ -10,6 +10,9 @@ import gradio as gr
 import librosa
 import os
 
+from acestep.metadata_store import get_metadata_store
+from acestep.presets import GENRE_PRESETS
+
 
 TAG_DEFAULT = "funk, pop, soul, rock, melodic, guitar, drums, bass, keyboard, percussion, 105 BPM, energetic, upbeat, groovy, vibrant, dynamic"
 LYRIC_DEFAULT = """[verse]
@@ -49,20 +52,6 @@ Catch the tune and hold it tight
 In this moment we take flight
 """
 
-# First, let's define the presets at the top of the file, after the imports
-GENRE_PRESETS = {
-    "Modern Pop": "pop, synth, drums, guitar, 120 bpm, upbeat, catchy, vibrant, female vocals, polished vocals",
-    "Rock": "rock, electric guitar, drums, bass, 130 bpm, energetic, rebellious, gritty, male vocals, raw vocals",
-    "Hip Hop": "hip hop, 808 bass, hi-hats, synth, 90 bpm, bold, urban, intense, male vocals, rhythmic vocals",
-    "Country": "country, acoustic guitar, steel guitar, fiddle, 100 bpm, heartfelt, rustic, warm, male vocals, twangy vocals",
-    "EDM": "edm, synth, bass, kick drum, 128 bpm, euphoric, pulsating, energetic, instrumental",
-    "Reggae": "reggae, guitar, bass, drums, 80 bpm, chill, soulful, positive, male vocals, smooth vocals",
-    "Classical": "classical, orchestral, strings, piano, 60 bpm, elegant, emotive, timeless, instrumental",
-    "Jazz": "jazz, saxophone, piano, double bass, 110 bpm, smooth, improvisational, soulful, male vocals, crooning vocals",
-    "Metal": "metal, electric guitar, double kick drum, bass, 160 bpm, aggressive, intense, heavy, male vocals, screamed vocals",
-    "R&B": "r&b, synth, bass, drums, 85 bpm, sultry, groovy, romantic, female vocals, silky vocals"
-}
-
 # Add this function to handle preset selection
 def update_tags_from_preset(preset_name):
     if preset_name == "Custom":
@@ -101,9 +90,8 @@ def create_text2music_ui(
         output_file_dir = os.environ.get("ACE_OUTPUT_DIR", "./outputs")
         if not os.path.isdir(output_file_dir):
             os.makedirs(output_file_dir, exist_ok=True)
-        json_files = [f for f in os.listdir(output_file_dir) if f.endswith('.json')]
-        json_files.sort(reverse=True, key=lambda x: int(x.split('_')[1]))
-        output_files = gr.Dropdown(choices=json_files, label="Select previous generated input params", scale=9, interactive=True)
+        output_names = get_metadata_store(output_file_dir).filenames()
+        output_files = gr.Dropdown(choices=output_names, label="Select previous generated input params", scale=9, interactive=True)
         load_bnt = gr.Button("Load", variant="primary", scale=1)
 
     with gr.Row():
@@ -921,12 +909,10 @@ def create_text2music_ui(
             ],
         )
 
-        def load_data(json_file):
-            if json_file is None:
+        def load_data(output_name):
+            if output_name is None:
                 return [gr.update() for _ in range(21)]
-            if isinstance(output_file_dir, str):
-                json_file = os.path.join(output_file_dir, json_file)
-            json_data = load_data_func(json_file)
+            json_data = get_metadata_store(output_file_dir).get(output_name)
             return json2output(json_data)
 
         load_bnt.click(
@@ -0,0 +1,66 @@
+-- Migration: 12_credit_ledger.sql
+-- Atomic credit operations: one round trip per debit / credit, no read-modify-write race.
+
+-- Debit: only succeeds if the balance covers the amount; logs the transaction in the same statement.
+-- Returns { "ok": bool, "balance": int | null } (balance is null when the user has no wallet).
+create or replace function debit_credits (
+  p_user_id uuid,
+  p_amount int,
+  p_reason text,
+  p_metadata jsonb default '{}'::jsonb
+)
+returns jsonb
+language plpgsql
+security definer
+as $$
+declare
+  new_balance int;
+  current_balance int;
+begin
+  update public.wallets
+  set balance = balance - p_amount, updated_at = now()
+  where user_id = p_user_id and balance >= p_amount
+  returning balance into new_balance;
+
+  if found then
+    insert into public.transactions (user_id, amount, reason, metadata)
+    values (p_user_id, -p_amount, p_reason, p_metadata);
+    return jsonb_build_object('ok', true, 'balance', new_balance);
+  end if;
+
+  select balance into current_balance from public.wallets where user_id = p_user_id;
+  return jsonb_build_object('ok', current_balance is null, 'balance', current_balance);
+end;
+$$;
+
+-- Credit: adds to the balance and logs the transaction. Returns the new balance (null without a wallet).
+create or replace function credit_credits (
+  p_user_id uuid,
+  p_amount int,
+  p_reason text,
+  p_metadata jsonb default '{}'::jsonb
+)
+returns int
+language plpgsql
+security definer
+as $$
+declare
+  new_balance int;
+begin
+  update public.wallets
+  set balance = balance + p_amount, updated_at = now()
+  where user_id = p_user_id
+  returning balance into new_balance;
+
+  if found then
+    insert into public.transactions (user_id, amount, reason, metadata)
+    values (p_user_id, p_amount, p_reason, p_metadata);
+  end if;
+
+  return new_balance;
+end;
+$$;
+
+-- Only the backend (service role) may move credits
+revoke execute on function debit_credits(uuid, int, text, jsonb) from public, anon, authenticated;
+revoke execute on function credit_credits(uuid, int, text, jsonb) from public, anon, authenticated;
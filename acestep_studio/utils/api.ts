@@ -120,15 +120,8 @@ export async function getHistory(): Promise<{ files: string[] }> {
 
 export async function getTrackMetadata(filename: string): Promise<GenerationRequest | null> {
     try {
-        const jsonName = filename.replace(/\.(wav|mp3|flac|ogg)$/i, "_input_params.json");
-        const res = await apiFetch(`/outputs/${jsonName}`);
-        if (!res.ok) {
-            // Fallback for edge cases (legacy files?)
-            const simpleJson = filename.replace(/\.(wav|mp3|flac|ogg)$/i, ".json");
-            const res2 = await apiFetch(`/outputs/${simpleJson}`);
-            if (res2.ok) return res2.json();
-            return null;
-        }
+        const res = await apiFetch(`/files/${encodeURIComponent(filename)}/metadata`);
+        if (!res.ok) return null;
         return res.json();
     } catch {
         return null;
@@ -0,0 +1,339 @@
+"""
+CPU benchmark suite on tiny, randomly initialized models (see tiny_models.py).
+
+    python -m benchmarks.bench run --out results.json
+    python -m benchmarks.bench compare before.json after.json
+
+Every benchmark writes its numbers under `results.<name>` in the JSON file,
+next to the commit, torch version and thread count the run used.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import click
+import torch
+
+from acestep.conditioning_cache import conditioning_cache
+from acestep.instrumentation import DECODE_WINDOW_SECONDS
+from acestep.pipeline_ace_step import ACEStepPipeline
+from benchmarks import tiny_models
+
+LATENT_FRAMES_PER_SECOND = 44100 / 512 / 8
+
+LYRICS = """[verse]
+Walking down the empty street tonight
+City lights are fading out of sight
+[chorus]
+我们一起唱歌 直到天亮
+Nous chantons jusqu'au matin
+[bridge]
+Cantamos bajo la luna llena
+夜空に響くこの歌声
+"""
+
+
+def measure(fn: Callable[[], object], warmup: int, repeat: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "min_s": min(times),
+        "max_s": max(times),
+    }
+
+
+def frames_for(duration: float) -> int:
+    return int(duration * LATENT_FRAMES_PER_SECOND)
+
+
+def encoder_inputs(pipeline, batch_size: int):
+    prompt = " ".join(tiny_models.PROMPT_WORDS[:12])
+    text_states, text_mask = pipeline.get_text_embeddings([prompt] * batch_size)
+    lyric_ids = torch.tensor([pipeline.tokenize_lyrics(LYRICS)] * batch_size, dtype=torch.long)
+    return dict(
+        encoder_text_hidden_states=text_states,
+        text_attention_mask=text_mask,
+        speaker_embeds=torch.zeros(batch_size, 512),
+        lyric_token_idx=lyric_ids,
+        lyric_mask=torch.ones_like(lyric_ids),
+    )
+
+
+def bench_transformer_encode(pipeline, durations, warmup, repeat, **_) -> dict:
+    transformer = pipeline.ace_step_transformer
+    inputs = encoder_inputs(pipeline, batch_size=1)
+    return {
+        "lyric_tokens": inputs["lyric_token_idx"].shape[1],
+        **measure(lambda: transformer.encode(**inputs), warmup, repeat),
+    }
+
+
+def bench_transformer_decode(pipeline, durations, warmup, repeat, **_) -> dict:
+    transformer = pipeline.ace_step_transformer
+    results = {}
+    # batch 2 is the cond + uncond pass of classifier-free guidance
+    for batch_size in (1, 2):
+        encoder_states, encoder_mask = transformer.encode(**encoder_inputs(pipeline, batch_size))
+        for duration in durations:
+            frames = frames_for(duration)
+            latents = torch.randn(batch_size, 8, 16, frames)
+            attention_mask = torch.ones(batch_size, frames)
+            timestep = torch.full((batch_size,), 999.0)
+
+            def step():
+                return transformer.decode(
+                    hidden_states=latents,
+                    attention_mask=attention_mask,
+                    encoder_hidden_states=encoder_states,
+                    encoder_hidden_mask=encoder_mask,
+                    timestep=timestep,
+                    output_length=frames,
+                ).sample
+
+            timing = measure(step, warmup, repeat)
+            results[f"bs{batch_size}_{duration:g}s"] = {
+                "frames": frames,
+                "steps_per_s": 1 / timing["median_s"],
+                **timing,
+            }
+    return results
+
+
+def bench_music_dcae(pipeline, durations, warmup, repeat, **_) -> dict:
+    music_dcae = pipeline.music_dcae
+    results = {}
+    for duration in durations:
+        latents = torch.randn(1, 8, 16, frames_for(duration))
+        audio = torch.randn(1, 2, int(duration * 48000))
+        results[f"encode_{duration:g}s"] = measure(lambda: music_dcae.encode(audio), warmup, repeat)
+        for method in ("decode", "decode_overlap"):
+            decode = getattr(music_dcae, method)
+            before = {name: DECODE_WINDOW_SECONDS.totals(decoder=name) for name in ("dcae", "vocoder")}
+            timing = measure(lambda: decode(latents, sr=48000), warmup, repeat)
+            runs = warmup + repeat
+            entry = {"rtf": timing["median_s"] / duration, **timing}
+            for name, (total, windows) in before.items():
+                after_total, after_windows = DECODE_WINDOW_SECONDS.totals(decoder=name)
+                entry[f"{name}_rtf"] = (after_total - total) / runs / duration
+                entry[f"{name}_windows"] = (after_windows - windows) // runs
+            results[f"{method}_{duration:g}s"] = entry
+    return results
+
+
+def bench_tokenize_lyrics(pipeline, durations, warmup, repeat, **_) -> dict:
+    lines = [line for line in LYRICS.split("\n") if line.strip()]
+    timing = measure(lambda: pipeline.tokenize_lyrics(LYRICS), warmup, repeat)
+    return {
+        "lines": len(lines),
+        "lines_per_s": len(lines) / timing["median_s"],
+        **timing,
+    }
+
+
+def bench_pipeline_call(pipeline, durations, warmup, repeat, steps, output_dir, **_) -> dict:
+    results = {}
+    prompt = " ".join(tiny_models.PROMPT_WORDS[:12])
+    for duration in durations:
+        timecosts: List[dict] = []
+
+        def generate():
+            # uncached, like a new prompt; see bench_conditioning for repeats
+            conditioning_cache.clear()
+            output = pipeline(
+                audio_duration=duration,
+                prompt=prompt,
+                lyrics=LYRICS,
+                infer_step=steps,
+                manual_seeds=[42],
+                save_path=output_dir,
+                # ERG on the diffusion hooks transformer blocks 15-16; the tiny model has 2
+                use_erg_diffusion=False,
+            )
+            timecosts.append(output[-1]["timecosts"])
+
+        timing = measure(generate, warmup, repeat)
+        stages = {
+            f"{stage}_s": statistics.median(run[stage] for run in timecosts[warmup:])
+            for stage in ("preprocess", "diffusion", "latent2audio")
+        }
+        results[f"{duration:g}s"] = {"rtf": timing["median_s"] / duration, **stages, **timing}
+    return results
+
+
+def bench_conditioning(pipeline, durations, warmup, repeat, **_) -> dict:
+    """Text embeddings and encoder outputs of one request, computed vs served from the conditioning cache."""
+    prompt = " ".join(tiny_models.PROMPT_WORDS[:12])
+
+    def condition():
+        texts = [prompt]
+        text_states, text_mask = pipeline.get_text_embeddings(texts)
+        text_states_null = pipeline.get_text_embeddings_null(texts)
+        lyric_ids, lyric_mask = pipeline.lyric_inputs(LYRICS)
+        pipeline.encode_conditioning(
+            text_states,
+            text_mask,
+            torch.zeros(1, 512),
+            lyric_ids,
+            lyric_mask,
+            encoder_text_hidden_states_null=text_states_null,
+            use_erg_lyric=True,
+            source=pipeline.conditioning_source(texts, LYRICS, 1, True),
+        )
+
+    def cold():
+        conditioning_cache.clear()
+        condition()
+
+    results = {"cold": measure(cold, warmup, repeat)}
+    results["cached"] = measure(condition, warmup, repeat)
+    results["cached"]["hit_rate"] = conditioning_cache.stats()["hit_rate"]
+    conditioning_cache.clear()
+    return results
+
+
+def bench_checkpoint_load(pipeline, durations, warmup, repeat, directory, **_) -> dict:
+    checkpoint_dir = tiny_models.save_checkpoint(pipeline, directory)
+    results = {}
+    for workers in (1, 4):
+        os.environ["ACE_LOAD_WORKERS"] = str(workers)
+        reports = []
+
+        def load():
+            fresh = ACEStepPipeline(checkpoint_dir=checkpoint_dir, dtype="float32")
+            fresh.device = torch.device("cpu")
+            fresh.load_checkpoint(checkpoint_dir)
+            reports.append(fresh.load_report)
+
+        timing = measure(load, warmup, repeat)
+        components = {
+            f"{name}_s": statistics.median(report[name]["seconds"] for report in reports[warmup:])
+            for name in reports[-1]
+        }
+        results[f"workers{workers}"] = {
+            "peak_rss_bytes": max(report["total"]["peak_rss_bytes"] for report in reports[warmup:]),
+            **components,
+            **timing,
+        }
+    os.environ.pop("ACE_LOAD_WORKERS")
+    return results
+
+
+BENCHMARKS = {
+    "transformer_encode": bench_transformer_encode,
+    "transformer_decode": bench_transformer_decode,
+    "music_dcae": bench_music_dcae,
+    "tokenize_lyrics": bench_tokenize_lyrics,
+    "pipeline_call": bench_pipeline_call,
+    "conditioning": bench_conditioning,
+    "checkpoint_load": bench_checkpoint_load,
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option("--out", type=str, default="benchmark_results.json", help="Where to write the JSON results.")
+@click.option("--only", type=click.Choice(list(BENCHMARKS)), multiple=True, help="Run only these benchmarks.")
+@click.option("--durations", type=str, default="10,30,60", help="Comma-separated audio durations (seconds).")
+@click.option("--steps", type=int, default=10, help="Diffusion steps for the end-to-end `__call__` benchmark.")
+@click.option("--warmup", type=int, default=1, help="Untimed runs before measuring.")
+@click.option("--repeat", type=int, default=3, help="Timed runs per measurement.")
+@click.option("--threads", type=int, default=0, help="torch intra-op threads (0: torch default).")
+@click.option("--seed", type=int, default=0, help="Seed for the random model weights and inputs.")
+def run(out, only, durations, steps, warmup, repeat, threads, seed):
+    """Run the benchmarks and write the results as JSON."""
+    if threads:
+        torch.set_num_threads(threads)
+    torch.manual_seed(seed)
+    durations = [float(duration) for duration in durations.split(",")]
+
+    with tempfile.TemporaryDirectory() as directory, torch.no_grad():
+        pipeline = tiny_models.build_pipeline(directory)
+        output_dir = os.path.join(directory, "outputs")
+        os.makedirs(output_dir, exist_ok=True)
+        results = {}
+        for name in only or BENCHMARKS:
+            click.echo(f"Running {name}...")
+            results[name] = BENCHMARKS[name](
+                pipeline,
+                durations=durations,
+                warmup=warmup,
+                repeat=repeat,
+                steps=steps,
+                output_dir=output_dir,
+                directory=directory,
+            )
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "torch": torch.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "threads": torch.get_num_threads(),
+        "config": {"durations": durations, "steps": steps, "warmup": warmup, "repeat": repeat, "seed": seed},
+        "results": results,
+    }
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    click.echo(f"Wrote {out}")
+
+
+@cli.command()
+@click.argument("before", type=click.Path(exists=True))
+@click.argument("after", type=click.Path(exists=True))
+@click.option("--metric", type=str, default="median_s", help="Only compare metrics whose name ends with this.")
+def compare(before, after, metric):
+    """Print each metric of two runs side by side with the relative change."""
+    with open(before) as f:
+        old = json.load(f)
+    with open(after) as f:
+        new = json.load(f)
+    old_metrics, new_metrics = flatten(old["results"]), flatten(new["results"])
+    click.echo(f"{old['commit'][:10]} -> {new['commit'][:10]}")
+    for name in sorted(set(old_metrics) & set(new_metrics)):
+        if not name.endswith(metric):
+            continue
+        a, b = old_metrics[name], new_metrics[name]
+        change = (b - a) / a * 100 if a else float("nan")
+        click.echo(f"{name:60s} {a:12.4f} {b:12.4f} {change:+8.1f}%")
+
+
+if __name__ == "__main__":
+    cli()
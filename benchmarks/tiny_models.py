@@ -0,0 +1,148 @@
+"""
+Randomly initialized, scaled-down versions of the ACE-Step models.
+
+The architectures, tensor layouts and the code paths they run through are the
+real ones (ACEStepTransformer2DModel, MusicDCAE = AutoencoderDC +
+ADaMoSHiFiGANV1, UMT5); only widths and depths shrink, so the whole pipeline
+runs on a CPU-only box. Numbers are for comparing commits, not for predicting
+full-size throughput.
+"""
+
+import os
+
+import torch
+from diffusers import AutoencoderDC
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast, UMT5Config, UMT5EncoderModel
+
+from acestep.models.ace_step_transformer import ACEStepTransformer2DModel
+from acestep.music_dcae.music_dcae_pipeline import MusicDCAE
+from acestep.music_dcae.music_vocoder import ADaMoSHiFiGANV1
+from acestep.pipeline_ace_step import ACEStepPipeline, load_lyric_frontend
+
+TEXT_EMBEDDING_DIM = 64
+PROMPT_WORDS = (
+    "pop rock jazz hip-hop electronic ambient piano guitar drums bass synth strings "
+    "female male vocal choir upbeat mellow energetic sad happy dark bright 90 120 140 bpm"
+).split()
+
+
+def build_transformer() -> ACEStepTransformer2DModel:
+    # Keeps the real token layout: 8 latent channels x 16 rows, 16x1 patches,
+    # 512-d speaker embeddings and the lyric vocabulary. The lyric encoder
+    # (a Conformer) is fixed at 1024-d in the model, so it stays full width.
+    return ACEStepTransformer2DModel(
+        in_channels=8,
+        num_layers=2,
+        attention_head_dim=32,
+        num_attention_heads=4,
+        mlp_ratio=2.5,
+        out_channels=8,
+        max_position=32768,
+        speaker_embedding_dim=512,
+        text_embedding_dim=TEXT_EMBEDDING_DIM,
+        ssl_encoder_depths=[1, 1],
+        ssl_latent_dims=[32, 32],
+        lyric_encoder_vocab_size=6693,
+        lyric_hidden_size=1024,
+        patch_size=[16, 1],
+        max_height=16,
+        max_width=32768,
+    ).eval()
+
+
+def build_dcae() -> AutoencoderDC:
+    # stereo mel (2 x 128) <-> latent (8 x 16): 3 downsampling stages, like music_dcae_f8c8
+    return AutoencoderDC(
+        in_channels=2,
+        latent_channels=8,
+        attention_head_dim=16,
+        encoder_block_types=("ResBlock", "ResBlock", "ResBlock", "EfficientViTBlock"),
+        decoder_block_types=("ResBlock", "ResBlock", "ResBlock", "EfficientViTBlock"),
+        encoder_block_out_channels=(16, 32, 64, 64),
+        decoder_block_out_channels=(16, 32, 64, 64),
+        encoder_layers_per_block=(1, 1, 1, 1),
+        decoder_layers_per_block=(1, 1, 1, 1),
+        encoder_qkv_multiscales=((), (), (), (5,)),
+        decoder_qkv_multiscales=((), (), (), (5,)),
+        upsample_block_type="interpolate",
+        downsample_block_type="Conv",
+        decoder_norm_types="rms_norm",
+        decoder_act_fns="silu",
+    )
+
+
+def build_vocoder() -> ADaMoSHiFiGANV1:
+    # hop length and upsampling stay at 512 samples per mel frame
+    return ADaMoSHiFiGANV1(
+        input_channels=128,
+        depths=[1, 1, 1, 1],
+        dims=[16, 32, 48, 64],
+        num_mels=64,
+        upsample_initial_channel=256,
+        upsample_rates=(4, 4, 2, 2, 2, 2, 2),
+        upsample_kernel_sizes=(8, 8, 4, 4, 4, 4, 4),
+        resblock_kernel_sizes=(3,),
+        resblock_dilation_sizes=((1, 3, 5),),
+        pre_conv_kernel_size=7,
+        post_conv_kernel_size=7,
+    )
+
+
+def build_music_dcae(directory: str) -> MusicDCAE:
+    """MusicDCAE loads its parts with `from_pretrained`, so they go through `directory`."""
+    dcae_path = os.path.join(directory, "music_dcae_f8c8")
+    vocoder_path = os.path.join(directory, "music_vocoder")
+    build_dcae().save_pretrained(dcae_path)
+    build_vocoder().save_pretrained(vocoder_path)
+    return MusicDCAE(dcae_checkpoint_path=dcae_path, vocoder_checkpoint_path=vocoder_path).eval()
+
+
+def build_text_encoder():
+    """Returns `(model, tokenizer)`. 12 blocks, because the null embedding hooks blocks 8-9."""
+    vocab = {"<pad>": 0, "<unk>": 1, "</s>": 2}
+    for word in PROMPT_WORDS:
+        vocab.setdefault(word, len(vocab))
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    # like the UMT5 tokenizer, no token_type_ids (UMT5EncoderModel.forward does not take them)
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        unk_token="<unk>",
+        pad_token="<pad>",
+        eos_token="</s>",
+        model_input_names=["input_ids", "attention_mask"],
+    )
+    config = UMT5Config(
+        vocab_size=len(vocab),
+        d_model=TEXT_EMBEDDING_DIM,
+        d_kv=16,
+        d_ff=128,
+        num_layers=12,
+        num_heads=4,
+        pad_token_id=0,
+        eos_token_id=2,
+    )
+    return UMT5EncoderModel(config).eval(), tokenizer
+
+
+def save_checkpoint(pipeline: ACEStepPipeline, directory: str) -> str:
+    """Writes `build_pipeline(directory)`'s models in the checkpoint layout `load_checkpoint` reads."""
+    pipeline.ace_step_transformer.save_pretrained(os.path.join(directory, "ace_step_transformer"))
+    pipeline.text_encoder_model.save_pretrained(os.path.join(directory, "umt5-base"))
+    pipeline.text_tokenizer.save_pretrained(os.path.join(directory, "umt5-base"))
+    return directory
+
+
+def build_pipeline(directory: str) -> ACEStepPipeline:
+    """A loaded fp32 CPU pipeline around the tiny models; outputs are written under `directory`."""
+    pipeline = ACEStepPipeline(checkpoint_dir=os.path.join(directory, "checkpoints"), dtype="float32")
+    pipeline.device = torch.device("cpu")
+    pipeline.dtype = torch.float32
+    pipeline.ace_step_transformer = build_transformer()
+    pipeline.music_dcae = build_music_dcae(directory)
+    pipeline.text_encoder_model, pipeline.text_tokenizer = build_text_encoder()
+    pipeline.text_encoder_model.requires_grad_(False)
+    pipeline.lang_segment, pipeline.lyric_tokenizer = load_lyric_frontend()
+    pipeline.loaded = True
+    return pipeline
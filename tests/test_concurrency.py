@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.api.core.concurrency import LoopLagMonitor, run_blocking
+
+
+def test_blocking_work_leaves_the_loop_responsive():
+    monitor = LoopLagMonitor(interval=0.01, warn_threshold=1.0)
+
+    def blocking(seconds, result=None):
+        time.sleep(seconds)
+        return result, threading.current_thread().name
+
+    async def main():
+        monitor.start()
+        try:
+            return await asyncio.gather(*(run_blocking(blocking, 0.2, result=i) for i in range(2)))
+        finally:
+            monitor.stop()
+
+    results = asyncio.run(main())
+
+    assert [result for result, _ in results] == [0, 1]
+    assert all(thread.startswith("ace-blocking") for _, thread in results)
+    assert monitor.samples >= 5
+    assert monitor.max < 0.1
+
+
+def test_loop_lag_shows_a_blocked_loop():
+    monitor = LoopLagMonitor(interval=0.01, warn_threshold=1.0)
+
+    async def main():
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.2)  # blocks the loop
+        await asyncio.sleep(0.05)
+        monitor.stop()
+
+    asyncio.run(main())
+
+    assert monitor.max >= 0.15
+    assert monitor.snapshot()["max_ms"] >= 150
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("loguru")
+
+from acestep.conditioning_cache import ConditioningCache, conditioning_key, startup_inputs
+from acestep.presets import GENRE_PRESETS
+
+
+class Encoder:
+    """Counts how often the cache falls through to the real computation."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, value):
+        def compute():
+            self.calls += 1
+            return torch.full((100,), float(value)), torch.ones(1, dtype=torch.long)
+
+        return compute
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    encoder = Encoder()
+    cache = ConditioningCache(max_bytes=3 * 408)  # three entries of 100 float32 + 1 int64
+    for value in (1, 2, 3, 1):
+        cache.get_or_compute("encoder", conditioning_key(value), encoder(value))
+    assert encoder.calls == 3
+
+    cache.get_or_compute("encoder", conditioning_key(4), encoder(4))  # evicts 2, used before 1
+    hidden, _ = cache.get_or_compute("encoder", conditioning_key(1), encoder(1))
+    assert encoder.calls == 4 and hidden[0] == 1.0
+    cache.get_or_compute("encoder", conditioning_key(2), encoder(2))
+    assert encoder.calls == 5
+
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["bytes"] == 3 * 408
+    assert stats["kinds"]["encoder"]["hit"] == 2
+    assert stats["hit_rate"] == pytest.approx(2 / 7)
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    encoder = Encoder()
+    key = conditioning_key("text", ["pop, 120 bpm"])
+    ConditioningCache(max_bytes=1024**2, directory=str(tmp_path)).get_or_compute("text", key, encoder(7))
+
+    restarted = ConditioningCache(max_bytes=1024**2, directory=str(tmp_path))
+    hidden, mask = restarted.get_or_compute("text", key, encoder(7))
+    assert encoder.calls == 1
+    assert torch.equal(hidden, torch.full((100,), 7.0)) and torch.equal(mask, torch.ones(1, dtype=torch.long))
+    assert restarted.stats()["kinds"]["text"]["disk_hit"] == 1
+
+
+def test_startup_inputs_cover_presets_and_examples():
+    inputs = startup_inputs()
+    prompts = [params["prompt"] for params in inputs]
+    assert set(GENRE_PRESETS.values()) <= set(prompts)
+    assert any(params.get("lyrics") for params in inputs)
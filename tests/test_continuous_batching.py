@@ -0,0 +1,176 @@
+import os
+import sys
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+torch = pytest.importorskip("torch")
+
+from diffusers.pipelines.stable_diffusion_3.pipeline_stable_diffusion_3 import retrieve_timesteps
+
+from acestep.cancellation import GenerationCancelled
+from acestep.continuous_batching import CALL_DEFAULTS, SCHEDULERS, ContinuousBatchingEngine, DiffusionSample
+from benchmarks.tiny_models import build_transformer
+
+
+class Pipeline:
+    """Stands in for ACEStepPipeline on the exclusive path."""
+
+    lora_path = "none"
+
+    def __init__(self, log):
+        self.log = log
+
+    def __call__(self, **kwargs):
+        self.log.append(("exclusive", kwargs["prompt"]))
+        return kwargs["prompt"]
+
+
+class Sample:
+    def __init__(self, kwargs, future):
+        self.name = kwargs["prompt"]
+        self.steps = kwargs["infer_step"]
+        self.cancel_check = kwargs.get("cancel_check")
+        self.future = future
+        self.step = 0
+        self.trace_context = None
+
+    @property
+    def finished(self):
+        return self.step >= self.steps
+
+    @property
+    def cancelled(self):
+        return self.cancel_check is not None and self.cancel_check()
+
+
+class ScriptedEngine(ContinuousBatchingEngine):
+    """Runs the real admission / retirement loop; a decode step only advances each sample."""
+
+    def __init__(self, max_batch_size, on_step=None):
+        self.log = []
+        super().__init__(Pipeline(self.log), max_batch_size=max_batch_size, poll_interval=0.01)
+        self.on_step = on_step
+
+    def _hold_transformer(self):
+        pass
+
+    def _prepare_sample(self, kwargs, future):
+        return Sample(kwargs, future)
+
+    def _decode_step(self, active):
+        self.log.append(tuple(sample.name for sample in active))
+        for sample in active:
+            sample.step += 1
+        if self.on_step:
+            self.on_step(self, len([entry for entry in self.log if isinstance(entry, tuple)]))
+
+    def _finish(self, sample):
+        sample.future.set_result(sample.name)
+
+
+def request(name, steps, **kwargs):
+    return dict(prompt=name, infer_step=steps, task="text2music", **kwargs)
+
+
+def run(engine, *requests):
+    futures = [engine.submit(**kwargs) for kwargs in requests]
+    engine.start()
+    try:
+        for future in futures:
+            future.exception(timeout=10)
+        for future in getattr(engine, "late", []):
+            future.exception(timeout=10)
+    finally:
+        engine.stop(timeout=10)
+    return futures
+
+
+def test_finished_samples_leave_and_queued_ones_take_their_slot():
+    engine = ScriptedEngine(max_batch_size=2)
+    futures = run(engine, request("a", 2), request("b", 4), request("c", 3))
+
+    assert [future.result() for future in futures] == ["a", "b", "c"]
+    assert engine.log == [("a", "b"), ("a", "b"), ("b", "c"), ("b", "c"), ("c",)]
+    assert engine.num_active == 0
+
+
+def test_exclusive_requests_wait_for_the_batch_to_drain():
+    def on_step(engine, steps):
+        if steps == 1:
+            engine.late = [engine.submit(**request("repaint", 1, src_audio_path="in.wav")), engine.submit(**request("c", 1))]
+
+    engine = ScriptedEngine(max_batch_size=4, on_step=on_step)
+    run(engine, request("a", 2), request("b", 3))
+
+    assert [future.result() for future in engine.late] == ["repaint", "c"]
+
+    # c is not admitted while the repaint waits; it runs once the repaint is done
+    assert engine.log == [("a", "b"), ("a", "b"), ("b",), ("exclusive", "repaint"), ("c",)]
+
+
+def test_cancelled_samples_leave_at_the_next_step():
+    cancelled = []
+    engine = ScriptedEngine(max_batch_size=2, on_step=lambda engine, steps: steps == 1 and cancelled.append(True))
+    futures = run(engine, request("a", 3, cancel_check=lambda: bool(cancelled)), request("b", 3))
+
+    assert isinstance(futures[0].exception(), GenerationCancelled)
+    assert futures[1].result() == "b"
+    assert engine.log == [("a", "b"), ("b",), ("b",)]
+
+
+def test_unbatchable_requests_are_detected():
+    engine = ScriptedEngine(max_batch_size=2)
+
+    assert engine.is_batchable(request("a", 10))
+    assert not engine.is_batchable(dict(request("a", 10), task="repaint"))
+    assert not engine.is_batchable(request("a", 10, audio2audio_enable=True))
+    assert not engine.is_batchable(request("a", 10, lora_name_or_path="some/lora"))
+    assert not engine.is_batchable(request("a", 10, guidance_scale_text=5.0, guidance_scale_lyric=1.5))
+
+
+
+def diffusion_sample(seconds, prompt_tokens, seed):
+    """A guided (APG) sample with random conditioning, sized for the tiny transformer."""
+    generator = torch.Generator().manual_seed(seed)
+    scheduler = SCHEDULERS["euler"](num_train_timesteps=1000, shift=3.0)
+    timesteps, num_inference_steps = retrieve_timesteps(scheduler, num_inference_steps=3, device="cpu")
+    return DiffusionSample(
+        options={**CALL_DEFAULTS, "guidance_scale": 15.0, "cfg_type": "apg", "use_erg_diffusion": False},
+        future=Future(),
+        scheduler=scheduler,
+        timesteps=timesteps,
+        latents=torch.randn(1, 8, 16, int(seconds * 44100 / 512 / 8), generator=generator),
+        generator=generator,
+        encoder_hidden_states=torch.randn(1, prompt_tokens, 128, generator=generator),
+        encoder_hidden_mask=torch.ones(1, prompt_tokens),
+        encoder_hidden_states_null=torch.randn(1, prompt_tokens, 128, generator=generator),
+        start_idx=0,
+        end_idx=num_inference_steps,
+        actual_seeds=[seed],
+        retake_seeds=[seed],
+    )
+
+
+def test_batched_samples_match_solo_runs():
+    torch.manual_seed(0)
+    pipeline = SimpleNamespace(ace_step_transformer=build_transformer(), device=torch.device("cpu"), dtype=torch.float32)
+    engine = ContinuousBatchingEngine(pipeline)
+    # a longer prompt (padded encoder states) and a shorter clip next to the first request
+    requests = [(10.0, 6, 1), (10.0, 11, 2), (4.0, 6, 3)]
+
+    def run_steps(samples):
+        with torch.no_grad():
+            while not samples[0].finished:
+                engine._decode_step(samples)
+        return [sample.latents for sample in samples]
+
+    batched = run_steps([diffusion_sample(*request) for request in requests])
+    solo = [run_steps([diffusion_sample(*request)])[0] for request in requests]
+
+    for batched_latents, solo_latents in zip(batched, solo):
+        assert batched_latents.shape == solo_latents.shape
+        torch.testing.assert_close(batched_latents, solo_latents, rtol=1e-4, atol=1e-4)
@@ -0,0 +1,50 @@
+import inspect
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("torch")
+
+from acestep.api.schemas import GenerationRequest, JobStatus
+from acestep.api.services.job_service import JobService
+from acestep.models.wrappers.acestep_engine import ACEStepEngine
+from acestep.models.wrappers.mock_engine import MockEngine
+from acestep.pipeline_ace_step import ACEStepPipeline
+from acestep.tracing import SpanContext
+
+
+@pytest.fixture
+def job_params(monkeypatch):
+    """The params JobService hands to an engine, traced."""
+    monkeypatch.setattr(JobService, "_save", staticmethod(lambda job: None))
+    monkeypatch.setattr(JobService, "_trace_context", staticmethod(lambda job_id: SpanContext("a" * 32, "b" * 16)))
+    job = JobStatus(job_id="job-1", status="queued", created_at=time.time())
+    return JobService._start_job(job, GenerationRequest(prompt="pop, 120 bpm", lyrics="[verse]\nla la", seed=42))
+
+
+def test_job_params_fit_the_pipeline_signature(job_params):
+    assert job_params["trace_context"] is not None
+
+    kwargs = ACEStepEngine()._pipeline_kwargs(job_params)
+
+    assert "trace_context" not in kwargs
+    inspect.signature(ACEStepPipeline.__call__).bind(None, **kwargs)
+
+
+def test_mock_engine_records_what_the_pipeline_would(job_params, tmp_path, monkeypatch):
+    monkeypatch.setenv("ACE_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setenv("ACE_METADATA_DIR", str(tmp_path / "metadata"))
+    monkeypatch.setenv("ACE_MOCK_STEP_COST", "0")
+    engine = MockEngine()
+    engine.load_model()
+
+    path, input_params = engine.generate(job_params)
+
+    assert os.path.exists(path)
+    recorded = set(input_params) - {"audio_path"}
+    assert recorded <= set(inspect.signature(ACEStepPipeline.__call__).parameters)
+    assert input_params["audio_duration"] == job_params["duration"]
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+torch = pytest.importorskip("torch")
+
+from acestep import pipeline_ace_step
+from acestep.apg_guidance import MomentumBuffer
+from benchmarks.tiny_models import TEXT_EMBEDDING_DIM, build_pipeline
+
+
+def conditioning(seed, prompt_tokens=6, lyric_tokens=9):
+    generator = torch.Generator().manual_seed(seed)
+    return dict(
+        encoder_text_hidden_states=torch.randn(1, prompt_tokens, TEXT_EMBEDDING_DIM, generator=generator),
+        text_attention_mask=torch.ones(1, prompt_tokens),
+        speaker_embds=torch.zeros(1, 512),
+        lyric_token_ids=torch.randint(1, 6693, (1, lyric_tokens), generator=generator),
+        lyric_mask=torch.ones(1, lyric_tokens, dtype=torch.long),
+    )
+
+
+def sequential_calc_v(calc_v):
+    """calc_v that evaluates the stacked n_avg draws one at a time, like FlowEdit did before batching."""
+
+    def run(**kwargs):
+        if kwargs["zt_src"] is None:
+            return calc_v(**kwargs)
+        n_avg = kwargs["zt_src"].shape[0]  # one sample, so one row per draw
+        src, tar = [], []
+        for k in range(n_avg):
+            # cond / uncond rows of draw k
+            rows = [k, n_avg + k]
+            draw = dict(
+                kwargs,
+                zt_src=kwargs["zt_src"][k:k + 1],
+                zt_tar=kwargs["zt_tar"][k:k + 1],
+                attention_mask=kwargs["attention_mask"][rows],
+                cross_attention_cache=None,
+                target_cross_attention_cache=None,
+            )
+            for name in ("encoder_hidden_states", "encoder_hidden_mask", "target_encoder_hidden_states", "target_encoder_hidden_mask"):
+                draw[name] = kwargs[name][rows]
+            noise_pred_src, noise_pred_tar = calc_v(**draw)
+            src.append(noise_pred_src)
+            tar.append(noise_pred_tar)
+        return torch.cat(src), torch.cat(tar)
+
+    return run
+
+
+def test_batched_draws_match_sequential_draws(tmp_path, monkeypatch):
+    torch.manual_seed(0)
+    pipeline = build_pipeline(str(tmp_path))
+    # APG momentum is shared across draws when they run one after another but kept
+    # per draw once they are batched, so the two only agree with momentum off
+    monkeypatch.setattr(pipeline_ace_step, "MomentumBuffer", lambda: MomentumBuffer(momentum=0.0))
+    source, target = conditioning(1), conditioning(2)
+    src_latents = torch.randn(1, 8, 16, 24, generator=torch.Generator().manual_seed(3))
+
+    def edit():
+        return pipeline.flowedit_diffusion_process(
+            **source,
+            **{f"target_{name}": value for name, value in target.items() if name != "speaker_embds"},
+            target_speaker_embeds=target["speaker_embds"],
+            src_latents=src_latents,
+            random_generators=[torch.Generator().manual_seed(4)],
+            infer_steps=4,
+            n_max=0.75,
+            n_avg=3,
+        )
+
+    batched = edit()
+    monkeypatch.setattr(pipeline, "calc_v", sequential_calc_v(pipeline.calc_v))
+    sequential = edit()
+
+    assert not torch.equal(batched, src_latents)
+    torch.testing.assert_close(batched, sequential, rtol=1e-4, atol=1e-4)
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Cold-import budgets in milliseconds, overridable for slow machines
+BUDGETS_MS = {
+    "acestep.api.main": float(os.getenv("ACE_IMPORT_BUDGET_API_MS", 2000)),
+    "acestep.pipeline_ace_step": float(os.getenv("ACE_IMPORT_BUDGET_PIPELINE_MS", 10000)),
+}
+
+# Loaded on first use, never by importing the API
+DEFERRED = (
+    "torch",
+    "sentence_transformers",
+    "smolagents",
+    "litellm",
+    "supabase",
+    "stripe",
+    "acestep.api.agents",
+    "acestep.pipeline_ace_step",
+)
+
+
+def import_profile(module: str) -> dict:
+    """Cumulative import time in microseconds per module, from a fresh `python -X importtime`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1]
+        pytest.skip(f"{module} is not importable here: {last_line}")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+@pytest.mark.parametrize("module", list(BUDGETS_MS))
+def test_cold_import_fits_budget(module):
+    elapsed_ms = import_profile(module)[module] / 1000
+    assert elapsed_ms <= BUDGETS_MS[module], f"importing {module} took {elapsed_ms:.0f} ms"
+
+
+def test_api_import_defers_heavy_dependencies():
+    loaded = set(import_profile("acestep.api.main"))
+    eager = sorted(
+        name for name in loaded
+        if any(name == deferred or name.startswith(deferred + ".") for deferred in DEFERRED)
+    )
+    assert not eager, f"imported eagerly by the API: {eager}"
@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep import instrumentation
+from acestep.instrumentation import Counter, Histogram, duration_bucket
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_stage_seconds", "Test stage latency", labels=("stage",), buckets=(0.1, 1))
+    histogram.observe(0.05, stage="diffusion")
+    histogram.observe(0.5, stage="diffusion")
+    histogram.observe(5, stage="diffusion")
+
+    text = instrumentation.render()
+
+    assert "# TYPE test_stage_seconds histogram" in text
+    assert 'test_stage_seconds_bucket{stage="diffusion",le="0.1"} 1' in text
+    assert 'test_stage_seconds_bucket{stage="diffusion",le="1"} 2' in text
+    assert 'test_stage_seconds_bucket{stage="diffusion",le="+Inf"} 3' in text
+    assert 'test_stage_seconds_count{stage="diffusion"} 3' in text
+    assert 'test_stage_seconds_sum{stage="diffusion"} 5.55' in text
+
+
+def test_counter_and_duration_buckets():
+    counter = Counter("test_jobs_total", "Test jobs", labels=("status",))
+    counter.inc(status="completed")
+    counter.inc(status="completed")
+
+    assert 'test_jobs_total{status="completed"} 2' in instrumentation.render()
+    assert duration_bucket(60) == "le60s"
+    assert duration_bucket(61) == "le120s"
+    assert duration_bucket(300) == "gt240s"
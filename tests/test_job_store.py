@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.api.core.job_store import MemoryJobStore, SQLiteJobStore
+from acestep.api.schemas import GenerationRequest, JobStatus
+
+
+def add(store, job_id, user_id="alice", created_at=None):
+    job = JobStatus(job_id=job_id, status="queued", created_at=created_at or time.time())
+    store.add(job, GenerationRequest(prompt=job_id, user_id=user_id))
+    return job
+
+
+def finish(store, job, status="completed"):
+    job.status = status
+    store.save(job)
+
+
+def test_least_recently_used_finished_jobs_are_evicted():
+    store = MemoryJobStore(max_jobs=3, ttl=3600)
+    a, b, c = add(store, "a"), add(store, "b"), add(store, "c")
+    finish(store, a)
+    finish(store, b)
+    store.get("a")  # b is now the least recently used finished job
+
+    add(store, "d")
+
+    assert store.get("b") is None
+    assert store.get("a") is a and store.get("c") is c
+    assert [job.job_id for job in store.list_by_status("completed")] == ["a"]
+    assert sorted(job.job_id for job in store.list_by_user("alice")) == ["a", "c", "d"]
+
+
+def test_live_jobs_are_never_evicted():
+    store = MemoryJobStore(max_jobs=2, ttl=0)
+    jobs = [add(store, job_id) for job_id in "abc"]
+
+    assert all(store.get(job.job_id) is job for job in jobs)
+
+    finish(store, jobs[0], "failed")  # expires right away
+    assert store.get("a") is None
+    assert store.list_by_status("failed") == []
+    assert store.get_request("a") is None
+
+
+def test_sqlite_store_survives_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = SQLiteJobStore(path)
+    queued = add(store, "queued", created_at=1.0)
+    done = add(store, "done", user_id="bob", created_at=2.0)
+    done.result = ["out.wav"]
+    finish(store, done)
+    store.release_request("done")
+
+    restarted = SQLiteJobStore(path)
+
+    assert restarted.pending_job_ids() == ["queued"]
+    assert restarted.get_request("queued").prompt == "queued"
+    assert restarted.get_request("done") is None
+    assert restarted.get("done").result == ["out.wav"]
+    assert [job.job_id for job in restarted.list_by_user("bob")] == ["done"]
+    assert restarted.get("queued").status == queued.status
+
+
+def test_sqlite_store_purges_expired_finished_jobs(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"), ttl=0)
+    finish(store, add(store, "old"))
+    add(store, "live")
+    time.sleep(0.01)
+
+    store._last_purge = 0.0
+    add(store, "new")
+
+    assert store.get("old") is None
+    assert store.get("live") is not None
+    assert store.pending_job_ids() == ["live", "new"]
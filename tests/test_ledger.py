@@ -0,0 +1,114 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.api.core.ledger import BalanceCache, SQLiteLedger
+from acestep.api.services import billing_service
+from acestep.api.services.billing_service import BillingService
+
+
+class SharedLedger(SQLiteLedger):
+    """A ledger other processes write to too (like Supabase)."""
+
+    local = False
+
+
+def test_concurrent_debits_never_overdraw(tmp_path):
+    ledger = SQLiteLedger(str(tmp_path / "ledger.db"))
+    ledger.create_wallet("alice", 12)
+
+    async def main():
+        return await asyncio.gather(*(ledger.debit("alice", 5, "generation", {"job_id": i}) for i in range(10)))
+
+    results = asyncio.run(main())
+
+    assert sum(result.ok for result in results) == 2
+    assert asyncio.run(ledger.balance("alice")) == 2
+    assert {result.balance for result in results if not result.ok} == {2}
+
+
+def test_credit_and_missing_wallet(tmp_path):
+    ledger = SQLiteLedger(str(tmp_path / "ledger.db"))
+    ledger.create_wallet("bob", 0)
+
+    assert asyncio.run(ledger.credit("bob", 100, "purchase", {})) == 100
+    assert asyncio.run(ledger.credit("nobody", 100, "purchase", {})) is None
+    # no wallet: nothing to charge, generation goes ahead
+    result = asyncio.run(ledger.debit("nobody", 5, "generation", {}))
+    assert result.ok and result.balance is None
+
+
+def test_balance_cache_expires():
+    cache = BalanceCache(ttl=0.0)
+    cache.set("alice", 3)
+    assert cache.get("alice") is None
+
+    cache = BalanceCache(ttl=60.0)
+    cache.set("alice", 3)
+    assert cache.get("alice") == 3
+    cache.invalidate("alice")
+    assert cache.get("alice") is None
+
+
+
+def use_ledger(monkeypatch, ledger):
+    cache = BalanceCache(ttl=60.0)
+    monkeypatch.setattr(billing_service, "ledger", ledger)
+    monkeypatch.setattr(billing_service, "balance_cache", cache)
+    return cache
+
+
+def test_short_cached_balance_is_rejected_by_a_local_ledger(tmp_path, monkeypatch):
+    ledger = SQLiteLedger(str(tmp_path / "ledger.db"))
+    ledger.create_wallet("alice", 7)
+    cache = use_ledger(monkeypatch, ledger)
+
+    asyncio.run(BillingService.deduct_credits("alice", 5, "job-1", "text2music"))
+    assert cache.get("alice") == 2
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(BillingService.deduct_credits("alice", 5, "job-2", "text2music"))
+
+    assert e.value.status_code == 402
+
+
+def test_shared_ledger_decides_despite_a_short_cached_balance(tmp_path, monkeypatch):
+    ledger = SharedLedger(str(tmp_path / "ledger.db"))
+    ledger.create_wallet("alice", 7)
+    cache = use_ledger(monkeypatch, ledger)
+
+    asyncio.run(BillingService.deduct_credits("alice", 5, "job-1", "text2music"))
+    # a purchase handled by another API process
+    asyncio.run(ledger.credit("alice", 100, "purchase", {}))
+    asyncio.run(BillingService.deduct_credits("alice", 5, "job-2", "text2music"))
+
+    assert asyncio.run(ledger.balance("alice")) == 97
+    assert cache.get("alice") == 97
+
+
+def test_shared_ledger_decline_is_remembered_until_credited(tmp_path, monkeypatch):
+    ledger = SharedLedger(str(tmp_path / "ledger.db"))
+    ledger.create_wallet("alice", 3)
+    use_ledger(monkeypatch, ledger)
+    debits = []
+    debit = ledger.debit
+
+    async def counted_debit(*args):
+        debits.append(args[0])
+        return await debit(*args)
+
+    monkeypatch.setattr(ledger, "debit", counted_debit)
+
+    for job_id in ("job-1", "job-2"):
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(BillingService.deduct_credits("alice", 5, job_id, "text2music"))
+        assert e.value.status_code == 402
+    assert debits == ["alice"]  # the retry was rejected from the cache
+
+    asyncio.run(BillingService.add_credits("alice", 10, "purchase"))
+    asyncio.run(BillingService.deduct_credits("alice", 5, "job-3", "text2music"))
+    assert asyncio.run(ledger.balance("alice")) == 8
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("loguru")
+
+from acestep.api.core.library import OutputLibrary
+from acestep.metadata_store import get_metadata_store
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACE_METADATA_DIR", str(tmp_path / "metadata"))
+    directory = tmp_path / "outputs"
+    directory.mkdir()
+    return directory
+
+
+def write_output(directory, name, mtime, size=10, **meta):
+    path = directory / name
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+    if meta:
+        get_metadata_store(str(directory)).put(name, meta)
+    return path
+
+
+def filenames(items):
+    return [item["filename"] for item in items]
+
+
+def test_reconcile_catches_up_with_the_directory(output_dir, tmp_path):
+    write_output(output_dir, "a.wav", 1000, title="Alpha", prompt="pop")
+    write_output(output_dir, "b.mp3", 2000, prompt="jazz")
+    (output_dir / "notes.txt").write_text("not audio")
+    library = OutputLibrary(str(output_dir), str(tmp_path / "library.db"))
+    library.reconcile()
+    library.set_starred("a.wav")
+
+    write_output(output_dir, "a.wav", 3000, size=20, title="Alpha (remix)", prompt="pop")
+    os.remove(output_dir / "b.mp3")
+    write_output(output_dir, "c.flac", 4000)
+    library.reconcile()
+
+    total, items = library.query()
+    assert total == 2
+    assert filenames(items) == ["c.flac", "a.wav"]
+    assert items[1]["size"] == 20 and items[1]["metadata"]["title"] == "Alpha (remix)"
+    assert items[1]["starred"]  # kept across the re-index
+    assert items[0]["format"] == "flac" and items[0]["metadata"] == {}
+
+    # a second process opening the same index sees the same state
+    total, _ = OutputLibrary(str(output_dir), str(tmp_path / "library.db")).query()
+    assert total == 2
+
+
+def test_pages_and_filters(output_dir, tmp_path):
+    for i in range(7):
+        write_output(output_dir, f"{i}.{'mp3' if i % 2 else 'wav'}", 1000 + i, prompt="lofi" if i < 3 else "rock")
+    library = OutputLibrary(str(output_dir), str(tmp_path / "library.db"))
+    library.reconcile()
+
+    total, page = library.query(offset=0, limit=3)
+    assert total == 7 and filenames(page) == ["6.wav", "5.mp3", "4.wav"]
+    total, page = library.query(offset=6, limit=3)
+    assert total == 7 and filenames(page) == ["0.wav"]
+    _, page = library.query(limit=2, oldest_first=True)
+    assert filenames(page) == ["0.wav", "1.mp3"]
+
+    total, page = library.query(search="lofi", format=".MP3")
+    assert total == 1 and filenames(page) == ["1.mp3"]
+    library.set_starred("2.wav")
+    assert filenames(library.query(starred=True)[1]) == ["2.wav"]
+
+    library.rename("2.wav", "two.wav")
+    library.remove("6.wav")
+    total, page = library.query(limit=1)
+    assert total == 6 and filenames(page) == ["5.mp3"]
+    assert filenames(library.query(starred=True)[1]) == ["two.wav"]
@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("loguru")
+
+from acestep.metadata_store import get_metadata_store, metadata_db_path
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACE_METADATA_DIR", str(tmp_path / "metadata"))
+    directory = tmp_path / "outputs"
+    directory.mkdir()
+    return directory
+
+
+def write_output(directory, name, params=None, meta=None):
+    (directory / name).write_bytes(b"\0")
+    base = os.path.splitext(name)[0]
+    if params is not None:
+        (directory / f"{base}_input_params.json").write_text(json.dumps(params))
+    if meta is not None:
+        (directory / f"{base}.json").write_text(json.dumps(meta))
+
+
+def test_database_is_kept_out_of_the_output_dir(output_dir, tmp_path):
+    store = get_metadata_store(str(output_dir))
+    store.put("a.wav", {"prompt": "pop"})
+
+    assert os.path.dirname(store.path) == str(tmp_path / "metadata")
+    assert os.listdir(output_dir) == []
+
+
+def test_sidecars_are_imported_and_kept(output_dir):
+    write_output(output_dir, "a.wav", params={"prompt": "pop", "seed": 1}, meta={"title": "Song", "seed": 2})
+    write_output(output_dir, "b.wav")
+    store = get_metadata_store(str(output_dir))
+
+    assert store.get("a.wav") == {"prompt": "pop", "seed": 2, "title": "Song"}
+    assert store.update("a.wav", title="Renamed")["title"] == "Renamed"
+    assert sorted(store.filenames()) == ["a.wav", "b.wav"]
+    assert store.get("b.wav") == {}
+    assert sorted(os.listdir(output_dir)) == ["a.json", "a.wav", "a_input_params.json", "b.wav"]
+
+    # the record wins over the sidecars from now on
+    (output_dir / "a.json").write_text(json.dumps({"title": "Stale"}))
+    assert store.get("a.wav")["title"] == "Renamed"
+
+    store.rename("a.wav", "c.wav")
+    assert store.get("c.wav")["title"] == "Renamed"
+    assert sorted(os.listdir(output_dir)) == ["a.wav", "b.wav", "c.json", "c_input_params.json"]
+
+
+def test_migration_removes_sidecars_only_when_asked(output_dir):
+    write_output(output_dir, "a.wav", params={"prompt": "pop"})
+    write_output(output_dir, "b.wav", meta={"title": "Song"})
+    store = get_metadata_store(str(output_dir))
+
+    assert store.migrate() == {"outputs": 2, "sidecars_removed": 0}
+    assert len(os.listdir(output_dir)) == 4
+
+    assert store.migrate(remove_sidecars=True) == {"outputs": 2, "sidecars_removed": 2}
+    assert sorted(os.listdir(output_dir)) == ["a.wav", "b.wav"]
+    assert store.get("a.wav") == {"prompt": "pop"} and store.get("b.wav") == {"title": "Song"}
+
+
+
+def test_default_location_is_beside_the_output_dir_not_the_cwd(tmp_path, monkeypatch):
+    monkeypatch.delenv("ACE_METADATA_DIR", raising=False)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("elsewhere")
+    monkeypatch.chdir("elsewhere")
+
+    assert os.path.dirname(metadata_db_path(str(tmp_path / "outputs"))) == str(tmp_path / "metadata")
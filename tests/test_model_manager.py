@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.api.core import model_manager
+from acestep.api.core.config import settings
+from acestep.api.core.model_manager import GB, ModelManager
+
+
+class FakeEngine:
+    def __init__(self, size_gb=1.0, **options):
+        self.size = int(size_gb * GB)
+        self.options = options
+        self.unloaded = False
+
+    def load_model(self, checkpoint_path=None):
+        pass
+
+    def unload(self):
+        self.unloaded = True
+
+    def memory_footprint(self):
+        return {"vram": self.size}
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(settings, "ENGINE_VARIANTS", {"base": {}, "int4": {"quantized": True}, "lofi": {"lora": "lofi"}})
+    monkeypatch.setattr(settings, "DEFAULT_VARIANT", "base")
+    monkeypatch.setattr(settings, "ENGINE_VRAM_BUDGET_GB", 2.5)
+    monkeypatch.setattr(settings, "ENGINE_RAM_BUDGET_GB", 0)
+    monkeypatch.setattr(model_manager, "get_audio_engine", lambda model_type=None, **options: FakeEngine(**options))
+    monkeypatch.setattr(ModelManager, "_instance", None)
+    return ModelManager()
+
+
+def test_least_recently_used_variant_is_evicted_over_budget(manager):
+    base = manager.get_engine()
+    int4 = manager.get_engine("int4")
+    assert int4.options == {"quantized": True}
+    manager.get_engine("base")  # int4 is now the least recently used
+
+    manager.get_engine("lofi")
+
+    assert list(manager.resident) == ["base", "lofi"]
+    assert int4.unloaded and not base.unloaded
+    assert manager.states["int4"] == "idle"
+    # a variant's size is only known once it has loaded
+    assert [(event["event"], event["variant"]) for event in manager.engines()["events"]] == [
+        ("load", "base"), ("load", "int4"), ("load", "lofi"), ("evict", "int4"),
+    ]
+
+    # int4 was sized before, so room is made before it loads again
+    manager.get_engine("int4")
+    assert [(event["event"], event["variant"]) for event in manager.engines()["events"]][-2:] == [
+        ("evict", "base"), ("load", "int4"),
+    ]
+
+
+def test_variant_in_use_is_not_evicted(manager):
+    with manager.lease("base") as base:
+        manager.get_engine("int4")
+        manager.get_engine("lofi")
+        assert not base.unloaded
+        assert "base" in manager.resident
+
+    with pytest.raises(ValueError):
+        manager.acquire("missing")
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.api.schemas import JobStatus
+from acestep.api.services.progress_service import ProgressBroker, format_sse
+
+
+def make_job(status="processing"):
+    return JobStatus(job_id="job-1", status=status, created_at=time.time())
+
+
+async def collect(broker, job, updates):
+    """Streams `job` while `updates` publishes to it; returns the event names."""
+    events = []
+
+    async def consume():
+        async for event in broker.stream(job, keepalive=5.0):
+            events.append(event["event"] if event else None)
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0)  # subscribed
+    await updates()
+    await asyncio.wait_for(consumer, 5.0)
+    return events
+
+
+def test_progress_is_throttled_but_status_changes_always_go_out():
+    broker = ProgressBroker(min_interval=60.0)
+    job = make_job()
+
+    async def updates():
+        for i in range(10):
+            job.progress = i / 10
+            broker.publish(job)
+        job.status = "completed"
+        broker.publish(job)
+
+    events = asyncio.run(collect(broker, job, updates))
+
+    # the initial state, one progress update, then the terminal event ends the stream
+    assert events == ["progress", "progress", "completed"]
+    assert broker._subscribers == {}
+
+
+def test_stream_waits_for_the_upload_after_completion():
+    broker = ProgressBroker(min_interval=0.0)
+    job = make_job()
+
+    async def updates():
+        job.status = "completed"
+        job.sync_status = "completed_local"
+        broker.publish(job)
+        job.sync_status = "synced"
+        broker.publish(job)
+
+    assert asyncio.run(collect(broker, job, updates)) == ["progress", "completed", "synced"]
+
+
+def test_updates_from_worker_threads_reach_the_loop():
+    broker = ProgressBroker(min_interval=0.0)
+    job = make_job()
+
+    async def updates():
+        def worker():
+            job.progress = 0.5
+            broker.publish(job)
+            job.status = "failed"
+            broker.publish(job)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        await asyncio.get_running_loop().run_in_executor(None, thread.join)
+
+    assert asyncio.run(collect(broker, job, updates)) == ["progress", "progress", "failed"]
+
+
+def test_slow_consumers_lose_the_oldest_updates():
+    broker = ProgressBroker(min_interval=0.0)
+    job = make_job()
+
+    async def main():
+        queue = broker.subscribe(job.job_id)
+        for i in range(broker.QUEUE_SIZE + 5):
+            job.progress = i
+            broker.publish(job)
+        return queue
+
+    queue = asyncio.run(main())
+
+    assert queue.qsize() == broker.QUEUE_SIZE
+    assert queue.get_nowait()["data"]["progress"] == 5
+
+
+def test_sse_format():
+    event = ProgressBroker.make_event(make_job(status="cancelled"))
+
+    assert format_sse(event).startswith("event: cancelled\ndata: {")
+    assert format_sse(None) == ": keepalive\n\n"
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("loguru")
+
+from acestep.api.core.job_store import MemoryJobStore
+from acestep.api.schemas import GenerationRequest
+from acestep.api.services import job_service
+from acestep.api.services.billing_service import BillingService
+from acestep.api.services.job_service import JobService
+from acestep.api.services.result_cache import ResultCache, request_key
+
+
+def write(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return str(path)
+
+
+def test_key_is_per_user_and_needs_a_seed():
+    req = dict(prompt="pop, 120 bpm", seed=42)
+    assert request_key(GenerationRequest(**req, user_id="alice")) == request_key(GenerationRequest(**req, user_id="alice"))
+    assert request_key(GenerationRequest(**req, user_id="alice")) != request_key(GenerationRequest(**req, user_id="bob"))
+    assert request_key(GenerationRequest(**req, title="renamed")) == request_key(GenerationRequest(**req))
+    assert request_key(GenerationRequest(prompt="pop, 120 bpm")) is None
+
+
+def test_least_recently_used_entries_are_evicted_by_size(tmp_path):
+    cache = ResultCache(str(tmp_path / "index" / "cache.json"), max_bytes=250, ttl=3600)
+    a, b, c = (write(tmp_path / f"{name}.wav", 100) for name in "abc")
+    cache.put("a", "job-a", [a])
+    cache.put("b", "job-b", [b])
+    assert cache.lookup("a") == [a]  # b is now the oldest
+
+    cache.put("c", "job-c", [c])
+
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") == [a] and cache.lookup("c") == [c]
+    assert os.path.exists(b)  # forgotten, not pruned
+    assert cache.stats() == {"entries": 2, "bytes": 200, "in_flight": 0}
+
+    restarted = ResultCache(cache.index_path, max_bytes=250, ttl=3600)
+    assert restarted.lookup("a") == [a]
+
+
+def test_expired_and_deleted_outputs_are_misses(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.json"), max_bytes=1024, ttl=60)
+    a, b = write(tmp_path / "a.wav", 10), write(tmp_path / "b.wav", 10)
+    cache.put("a", "job-a", [a])
+    cache.put("b", "job-b", [b])
+    cache._entries["a"]["created_at"] = time.time() - 120
+    os.remove(b)
+
+    assert cache.lookup("a") is None
+    assert cache.lookup("b") is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """JobService with the result cache on, a fresh store and queue, and a recorded bill."""
+    charges = []
+
+    async def deduct_credits(user_id, amount, job_id, task):
+        charges.append((user_id, job_id))
+
+    monkeypatch.setattr(job_service.settings, "RESULT_CACHE", True)
+    monkeypatch.setattr(job_service, "result_cache", ResultCache(str(tmp_path / "cache.json"), max_bytes=1024, ttl=3600))
+    monkeypatch.setattr(job_service, "JOB_STORE", MemoryJobStore())
+    monkeypatch.setattr(job_service, "TASK_QUEUE", asyncio.Queue())
+    monkeypatch.setattr(BillingService, "deduct_credits", staticmethod(deduct_credits))
+    return charges
+
+
+def test_identical_requests_share_one_flight_per_user(service):
+    charges = service
+    req = dict(prompt="pop, 120 bpm", seed=42)
+
+    async def main():
+        first = await JobService.submit_job(GenerationRequest(**req, user_id="alice"))
+        again = await JobService.submit_job(GenerationRequest(**req, user_id="alice"))
+        other = await JobService.submit_job(GenerationRequest(**req, user_id="bob"))
+        return first, again, other
+
+    first, again, other = asyncio.run(main())
+
+    assert again is first
+    assert other.job_id != first.job_id
+    assert charges == [("alice", first.job_id), ("bob", other.job_id)]
+    assert job_service.TASK_QUEUE.qsize() == 2
+
+
+def test_completed_outputs_are_served_to_their_owner_only(service, tmp_path):
+    charges = service
+    req = dict(prompt="pop, 120 bpm", seed=42)
+    path = write(tmp_path / "out.wav", 10)
+    job_service.result_cache.put(request_key(GenerationRequest(**req, user_id="alice")), "job-0", [path])
+
+    async def main():
+        mine = await JobService.submit_job(GenerationRequest(**req, user_id="alice"))
+        theirs = await JobService.submit_job(GenerationRequest(**req, user_id="bob"))
+        return mine, theirs
+
+    mine, theirs = asyncio.run(main())
+
+    assert mine.status == "completed" and mine.result == [path]
+    assert theirs.status == "queued" and theirs.result is None
+    assert charges == [("bob", theirs.job_id)]
+
+
+def test_concurrent_identical_requests_pay_and_run_once(service, monkeypatch):
+    charges = service
+    req = GenerationRequest(prompt="pop, 120 bpm", seed=42, user_id="alice")
+
+    async def deduct_credits(user_id, amount, job_id, task):
+        await asyncio.sleep(0.01)  # the ledger round trip
+        charges.append((user_id, job_id))
+
+    async def main():
+        return await asyncio.gather(*(JobService.submit_job(req) for _ in range(3)))
+
+    monkeypatch.setattr(BillingService, "deduct_credits", staticmethod(deduct_credits))
+    jobs = asyncio.run(main())
+
+    assert all(job is jobs[0] for job in jobs)
+    assert charges == [("alice", jobs[0].job_id)]
+    assert job_service.TASK_QUEUE.qsize() == 1
+
+
+def test_failed_billing_and_failed_jobs_give_up_the_key(service, monkeypatch):
+    charges = service
+    req = GenerationRequest(prompt="pop, 120 bpm", seed=42, user_id="alice")
+    key = request_key(req)
+    declined = []
+
+    async def deduct_credits(user_id, amount, job_id, task):
+        await asyncio.sleep(0.01)
+        if not declined:
+            declined.append(job_id)
+            raise HTTPException(status_code=402, detail="Insufficient credits")
+        charges.append((user_id, job_id))
+
+    async def main():
+        return await asyncio.gather(JobService.submit_job(req), JobService.submit_job(req), return_exceptions=True)
+
+    monkeypatch.setattr(BillingService, "deduct_credits", staticmethod(deduct_credits))
+    declined_result, job = asyncio.run(main())
+
+    # the request waiting on the declined one runs on its own
+    assert isinstance(declined_result, HTTPException) and declined_result.status_code == 402
+    assert charges == [("alice", job.job_id)]
+    assert job_service.result_cache.in_flight(key) == job.job_id
+
+    JobService._fail_job(job.job_id, job, RuntimeError("boom"))
+    assert job_service.result_cache.in_flight(key) is None
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+torch = pytest.importorskip("torch")
+model_loading = pytest.importorskip("acestep.model_loading")
+
+from acestep.api.core.worker_pool import WorkerPool
+from acestep.instrumentation import process_memory
+
+
+def make_model():
+    torch.manual_seed(0)
+    # 64 MiB of float32 weights
+    return torch.nn.Sequential(*[torch.nn.Linear(2048, 2048, bias=False) for _ in range(4)])
+
+
+class SharedEngine:
+    """Reads every shared weight page at load, like building a model around them."""
+
+    shared_weights = None
+
+    def load_model(self, checkpoint_path=None):
+        self.weights = self.shared_weights.tensors()
+        self.checksum = sum(float(tensor.sum()) for tensor in self.weights.values())
+
+    def generate(self, params):
+        return [self.checksum, all(tensor.is_shared() for tensor in self.weights.values())]
+
+
+def test_workers_map_the_parents_weights():
+    if process_memory() is None:
+        pytest.skip("needs /proc/<pid>/smaps_rollup")
+    model = make_model()
+    expected = sum(float(parameter.sum()) for parameter in model.parameters())
+    shared = model_loading.share_weights(model)
+    assert all(parameter.is_shared() for parameter in model.parameters())
+    assert sum(float(parameter.sum()) for parameter in model.parameters()) == pytest.approx(expected)
+
+    pool = WorkerPool(
+        num_workers=2,
+        engine_factory=f"{__name__}:SharedEngine",
+        threads_per_worker=1,
+        heartbeat_interval=0.2,
+        shared_weights=shared,
+    )
+    pool.start()
+    try:
+        deadline = time.time() + 120
+        while not all(worker["ready"] for worker in pool.health()):
+            assert time.time() < deadline, "workers did not load"
+            time.sleep(0.1)
+        checksum, is_shared = pool.submit({}).result(timeout=60)
+        assert checksum == pytest.approx(expected, rel=1e-4)
+        assert is_shared
+
+        workers = [process for process in pool.memory_report()["processes"] if process["process"] != "api"]
+        assert len(workers) == 2
+        for process in workers:
+            # each worker has the weights resident but is charged only a third of them
+            assert process["rss"] - process["pss"] >= shared.nbytes / 2
+    finally:
+        pool.stop()
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("loguru")
+
+from acestep.api.schemas import GenerationRequest, JobStatus
+from acestep.api.services import job_service
+from acestep.api.services.job_service import JobService
+
+
+@pytest.fixture(autouse=True)
+def batching(monkeypatch):
+    monkeypatch.setattr(job_service.settings, "MAX_BATCH_SIZE", 2)
+
+
+def entry(job_id, **fields):
+    req = GenerationRequest(prompt=f"prompt {job_id}", **fields)
+    return job_id, JobStatus(job_id=job_id, status="queued", created_at=time.time()), req
+
+
+def test_requests_differing_only_in_content_share_a_key():
+    base = JobService._batch_key(GenerationRequest(prompt="pop", duration=40))
+
+    assert JobService._batch_key(GenerationRequest(prompt="jazz", lyrics="[verse]", seed=7, duration=40.02)) == base
+    assert JobService._batch_key(GenerationRequest(prompt="pop", duration=40.1)) != base  # another frame length
+    assert JobService._batch_key(GenerationRequest(prompt="pop", duration=40, infer_steps=27)) != base
+    assert JobService._batch_key(GenerationRequest(prompt="pop", duration=40, scheduler_type="heun")) != base
+    assert JobService._batch_key(GenerationRequest(prompt="pop", duration=40, format="mp3")) != base
+    assert JobService._batch_key(GenerationRequest(prompt="pop", task="retake")) is None
+
+
+def test_compatible_jobs_are_grouped_up_to_the_batch_size():
+    entries = [
+        entry("a", duration=40),
+        entry("b", duration=20),
+        entry("c", duration=40.02),
+        entry("d", duration=40),
+        entry("e", duration=55, task="retake"),
+        entry("f", duration=55, task="retake"),
+    ]
+
+    batches = [[job_id for job_id, _, _ in batch] for batch in JobService._group_jobs(entries)]
+
+    assert batches == [["a", "c"], ["d"], ["b"], ["e"], ["f"]]
+
+
+def test_a_batched_call_matches_solo_calls(tmp_path, monkeypatch):
+    # requests with one batch key must come out as if each had run alone
+    torch = pytest.importorskip("torch")
+    from benchmarks.tiny_models import PROMPT_WORDS, build_pipeline
+
+    torch.manual_seed(0)
+    pipeline = build_pipeline(str(tmp_path))
+    outputs = []
+    monkeypatch.setattr(pipeline, "latents2audio", lambda latents, **kwargs: outputs.append(latents) or [])
+    requests = [
+        GenerationRequest(prompt=" ".join(PROMPT_WORDS[:3]), lyrics="[verse]\nla la la", duration=10.0, seed=1),
+        GenerationRequest(prompt=" ".join(PROMPT_WORDS[3:12]), lyrics="", duration=10.02, seed=2),
+    ]
+    assert JobService._batch_key(requests[0]) == JobService._batch_key(requests[1])
+
+    # ERG on the diffusion hooks transformer blocks the tiny model does not have
+    common = dict(infer_step=3, save_path=str(tmp_path), use_erg_diffusion=False)
+    pipeline(
+        prompt=[req.prompt for req in requests],
+        lyrics=[req.lyrics for req in requests],
+        audio_duration=[req.duration for req in requests],
+        manual_seeds=[req.seed for req in requests],
+        batch_size=len(requests),
+        **common,
+    )
+    for req in requests:
+        pipeline(prompt=req.prompt, lyrics=req.lyrics, audio_duration=req.duration, manual_seeds=req.seed, **common)
+
+    batched, solo = outputs[0], torch.cat(outputs[1:])
+    torch.testing.assert_close(batched, solo, rtol=1e-4, atol=1e-4)
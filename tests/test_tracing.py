@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.tracing import JsonFileExporter, Tracer, attach, current
+
+
+def read_spans(path):
+    with open(path) as f:
+        documents = [json.loads(line) for line in f]
+    return [
+        span
+        for document in documents
+        for resource in document["resourceSpans"]
+        for scope in resource["scopeSpans"]
+        for span in scope["spans"]
+    ]
+
+
+def test_spans_nest_across_threads_and_export_once(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    tracer = Tracer(JsonFileExporter(path))
+
+    root = tracer.start_span("job", job_id="abc")
+
+    def work(context):
+        with attach(context), tracer.span("generate"):
+            with tracer.span("tokenize_lyrics", lang="en"):
+                pass
+            tracer.record("diffusion_step", current(), 1.0, 2.0, step=0)
+
+    thread = threading.Thread(target=work, args=(root.context,))
+    thread.start()
+    thread.join()
+    assert not os.path.exists(path)  # the job is still open
+
+    tracer.end_span(root)
+
+    spans = {span["name"]: span for span in read_spans(path)}
+    assert set(spans) == {"job", "generate", "tokenize_lyrics", "diffusion_step"}
+    assert len({span["traceId"] for span in spans.values()}) == 1
+    assert spans["generate"]["parentSpanId"] == spans["job"]["spanId"]
+    assert spans["tokenize_lyrics"]["parentSpanId"] == spans["generate"]["spanId"]
+    assert spans["diffusion_step"]["parentSpanId"] == spans["generate"]["spanId"]
+    assert spans["diffusion_step"]["endTimeUnixNano"] == str(2 * 10**9)
+    assert "parentSpanId" not in spans["job"]
+
+
+def test_failed_span_records_error_and_disabled_tracer_is_noop(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    tracer = Tracer(JsonFileExporter(path))
+    try:
+        with tracer.span("upload"):
+            raise RuntimeError("bucket unavailable")
+    except RuntimeError:
+        pass
+    (span,) = read_spans(path)
+    assert span["status"] == {"code": 2, "message": "RuntimeError: bucket unavailable"}
+
+    disabled = Tracer()
+    with disabled.span("upload") as span:
+        assert span is None
+    assert disabled.start_span("job") is None
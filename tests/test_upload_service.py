@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.api.schemas import JobStatus
+from acestep.api.services.upload_service import LocalStorage, UploadService
+
+
+class FlakyStorage(LocalStorage):
+    """Fails the first `failures` uploads of every file."""
+
+    def __init__(self, root, failures):
+        super().__init__(root, base_url="http://cdn.test")
+        self.failures = failures
+        self.attempts = {}
+
+    def upload(self, local_path, storage_path):
+        self.attempts[storage_path] = self.attempts.get(storage_path, 0) + 1
+        if self.attempts[storage_path] <= self.failures:
+            raise ConnectionError("bucket unavailable")
+        return super().upload(local_path, storage_path)
+
+
+def _run(service, tmp_path, names):
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(b"RIFF")
+        paths.append(str(path))
+    job = JobStatus(job_id="job", status="completed", created_at=time.time(), result=paths)
+    updates = []
+
+    async def main():
+        service.enqueue(job, paths, on_update=lambda j: updates.append(j.sync_status))
+        assert job.sync_status == "completed_local"
+        await service.drain(timeout=10)
+
+    asyncio.run(main())
+    return job, updates
+
+
+def test_upload_retries_then_syncs(tmp_path):
+    storage = FlakyStorage(tmp_path / "bucket", failures=2)
+    service = UploadService(storage, concurrency=1, max_retries=3, backoff=0.01)
+
+    job, updates = _run(service, tmp_path, ["a.wav", "b.wav"])
+
+    assert updates == ["synced"]
+    assert job.cloud_urls == ["http://cdn.test/generated/a.wav", "http://cdn.test/generated/b.wav"]
+    assert (tmp_path / "bucket" / "generated" / "b.wav").read_bytes() == b"RIFF"
+    assert storage.attempts == {"generated/a.wav": 3, "generated/b.wav": 3}
+
+
+def test_upload_gives_up_after_retries(tmp_path):
+    storage = FlakyStorage(tmp_path / "bucket", failures=10)
+    service = UploadService(storage, max_retries=1, backoff=0.01)
+
+    job, updates = _run(service, tmp_path, ["a.wav"])
+
+    assert updates == ["sync_failed"]
+    assert job.cloud_urls is None
+    assert job.sync_error.startswith("Cloud sync failed for 1 of 1 files") and job.error is None
+    assert storage.attempts == {"generated/a.wav": 2}
+
+
+class BrokenStorage(LocalStorage):
+    """Refuses one file."""
+
+    def upload(self, local_path, storage_path):
+        if storage_path.endswith("b.wav"):
+            raise ConnectionError("bucket unavailable")
+        return super().upload(local_path, storage_path)
+
+
+def test_partial_sync_keeps_the_uploaded_urls(tmp_path):
+    service = UploadService(BrokenStorage(tmp_path / "bucket", base_url="http://cdn.test"), max_retries=0)
+
+    job, updates = _run(service, tmp_path, ["a.wav", "b.wav"])
+
+    assert updates == ["sync_failed"]
+    assert job.cloud_urls == ["http://cdn.test/generated/a.wav", None]
+    assert "1 of 2 files" in job.sync_error and job.error is None
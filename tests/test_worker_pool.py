@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.api.core.worker_pool import WorkerPool
+from acestep.cancellation import GenerationCancelled, raise_if_cancelled
+
+
+class FakeEngine:
+    """Stands in for ACEStepEngine inside the worker processes."""
+
+    def load_model(self, checkpoint_path=None):
+        pass
+
+    def generate(self, params):
+        if params.get("crash"):
+            os._exit(1)
+        params["progress"](0.5, desc="Generating...")
+        deadline = time.time() + params.get("sleep", 0.0)
+        while time.time() < deadline:
+            raise_if_cancelled(params["cancel_check"])
+            time.sleep(0.05)
+        return [f"{params['prompt']}.wav", {"pid": os.getpid()}]
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(
+        num_workers=2,
+        engine_factory=f"{__name__}:FakeEngine",
+        threads_per_worker=1,
+        heartbeat_interval=0.2,
+    )
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def test_jobs_run_on_separate_processes(pool):
+    progress = []
+    futures = [
+        pool.submit({"prompt": f"song{i}", "sleep": 0.5, "progress": lambda p, desc="": progress.append(p)})
+        for i in range(4)
+    ]
+    results = [future.result(timeout=60) for future in futures]
+
+    assert [result[0] for result in results] == [f"song{i}.wav" for i in range(4)]
+    assert len({result[1]["pid"] for result in results}) == 2
+    assert os.getpid() not in {result[1]["pid"] for result in results}
+    assert progress == [0.5] * 4
+
+
+def test_crashed_worker_is_restarted(pool):
+    with pytest.raises(RuntimeError):
+        pool.submit({"prompt": "boom", "crash": True}).result(timeout=60)
+
+    result = pool.submit({"prompt": "after"}).result(timeout=60)
+    assert result[0] == "after.wav"
+    assert sum(worker["restarts"] for worker in pool.health()) == 1
+
+
+def test_running_job_is_cancelled(pool):
+    cancelled = []
+    future = pool.submit({"prompt": "long", "sleep": 60, "cancel_check": lambda: bool(cancelled)})
+    time.sleep(1.0)
+    cancelled.append(True)
+
+    with pytest.raises(GenerationCancelled):
+        future.result(timeout=30)
+    assert pool.submit({"prompt": "next"}).result(timeout=60)[0] == "next.wav"
+
+
+class WarmingEngine(FakeEngine):
+    def warm_up(self, params):
+        time.sleep(params["sleep"])
+
+
+def test_workers_report_warming_until_warm_up_finishes():
+    pool = WorkerPool(
+        num_workers=1,
+        engine_factory=f"{__name__}:WarmingEngine",
+        heartbeat_interval=0.2,
+        warmup_params={"sleep": 2.0},
+    )
+    pool.start()
+    try:
+        deadline = time.time() + 60
+        while not pool.health()[0]["warming"] and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool.health()[0]["warming"] and not pool.health()[0]["ready"]
+
+        while not pool.health()[0]["ready"] and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool.health()[0]["ready"] and not pool.health()[0]["warming"]
+    finally:
+        pool.stop()
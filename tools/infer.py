@@ -46,9 +46,12 @@ def sample_data(json_data):
 @click.option(
     "--overlapped_decode", type=bool, default=False, help="Whether to use overlapped decoding (run dcae and vocoder using sliding windows)"
 )
+@click.option(
+    "--batched_guidance", type=bool, default=False, help="Whether to batch the guidance branches into one transformer call per step"
+)
 @click.option("--device_id", type=int, default=0, help="Device ID to use")
 @click.option("--output_path", type=str, default=None, help="Path to save the output")
-def main(checkpoint_path, bf16, torch_compile, cpu_offload, overlapped_decode, device_id, output_path):
+def main(checkpoint_path, bf16, torch_compile, cpu_offload, overlapped_decode, batched_guidance, device_id, output_path):
     os.environ["CUDA_VISIBLE_DEVICES"] = str(device_id)
 
     model_demo = ACEStepPipeline(
@@ -56,7 +59,8 @@ def main(checkpoint_path, bf16, torch_compile, cpu_offload, overlapped_decode, d
         dtype="bfloat16" if bf16 else "float32",
         torch_compile=torch_compile,
         cpu_offload=cpu_offload,
-        overlapped_decode=overlapped_decode
+        overlapped_decode=overlapped_decode,
+        batched_guidance=batched_guidance,
     )
     print(model_demo)
 
@@ -0,0 +1,260 @@
+"""
+Load generator for the API.
+
+Drives /generate (then polls /status until the job settles), /history and
+/agent/chat with open-loop Poisson arrivals at the given rates, and reports
+throughput and p50/p95/p99 latencies per operation. `--spawn` starts a
+throwaway server on the mock engine (AUDIO_MODEL_TYPE=mock), so API-layer
+scaling can be measured without a model or GPU:
+
+    python tools/loadtest.py --spawn --duration 60 --generate-rate 2 --history-rate 10
+
+Extra server settings can be passed through the environment, e.g.
+ACE_CONTINUOUS_BATCHING=true or ACE_MOCK_STEP_COST=0.001.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import click
+import httpx
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, name: str, seconds: float, ok: bool = True):
+        if ok:
+            self.latencies[name].append(seconds)
+        else:
+            self.errors[name] += 1
+
+    def report(self, elapsed: float) -> Dict[str, dict]:
+        report = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies[name])
+            report[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "throughput_per_s": len(values) / elapsed,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": (values[-1] if values else 0.0) * 1000,
+            }
+        return report
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return 0.0
+    rank = min(max(math.ceil(q / 100 * len(sorted_values)), 1), len(sorted_values))
+    return sorted_values[rank - 1]
+
+
+async def timed(recorder: Recorder, name: str, request) -> Optional[httpx.Response]:
+    start = time.perf_counter()
+    try:
+        response = await request
+        response.raise_for_status()
+    except httpx.HTTPError:
+        recorder.add(name, 0.0, ok=False)
+        return None
+    recorder.add(name, time.perf_counter() - start)
+    return response
+
+
+async def generate_job(client: httpx.AsyncClient, recorder: Recorder, options: dict):
+    payload = {
+        "prompt": "load test, upbeat synth pop",
+        "duration": random.choice(options["durations"]),
+        "infer_steps": options["steps"],
+    }
+    submitted = time.perf_counter()
+    response = await timed(recorder, "generate", client.post("/generate", json=payload))
+    if response is None:
+        return
+    job_id = response.json()["job_id"]
+
+    deadline = submitted + options["job_timeout"]
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(options["poll_interval"])
+        response = await timed(recorder, "status", client.get(f"/status/{job_id}"))
+        if response is None:
+            continue
+        job = response.json()
+        if job["status"] in TERMINAL_STATUSES:
+            if job.get("started_at"):
+                recorder.add("queue_wait", job["started_at"] - job["created_at"])
+            recorder.add("job_" + job["status"], time.perf_counter() - submitted)
+            return
+    recorder.add("job_timeout", 0.0, ok=False)
+
+
+async def list_history(client: httpx.AsyncClient, recorder: Recorder, options: dict):
+    await timed(recorder, "history", client.get("/history", params={"limit": options["history_limit"]}))
+
+
+async def agent_chat(client: httpx.AsyncClient, recorder: Recorder, options: dict):
+    start = time.perf_counter()
+    try:
+        async with client.stream(
+            "POST", "/agent/chat", json={"message": "Write a short chorus about the sea", "history": []}
+        ) as response:
+            response.raise_for_status()
+            first_chunk = None
+            async for _ in response.aiter_bytes():
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+    except httpx.HTTPError:
+        recorder.add("agent_chat", 0.0, ok=False)
+        return
+    recorder.add("agent_chat_first_byte", first_chunk if first_chunk is not None else time.perf_counter() - start)
+    recorder.add("agent_chat", time.perf_counter() - start)
+
+
+async def open_loop(rate: float, duration: float, operation, tasks: set, *args):
+    """Starts `operation` at Poisson arrivals of `rate` per second for `duration` seconds."""
+    if rate <= 0:
+        return
+    end = time.perf_counter() + duration
+    while True:
+        await asyncio.sleep(random.expovariate(rate))
+        if time.perf_counter() >= end:
+            return
+        task = asyncio.create_task(operation(*args))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+async def run_load(url: str, options: dict) -> Dict[str, dict]:
+    recorder = Recorder()
+    tasks: set = set()
+    limits = httpx.Limits(max_connections=options["max_connections"], max_keepalive_connections=options["max_connections"])
+    async with httpx.AsyncClient(base_url=url, timeout=options["request_timeout"], limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            open_loop(options["generate_rate"], options["duration"], generate_job, tasks, client, recorder, options),
+            open_loop(options["history_rate"], options["duration"], list_history, tasks, client, recorder, options),
+            open_loop(options["chat_rate"], options["duration"], agent_chat, tasks, client, recorder, options),
+        )
+        # let submitted jobs settle
+        if tasks:
+            await asyncio.wait(list(tasks), timeout=options["job_timeout"])
+        elapsed = time.perf_counter() - start
+    return {"elapsed_s": elapsed, "operations": recorder.report(elapsed)}
+
+
+def spawn_server(port: int, workdir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "AUDIO_MODEL_TYPE": "mock",
+        "ACE_OUTPUT_DIR": os.path.join(workdir, "outputs"),
+        "ACE_LIBRARY_DB_PATH": os.path.join(workdir, "library.db"),
+        "ACE_JOB_STORE": "memory",
+        "ACE_LEDGER": "none",
+        "ACE_UPLOAD_BACKEND": "none",
+        "ACE_RESULT_CACHE": "false",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "acestep.api.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+def wait_until_ready(url: str, timeout: float = 600.0):
+    """Waits for /ready so model loading and warm-up stay out of the measurements."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/ready", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {url} was not ready within {timeout:.0f}s")
+
+
+def print_report(result: dict):
+    print(f"\nElapsed: {result['elapsed_s']:.1f}s")
+    print(f"{'operation':24s} {'count':>7s} {'errors':>7s} {'ops/s':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for name, stats in result["operations"].items():
+        print(
+            f"{name:24s} {stats['count']:7d} {stats['errors']:7d} {stats['throughput_per_s']:8.2f} "
+            f"{stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f} {stats['max_ms']:9.1f}"
+        )
+
+
+@click.command()
+@click.option("--url", type=str, default="http://127.0.0.1:7866", help="API base URL (ignored with --spawn).")
+@click.option("--spawn", is_flag=True, help="Start a throwaway server on the mock engine.")
+@click.option("--port", type=int, default=7899, help="Port for the spawned server.")
+@click.option("--duration", type=float, default=30.0, help="Seconds to generate load for.")
+@click.option("--generate-rate", type=float, default=1.0, help="/generate arrivals per second.")
+@click.option("--history-rate", type=float, default=5.0, help="/history arrivals per second.")
+@click.option("--chat-rate", type=float, default=0.0, help="/agent/chat arrivals per second (needs an LLM backend).")
+@click.option("--poll-interval", type=float, default=0.5, help="Seconds between /status polls of one job.")
+@click.option("--durations", type=str, default="10,30,60", help="Comma-separated audio durations to request.")
+@click.option("--steps", type=int, default=30, help="infer_steps per request.")
+@click.option("--history-limit", type=int, default=50, help="Page size for /history.")
+@click.option("--job-timeout", type=float, default=300.0, help="Give up on a job after this many seconds.")
+@click.option("--request-timeout", type=float, default=30.0, help="Per-request timeout.")
+@click.option("--max-connections", type=int, default=200, help="HTTP connection pool size.")
+@click.option("--seed", type=int, default=0, help="Seed for arrivals and request mix.")
+@click.option("--out", type=str, default="", help="Also write the report as JSON here.")
+def main(url, spawn, port, duration, generate_rate, history_rate, chat_rate, poll_interval, durations, steps,
+         history_limit, job_timeout, request_timeout, max_connections, seed, out):
+    random.seed(seed)
+    options = dict(
+        duration=duration,
+        generate_rate=generate_rate,
+        history_rate=history_rate,
+        chat_rate=chat_rate,
+        poll_interval=poll_interval,
+        durations=[float(d) for d in durations.split(",")],
+        steps=steps,
+        history_limit=history_limit,
+        job_timeout=job_timeout,
+        request_timeout=request_timeout,
+        max_connections=max_connections,
+    )
+
+    server = None
+    workdir = tempfile.TemporaryDirectory() if spawn else None
+    try:
+        if spawn:
+            url = f"http://127.0.0.1:{port}"
+            server = spawn_server(port, workdir.name)
+        wait_until_ready(url)
+        result = asyncio.run(run_load(url, options))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if workdir is not None:
+            workdir.cleanup()
+
+    result["config"] = {"url": url, "spawn": spawn, **options}
+    print_report(result)
+    if out:
+        with open(out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Imports the JSON sidecars of an output directory into its metadata store:
+
+    python tools/migrate_metadata.py ./outputs
+    python tools/migrate_metadata.py ./outputs --remove-sidecars
+
+Records are imported on first read anyway; this does the whole directory at once.
+Sidecars are only deleted with `--remove-sidecars`, and only for outputs that
+have a record afterwards. Set ACE_METADATA_DIR if the server sets it.
+"""
+
+import os
+import sys
+
+import click
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from acestep.metadata_store import get_metadata_store
+
+
+@click.command()
+@click.argument("output_dir", type=click.Path(exists=True, file_okay=False))
+@click.option("--remove-sidecars", is_flag=True, default=False, help="Delete *_input_params.json / <name>.json once imported")
+def main(output_dir: str, remove_sidecars: bool):
+    store = get_metadata_store(output_dir)
+    result = store.migrate(remove_sidecars=remove_sidecars)
+    click.echo(f"{result['outputs']} outputs in {output_dir} recorded in {store.path}")
+    if remove_sidecars:
+        click.echo(f"Removed {result['sidecars_removed']} sidecar files")
+
+
+if __name__ == "__main__":
+    main()